@@ -0,0 +1,34 @@
+import zlib
+from typing import Optional, Tuple
+
+from app.core.config import (
+    NOTE_COMPRESSION,
+    NOTE_COMPRESSION_LEVEL,
+    NOTE_COMPRESSION_THRESHOLD,
+)
+
+
+def compress_entry(entry: Optional[str]) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    Split a note entry into its stored (text, compressed) pair.
+    When NOTE_COMPRESSION is enabled, entries larger than
+    NOTE_COMPRESSION_THRESHOLD bytes are stored zlib-compressed.
+    """
+    if entry is None or not NOTE_COMPRESSION:
+        return entry, None
+
+    data = entry.encode("utf-8")
+    if len(data) <= NOTE_COMPRESSION_THRESHOLD:
+        return entry, None
+
+    return None, zlib.compress(data, NOTE_COMPRESSION_LEVEL)
+
+
+def decompress_entry(text: Optional[str], compressed: Optional[bytes]) -> Optional[str]:
+    """
+    Rebuild a note entry from its stored (text, compressed) pair.
+    Compressed entries are always readable, even if compression is disabled later.
+    """
+    if compressed is not None:
+        return zlib.decompress(compressed).decode("utf-8")
+    return text
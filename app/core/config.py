@@ -12,9 +12,105 @@ stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 WEB_URL = os.getenv("WEB_URL", "*")
 ENV = os.getenv("ENV", "dev")
+ORDER_COMPACTION = os.getenv("ORDER_COMPACTION", "eager")  # "eager" or "deferred"
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")  # /internal/* closed if unset
+BLOCKING_EXECUTOR_MAX_WORKERS = int(os.getenv("BLOCKING_EXECUTOR_MAX_WORKERS", "16"))
+
+# Database connection pool environment variables
+# Each worker process has a sync and an async pool of this size
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Server-side prepared statements kept per asyncpg connection (0 disables,
+# e.g. behind PgBouncer in transaction mode)
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(
+    os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "500")
+)
+
+# SQL statement stats environment variables
+# X-DB-* headers with each response's statement count and database time
+DB_STATS_HEADERS = os.getenv("DB_STATS_HEADERS", "false").lower() == "true"
+# Raise on lazy loads and on routes going over their statement budget
+DB_STRICT_MODE = os.getenv("DB_STRICT_MODE", "false").lower() == "true"
+DB_STATEMENT_BUDGET = int(os.getenv("DB_STATEMENT_BUDGET", "20"))  # Per request
+
+# Slow query log environment variables
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", "100"))
+# Capture query plans of slow statements in the background; on Postgres
+# this runs SELECTs again under EXPLAIN ANALYZE
+DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+# Capture at most one plan per normalized statement within this interval
+DB_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(
+    os.getenv("DB_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", "300")
+)
+
+# Read replica environment variables
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")  # Optional
+# How long a user's reads stay on the primary after they write
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+# Signs the cookie carrying that pin to the other workers, so set the same
+# value in all of them; unset, a pin only holds in the worker that wrote
+READ_YOUR_WRITES_SECRET = os.getenv("READ_YOUR_WRITES_SECRET")  # Optional
+
+# Note autosave environment variables
+# Autosaves are buffered per process: run one worker or route each user's
+# requests to the same worker, or competing autosaves are dropped at flush
+NOTE_WRITE_BEHIND = os.getenv("NOTE_WRITE_BEHIND", "false").lower() == "true"
+NOTE_FLUSH_INTERVAL_SECONDS = float(os.getenv("NOTE_FLUSH_INTERVAL_SECONDS", "5"))
+NOTE_FLUSH_BATCH_SIZE = int(os.getenv("NOTE_FLUSH_BATCH_SIZE", "500"))
+
+# Scheduler environment variables
+SCHEDULER_LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "60"))
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "2"))
+SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS = float(
+    os.getenv("SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS", "30")
+)
+JOB_SLOW_SECONDS = float(os.getenv("JOB_SLOW_SECONDS", "60"))
+# Monthly tasks partitions kept created ahead of the current month (Postgres)
+TASK_PARTITION_MONTHS_AHEAD = int(os.getenv("TASK_PARTITION_MONTHS_AHEAD", "3"))
+
+# Note storage environment variables
+NOTE_COMPRESSION = os.getenv("NOTE_COMPRESSION", "false").lower() == "true"
+NOTE_COMPRESSION_THRESHOLD = int(os.getenv("NOTE_COMPRESSION_THRESHOLD", "2048"))
+NOTE_COMPRESSION_LEVEL = int(os.getenv("NOTE_COMPRESSION_LEVEL", "6"))
 
 # Stripe environment variables
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")  # Defaults to the Stripe API
+STRIPE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STRIPE_CONNECT_TIMEOUT_SECONDS", "3"))
+STRIPE_READ_TIMEOUT_SECONDS = float(os.getenv("STRIPE_READ_TIMEOUT_SECONDS", "10"))
+STRIPE_LIFETIME_PRICE_ID = os.getenv("STRIPE_LIFETIME_PRICE_ID")
+# Lifetime price shown when it can't be looked up in Stripe, in cents
+STRIPE_LIFETIME_PRICE_AMOUNT = int(os.getenv("STRIPE_LIFETIME_PRICE_AMOUNT", "2999"))
+STRIPE_LIFETIME_PRICE_CURRENCY = os.getenv("STRIPE_LIFETIME_PRICE_CURRENCY", "usd")
+STRIPE_CATALOG_REFRESH_SECONDS = float(
+    os.getenv("STRIPE_CATALOG_REFRESH_SECONDS", "900")
+)
+# How often each worker checks the database for catalog changes applied by
+# other workers
+STRIPE_CATALOG_SYNC_SECONDS = float(os.getenv("STRIPE_CATALOG_SYNC_SECONDS", "30"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+STRIPE_POOL_SIZE = int(
+    os.getenv("STRIPE_POOL_SIZE", str(BLOCKING_EXECUTOR_MAX_WORKERS))
+)
+STRIPE_EVENTS_SWEEP_INTERVAL_SECONDS = float(
+    os.getenv("STRIPE_EVENTS_SWEEP_INTERVAL_SECONDS", "30")
+)
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENT_MAX_ATTEMPTS", "5"))
+# Claimed events not finished within this time are claimed again
+STRIPE_EVENT_CLAIM_TIMEOUT_SECONDS = float(
+    os.getenv("STRIPE_EVENT_CLAIM_TIMEOUT_SECONDS", "300")
+)
+SUBSCRIPTION_SNAPSHOT_TTL_SECONDS = int(
+    os.getenv("SUBSCRIPTION_SNAPSHOT_TTL_SECONDS", "3600")
+)
+# A snapshot refresh that was claimed but failed is retried after this long
+SUBSCRIPTION_REFRESH_RETRY_SECONDS = int(
+    os.getenv("SUBSCRIPTION_REFRESH_RETRY_SECONDS", "60")
+)
 
 # Firebase environment variables
 FIREBASE_TYPE = os.getenv("FIREBASE_TYPE")
@@ -1,13 +1,209 @@
-from sqlalchemy import create_engine
+import hashlib
+import hmac
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import declarative_base, sessionmaker
 
-from app.core.config import DATABASE_URL
+from app.core.config import (
+    DATABASE_REPLICA_URL,
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_PREPARED_STATEMENT_CACHE_SIZE,
+    READ_YOUR_WRITES_SECONDS,
+    READ_YOUR_WRITES_SECRET,
+)
+from app.core.db_pool import (
+    InstrumentedAsyncAdaptedQueuePool,
+    InstrumentedQueuePool,
+    PoolMetrics,
+)
+
+# Async drivers for each sync database URL scheme
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """
+    Swap the driver of a database URL for its async counterpart,
+    e.g. postgresql://... -> postgresql+asyncpg://...
+    """
+    backend = make_url(url).get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend} databases")
+    return ASYNC_DRIVERS[backend] + url[url.index("://") :]
+
+
+def pool_options(poolclass) -> dict:
+    """
+    Connection pool settings from configuration.
+    """
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def async_connect_args(url: str) -> dict:
+    """
+    Driver arguments for the async engines. asyncpg prepares every statement
+    server-side; caching them per connection skips the prepare round trip
+    when a statement repeats.
+    """
+    if make_url(url).get_backend_name() == "postgresql":
+        return {"prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE}
+    return {}
 
-engine = create_engine(DATABASE_URL)
+
+engine = create_engine(DATABASE_URL, **pool_options(InstrumentedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the async routes; sync sessions remain for Stripe,
+# internal routes and scheduled jobs
+async_engine = create_async_engine(
+    to_async_url(DATABASE_URL),
+    connect_args=async_connect_args(DATABASE_URL),
+    **pool_options(InstrumentedAsyncAdaptedQueuePool),
+)
+# Objects stay loaded after commit, since expired attributes can't be
+# lazily refreshed outside of an await
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Optional read replica for safe reads of the async routes
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+if DATABASE_REPLICA_URL:
+    async_replica_engine = create_async_engine(
+        to_async_url(DATABASE_REPLICA_URL),
+        connect_args=async_connect_args(DATABASE_REPLICA_URL),
+        **pool_options(InstrumentedAsyncAdaptedQueuePool),
+    )
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        async_replica_engine, autoflush=False, expire_on_commit=False
+    )
+
+# Live pool metrics, served by the internal routes
+pool_metrics = {
+    "sync": PoolMetrics().attach(engine),
+    "async": PoolMetrics().attach(async_engine.sync_engine),
+}
+if async_replica_engine:
+    pool_metrics["async_replica"] = PoolMetrics().attach(
+        async_replica_engine.sync_engine
+    )
+
+
+class RecentWriters:
+    """
+    Users who wrote within the read-your-writes window, whose reads must stay
+    on the primary until the replica has caught up with their changes.
+    Tracked per process, and across processes with signed pin tokens that
+    clients send back, e.g. in a cookie. Users are keyed by Firebase UID, so
+    a read can be routed from the auth token before the user is loaded.
+    """
+
+    def __init__(
+        self,
+        window: float = READ_YOUR_WRITES_SECONDS,
+        secret: Optional[str] = READ_YOUR_WRITES_SECRET,
+    ):
+        self.window = window
+        self.secret = secret
+        self._lock = threading.Lock()
+        self._until: Dict[str, float] = {}
+
+    def mark(self, firebase_uid: str):
+        """
+        Pin the user's reads to the primary for the window.
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Forget users whose window has passed
+            if len(self._until) > 1000:
+                self._until = {k: v for k, v in self._until.items() if v > now}
+            self._until[firebase_uid] = now + self.window
+
+    def pin_token(self, firebase_uid: str) -> Optional[str]:
+        """
+        Token pinning the user's reads for the window in any process sharing
+        the secret, or None without a secret.
+        Expiry is on the wall clock, as processes don't share a monotonic one,
+        in whole seconds so it is everything after the payload's last dot.
+        """
+        if not self.secret:
+            return None
+        payload = f"{firebase_uid}.{int(time.time() + self.window)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def is_pinned(self, firebase_uid: str, token: Optional[str] = None) -> bool:
+        with self._lock:
+            until = self._until.get(firebase_uid)
+        if until is not None and until > time.monotonic():
+            return True
+        return token is not None and self._token_pins(firebase_uid, token)
+
+    def _token_pins(self, firebase_uid: str, token: str) -> bool:
+        if not self.secret:
+            return False
+        payload, _, signature = token.rpartition(".")
+        if not hmac.compare_digest(signature.encode(), self._sign(payload).encode()):
+            return False
+        token_uid, _, until = payload.rpartition(".")
+        try:
+            return token_uid == firebase_uid and int(until) > time.time()
+        except ValueError:
+            return False
+
+    def _sign(self, payload: str) -> str:
+        return hmac.new(
+            self.secret.encode(), payload.encode(), hashlib.sha256
+        ).hexdigest()
+
+
+# Shared tracker for this process
+recent_writers = RecentWriters()
+
+
+def insert_if_missing(db, model, **values) -> bool:
+    """
+    Insert a row unless one with the same key exists, without an error that
+    would abort the caller's transaction. Returns whether the row was inserted.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        statement = postgresql.insert(model).values(**values).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        statement = sqlite.insert(model).values(**values).on_conflict_do_nothing()
+    else:
+        try:
+            with db.begin_nested():
+                db.execute(insert(model).values(**values))
+            return True
+        except IntegrityError:
+            return False
+    return bool(db.execute(statement).rowcount)
+
 
 def get_db():
     db = SessionLocal()
@@ -15,3 +211,17 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_replica_db():
+    """
+    Session on the read replica, or on the primary without one.
+    Only use it for reads through get_async_read_db.
+    """
+    async with (AsyncReplicaSessionLocal or AsyncSessionLocal)() as db:
+        yield db
@@ -0,0 +1,130 @@
+import bisect
+import threading
+import time
+import weakref
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds of the checkout wait histogram buckets, in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class TimedCheckoutMixin:
+    """
+    Times how long each checkout waits for a free connection.
+    The wait is stashed on the connection record for the checkout listener.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        record = super()._do_get()
+        record.info["checkout_wait"] = time.perf_counter() - started
+        return record
+
+
+class InstrumentedQueuePool(TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class PoolMetrics:
+    """
+    Live connection pool metrics collected with pool event listeners:
+    checkouts, new connections, checkout wait times and connection ages.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine: Optional[Engine] = None
+        self._records = weakref.WeakSet()
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def attach(self, engine: Engine):
+        """
+        Listen to the engine's pool events. Listeners survive engine.dispose().
+        """
+        self._engine = engine
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        return self
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+            self._records.add(connection_record)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        wait = connection_record.info.pop("checkout_wait", 0.0)
+        bucket = bisect.bisect_left(WAIT_BUCKETS_MS, wait * 1000)
+        with self._lock:
+            self.checkouts += 1
+            self.wait_counts[bucket] += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def metrics(self) -> dict:
+        """
+        Get pool usage, the checkout wait histogram and open connection ages.
+        """
+        pool = self._engine.pool if self._engine else None
+        now = time.time()
+        with self._lock:
+            ages = sorted(
+                now - record.starttime
+                for record in self._records
+                if record.dbapi_connection is not None
+            )
+            checkouts = self.checkouts
+            wait_counts = list(self.wait_counts)
+            wait_total = self.wait_total
+            wait_max = self.wait_max
+            connects = self.connects
+            invalidations = self.invalidations
+
+        status = {}
+        if isinstance(pool, QueuePool):
+            status = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout_seconds": pool.timeout(),
+            }
+
+        return {
+            "pool": type(pool).__name__ if pool else None,
+            **status,
+            "connects": connects,
+            "checkouts": checkouts,
+            "invalidations": invalidations,
+            "wait_ms": {
+                "avg": round(wait_total / checkouts * 1000, 3) if checkouts else 0,
+                "max": round(wait_max * 1000, 3),
+                "histogram": [
+                    {"le": le, "count": count}
+                    for le, count in zip((*WAIT_BUCKETS_MS, None), wait_counts)
+                ],
+            },
+            "connection_age_seconds": {
+                "open": len(ages),
+                "min": round(ages[0], 1) if ages else 0,
+                "max": round(ages[-1], 1) if ages else 0,
+            },
+        }
@@ -0,0 +1,25 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import BLOCKING_EXECUTOR_MAX_WORKERS
+
+# Dedicated pool for blocking Stripe SDK and database calls made from async
+# handlers, kept separate from the threadpool that runs sync routes
+blocking_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_EXECUTOR_MAX_WORKERS, thread_name_prefix="blocking"
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking call in the bounded executor without blocking the event loop.
+    At most BLOCKING_EXECUTOR_MAX_WORKERS calls run at once; the rest queue.
+    """
+    loop = asyncio.get_running_loop()
+    # Carry context variables, such as the request's SQL stats, into the thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        blocking_executor, functools.partial(context.run, func, *args, **kwargs)
+    )
@@ -0,0 +1,25 @@
+from sqlalchemy import func
+
+
+def display_order(model, *partition_by):
+    """
+    Dense 1..n order computed at read time, keeping the stored (order, id)
+    sequence within each partition.
+    Stored orders may have gaps when order compaction is deferred.
+    """
+    return (
+        func.row_number()
+        .over(partition_by=partition_by or None, order_by=(model.order, model.id))
+        .label("display_order")
+    )
+
+
+def densify_orders(items):
+    """
+    Renumber loaded rows to 1..n in their stored (order, id) sequence.
+    Only rows whose order changes are marked dirty.
+    """
+    ordered = sorted(items, key=lambda item: (item.order, item.id))
+    for idx, item in enumerate(ordered, start=1):
+        if item.order != idx:
+            setattr(item, "order", idx)
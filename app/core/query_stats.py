@@ -0,0 +1,178 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.config import DB_STATEMENT_BUDGET, DB_STATS_HEADERS, DB_STRICT_MODE
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """
+    A request ran more SQL statements than its route's budget allows.
+    """
+
+
+class LazyLoadDetected(RuntimeError):
+    """
+    A request lazily loaded a relationship, one query per parent object.
+    """
+
+
+class QueryStats:
+    """
+    SQL statements and database time of one request.
+    """
+
+    def __init__(self, budget: Optional[int] = None, strict: bool = False):
+        self.budget = budget
+        self.strict = strict
+        self.route: Optional[str] = None
+        self.statements = 0
+        self.lazy_loads = 0
+        self.db_time = 0.0
+
+
+# Stats of the request being handled, if any
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+@contextmanager
+def collect_query_stats(budget: Optional[int] = None, strict: bool = False):
+    """
+    Count the statements run in this context, including threads and tasks
+    started from it. In strict mode, going over the budget or lazily loading
+    a relationship raises before the statement runs.
+    """
+    stats = QueryStats(budget, strict)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def current_route() -> Optional[str]:
+    """
+    Get the method and path template of the route being handled, if any.
+    """
+    stats = _current_stats.get()
+    return stats.route if stats is not None else None
+
+
+def route_template(request: Request) -> str:
+    """
+    Get the path template of the matched route, e.g. /tasks/{task_id}, so one
+    route's requests group together.
+    """
+    route = request.scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return request.url.path
+
+    # Routes of included routers can be matched relative to their prefix, so
+    # keep the segments of the path before the part the route matched
+    parts = request.scope["path"].split("/")
+    prefix = parts[: len(parts) - path_format.count("/")]
+    return "/".join(prefix) + path_format
+
+
+async def apply_route_stats(request: Request):
+    """
+    Record the matched route and apply its statement budget to the request's
+    stats. Runs as an app-wide dependency, since routing happens after
+    middleware.
+    """
+    stats = _current_stats.get()
+    if stats is None:
+        return
+
+    stats.route = f"{request.method} {route_template(request)}"
+    budget = getattr(request.scope.get("endpoint"), "statement_budget", None)
+    if budget is not None:
+        stats.budget = budget
+
+
+def statement_budget(limit: int):
+    """
+    Set the most SQL statements a route may run per request, including the
+    user lookup in auth.
+    """
+
+    def decorator(func):
+        func.statement_budget = limit
+        return func
+
+    return decorator
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+
+    # executemany() is one statement per row on drivers such as psycopg2
+    stats.statements += len(parameters) if executemany else 1
+    if stats.strict and stats.budget is not None and stats.statements > stats.budget:
+        raise QueryBudgetExceeded(
+            f"{stats.statements} statements run, over the budget of {stats.budget}: "
+            f"{statement}"
+        )
+    if context is not None:
+        # Kept on the statement's context rather than the connection, so
+        # statements that raise leave nothing behind
+        context._query_stats_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = getattr(context, "_query_stats_started", None)
+    if stats is None or started is None:
+        return
+
+    stats.db_time += time.perf_counter() - started
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(orm_execute_state):
+    stats = _current_stats.get()
+    if (
+        stats is None
+        or not orm_execute_state.is_select
+        or orm_execute_state.lazy_loaded_from is None
+    ):
+        return
+
+    stats.lazy_loads += 1
+    if stats.strict:
+        raise LazyLoadDetected(
+            f"Lazy load from {orm_execute_state.lazy_loaded_from.class_.__name__}: "
+            "load the relationship with the query instead"
+        )
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """
+    Counts SQL statements and database time per request.
+    Adds them as X-DB-* response headers when DB_STATS_HEADERS is enabled,
+    and enforces route budgets and forbids lazy loads when DB_STRICT_MODE is.
+    """
+
+    async def dispatch(self, request, call_next):
+        with collect_query_stats(DB_STATEMENT_BUDGET, DB_STRICT_MODE) as stats:
+            response = await call_next(request)
+
+        if DB_STATS_HEADERS:
+            response.headers["X-DB-Statements"] = str(stats.statements)
+            response.headers["X-DB-Time-Ms"] = f"{stats.db_time * 1000:.2f}"
+            response.headers["X-DB-Lazy-Loads"] = str(stats.lazy_loads)
+        return response
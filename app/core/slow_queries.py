@@ -0,0 +1,223 @@
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+from app.core.config import (
+    DB_SLOW_QUERY_EXPLAIN,
+    DB_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+    DB_SLOW_QUERY_LOG_SIZE,
+    DB_SLOW_QUERY_MS,
+)
+from app.core.database import engine as primary_engine
+from app.core.query_stats import current_route
+
+# Bind placeholders of the DB-API paramstyles in use (qmark, pyformat, asyncpg)
+PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)"
+IN_LIST = re.compile(rf"\bIN \(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)")
+# Row locking clauses, which EXPLAIN ANALYZE would take again
+LOCKING = re.compile(r"\bFOR (?:NO KEY )?(?:UPDATE|SHARE|KEY SHARE)\b")
+
+# Single worker, so plan captures never compete with requests for connections
+explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Collapse whitespace and IN lists, so one statement with different
+    numbers of bound values reads the same. Values are always bound,
+    so the SQL holds no literals to strip.
+    """
+    return IN_LIST.sub("IN (...)", " ".join(statement.split()))
+
+
+def _types(params):
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def param_shape(parameters, executemany: bool):
+    """
+    Describe bound parameters by type only, so no user data is kept.
+    """
+    if executemany:
+        return {
+            "rows": len(parameters),
+            "row": _types(parameters[0]) if parameters else None,
+        }
+    return _types(parameters)
+
+
+class Explain(Executable, ClauseElement):
+    """
+    EXPLAIN of a SELECT, compiled for the dialect it runs on.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain_postgresql(element, compiler, **kw):
+    return "EXPLAIN (ANALYZE, BUFFERS) " + compiler.process(element.statement, **kw)
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of the most recent statements slower than the threshold,
+    with the route that ran them and, optionally, their query plans.
+    Kept per process, like the pool metrics.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = DB_SLOW_QUERY_MS,
+        size: int = DB_SLOW_QUERY_LOG_SIZE,
+        explain: bool = DB_SLOW_QUERY_EXPLAIN,
+        explain_interval: float = DB_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=size)
+        self._explained: Dict[str, float] = {}
+        self._explain_engines: Dict[URL, Engine] = {}
+
+    def record(self, conn, statement, parameters, context, executemany, duration):
+        """
+        Add a slow statement, and queue its plan capture when enabled.
+        """
+        sql = normalize_sql(statement)
+        record = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "sql": sql,
+            "params": param_shape(parameters, executemany),
+            "route": current_route(),
+            "plan": None,
+        }
+        with self._lock:
+            self._records.append(record)
+
+        # Only compiled SELECTs that lock no rows are planned again, so
+        # EXPLAIN ANALYZE never repeats a write or takes row locks
+        compiled = context.compiled
+        explainable = (
+            compiled is not None
+            and getattr(compiled.statement, "is_select", False)
+            and getattr(compiled.statement, "_for_update_arg", None) is None
+            and not LOCKING.search(sql)
+        )
+        if self.explain and explainable and self._claim(sql):
+            explain_executor.submit(
+                self._capture_plan,
+                record,
+                conn.engine,
+                context.compiled.statement,
+                context.compiled_parameters[0],
+            )
+
+    def _claim(self, sql: str) -> bool:
+        """
+        Check whether the statement's plan is due, marking it captured if so.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._explained.get(sql, 0) > now:
+                return False
+            # Forget statements whose interval has passed
+            if len(self._explained) > 1000:
+                self._explained = {k: v for k, v in self._explained.items() if v > now}
+            self._explained[sql] = now + self.explain_interval
+            return True
+
+    def _explain_engine(self, source_engine: Engine) -> Engine:
+        """
+        Get a sync engine on the database that ran a statement. Async engines
+        can't be used from the explain thread, so their statements are
+        planned over a sync driver, e.g. replica reads on the replica.
+        """
+        if not source_engine.dialect.is_async:
+            return source_engine
+
+        url = source_engine.url
+        url = url.set(drivername=url.get_backend_name())
+        if url == primary_engine.url:
+            return primary_engine
+        with self._lock:
+            if url not in self._explain_engines:
+                # Connections are only opened for the rare plan capture
+                self._explain_engines[url] = create_engine(url, poolclass=NullPool)
+            return self._explain_engines[url]
+
+    def _capture_plan(self, record, source_engine, statement, params):
+        try:
+            with self._explain_engine(source_engine).connect() as conn:
+                rows = (
+                    conn.execution_options(slow_query_log=False)
+                    .execute(Explain(statement), params)
+                    .all()
+                )
+            # The plan text is the last column on both Postgres and SQLite
+            plan = [str(row[-1]) for row in rows]
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        with self._lock:
+            record["plan"] = plan
+
+    def records(self) -> List[dict]:
+        """
+        Get the recorded statements, newest first.
+        """
+        with self._lock:
+            return [dict(record) for record in reversed(self._records)]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._explained.clear()
+
+
+# Shared log for this process
+slow_query_log = SlowQueryLog()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        # Kept on the statement's context, so statements that raise leave
+        # nothing behind on the connection
+        context._slow_query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+
+    duration = time.perf_counter() - started
+    if duration * 1000 < slow_query_log.threshold_ms or not (
+        context.execution_options.get("slow_query_log", True)
+    ):
+        return
+    slow_query_log.record(conn, statement, parameters, context, executemany, duration)
@@ -1,17 +1,40 @@
+import math
+import secrets
 from datetime import datetime
+from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Cookie, Depends, Header, HTTPException, Request, Response, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from firebase_admin import auth as firebase_auth
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.config import ENV, INTERNAL_API_TOKEN
+from app.core.database import (
+    get_async_db,
+    get_async_replica_db,
+    get_db,
+    recent_writers,
+)
+from app.core.executor import run_blocking
 from app.models.user import User
 from app.services.firebase_admin import firebase_auth
 
 # Use HTTPBearer to extract the token from the Authorization header.
 security = HTTPBearer()
 
+# Methods that never write, so don't pin reads to the primary
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Cookie carrying a user's read pin to whichever worker serves their next read
+READ_PIN_COOKIE = "read_pin"
+
+# Every authenticated request runs this lookup, so it's built only once
+USER_BY_FIREBASE_UID = select(User).where(
+    User.firebase_uid == bindparam("firebase_uid")
+)
+
 
 def get_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -35,7 +58,11 @@ def get_user(
     email = decoded_token.get("email")
 
     # Check if the user exists by Firebase UID
-    user = db.query(User).filter(User.firebase_uid == firebase_uid).first()
+    user = (
+        db.execute(USER_BY_FIREBASE_UID, {"firebase_uid": firebase_uid})
+        .scalars()
+        .first()
+    )
     if user:
         return user
     else:
@@ -81,3 +108,120 @@ def get_subscribed_user(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail="User is not subscribed",
         )
+
+
+def pin_reads(response: Response, firebase_uid: str):
+    """
+    Pins the user's reads to the primary for the read-your-writes window:
+    in this worker, and in the others through a signed cookie.
+    """
+    recent_writers.mark(firebase_uid)
+    token = recent_writers.pin_token(firebase_uid)
+    if token:
+        response.set_cookie(
+            READ_PIN_COOKIE,
+            token,
+            max_age=math.ceil(recent_writers.window),
+            httponly=True,
+            samesite="strict",
+            secure=ENV != "dev",
+        )
+
+
+async def get_async_token(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> dict:
+    """
+    Verifies the Firebase token for async routes.
+    Verification may fetch Google's signing keys, so it runs off the event loop.
+    """
+    token = credentials.credentials
+
+    try:
+        return await run_blocking(firebase_auth.verify_id_token, token)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token"
+        )
+
+
+async def get_async_read_db(
+    request: Request,
+    decoded_token: dict = Depends(get_async_token),
+    db: AsyncSession = Depends(get_async_db),
+    replica_db: AsyncSession = Depends(get_async_replica_db),
+    read_pin: Optional[str] = Cookie(default=None, alias=READ_PIN_COOKIE),
+) -> AsyncSession:
+    """
+    Session for the user's safe reads: the replica, unless the request may
+    write or the user wrote recently, in this worker or another, and the
+    replica might not have their change yet.
+    Pins are checked from the token, so unpinned reads, including the user
+    lookup, never touch the primary.
+    Sessions only connect when used, so the one not returned costs nothing.
+    """
+    if request.method not in SAFE_METHODS or recent_writers.is_pinned(
+        decoded_token.get("uid"), read_pin
+    ):
+        return db
+    return replica_db
+
+
+async def get_async_user(
+    request: Request,
+    response: Response,
+    decoded_token: dict = Depends(get_async_token),
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_async_read_db),
+) -> User:
+    """
+    Retrieves the user from the Firebase token for async routes.
+    Safe reads load the user on the read session, falling back to the
+    primary for users the replica doesn't have yet. Users making writes have
+    their reads pinned to the primary.
+    """
+    firebase_uid = decoded_token.get("uid")
+
+    # Check if the user exists by Firebase UID
+    result = await read_db.execute(USER_BY_FIREBASE_UID, {"firebase_uid": firebase_uid})
+    user = result.scalars().first()
+    if not user and read_db is not db:
+        result = await db.execute(USER_BY_FIREBASE_UID, {"firebase_uid": firebase_uid})
+        user = result.scalars().first()
+    if user:
+        if request.method not in SAFE_METHODS:
+            pin_reads(response, firebase_uid)
+        return user
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+
+
+async def get_async_subscribed_user(
+    user: User = Depends(get_async_user),
+) -> User:
+    """
+    Retrieves the user for async routes and checks if they are subscribed.
+    """
+    if user.is_subscribed is True:
+        return user
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail="User is not subscribed",
+        )
+
+
+def get_internal_access(
+    x_internal_token: Optional[str] = Header(default=None),
+):
+    """
+    Guards internal endpoints.
+    Requires the X-Internal-Token header, so they're closed when
+    INTERNAL_API_TOKEN isn't set.
+    """
+    if not INTERNAL_API_TOKEN or not secrets.compare_digest(
+        x_internal_token or "", INTERNAL_API_TOKEN
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
@@ -1,27 +1,45 @@
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import ENV, WEB_URL
 from app.core.database import Base
-from app.routes import backlogs, notes, stripe, tasks, users
-from app.scheduler import start_scheduler
+from app.core.executor import run_blocking
+from app.core.query_stats import QueryStatsMiddleware, apply_route_stats
+from app.routes import backlogs, internal, notes, stripe, tasks, users
+from app.scheduler import start_scheduler, stop_scheduler
+from app.services.catalog import catalog
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Load models to register them with Base
-    from app.models import backlog, note, task, user
+    from app.models import (
+        backlog,
+        catalog_version,
+        job_run,
+        note,
+        scheduler_lease,
+        stripe_event,
+        task,
+        user,
+    )
 
-    # Initialize the scheduler
-    start_scheduler()
+    # Load Stripe prices and products for plan lookups
+    await run_blocking(catalog.refresh)
+
+    # Initialize the scheduler on the app's event loop
+    scheduler = start_scheduler()
 
     yield  # App startup complete
 
+    # Let running jobs finish and write any buffered note autosaves
+    await stop_scheduler(scheduler)
+
 
 # Attach lifespan here
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(apply_route_stats)])
 
 # Add CORS middleware
 allowed_origins = []
@@ -44,9 +62,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Count SQL statements per request
+app.add_middleware(QueryStatsMiddleware)
+
 # Include routers
 app.include_router(users.router, prefix="/users", tags=["users"])
 app.include_router(tasks.router, prefix="/tasks", tags=["tasks"])
 app.include_router(notes.router, prefix="/notes", tags=["notes"])
 app.include_router(backlogs.router, prefix="/backlogs", tags=["backlogs"])
 app.include_router(stripe.router, prefix="/api/stripe", tags=["stripe"])
+app.include_router(internal.router, prefix="/internal", tags=["internal"])
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, DateTime, Integer, String
+
+from app.core.database import Base
+
+
+class CatalogVersion(Base):
+    """
+    Catalog Version Database Schema / SQLAlchemy ORM Model
+    """
+
+    __tablename__ = "catalog_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
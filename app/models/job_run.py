@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String
+
+from app.core.database import Base
+
+
+class JobRun(Base):
+    """
+    Job Run Database Schema / SQLAlchemy ORM Model
+    """
+
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        Index("ix_job_runs_job_name_started_at", "job_name", "started_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Float, nullable=False)
+    rows_affected = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
@@ -1,6 +1,19 @@
-from sqlalchemy import Column, Date, ForeignKey, Integer, String
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+)
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
+from app.core.compression import compress_entry, decompress_entry
 from app.core.database import Base
 
 
@@ -10,10 +23,44 @@ class Note(Base):
     """
 
     __tablename__ = "notes"
+    __table_args__ = (
+        # Notes are looked up by user and day
+        Index("ix_notes_user_id_date", "user_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     date = Column(Date)
-    entry = Column(String)
+    entry_text = Column("entry", String)
+    entry_compressed = Column(LargeBinary, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Last write, so cleanup spares notes that are still being typed into
+    updated_at = Column(
+        DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
 
     user = relationship("User", back_populates="notes")
+
+    @hybrid_property
+    def entry(self):
+        """
+        The note entry, decompressed if it was stored compressed.
+        """
+        return decompress_entry(self.entry_text, self.entry_compressed)
+
+    @entry.setter
+    def entry(self, value):
+        self.entry_text, self.entry_compressed = compress_entry(value)
+
+    @entry.expression
+    def entry(cls):
+        # Compressed entries are never empty, so filters on the text column hold
+        return cls.entry_text
+
+    @classmethod
+    def entry_values(cls, entry):
+        """
+        Column values for writing an entry with a bulk UPDATE.
+        """
+        text, compressed = compress_entry(entry)
+        return {cls.entry_text: text, cls.entry_compressed: compressed}
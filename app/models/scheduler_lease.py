@@ -0,0 +1,15 @@
+from sqlalchemy import Column, DateTime, String
+
+from app.core.database import Base
+
+
+class SchedulerLease(Base):
+    """
+    Scheduler Lease Database Schema / SQLAlchemy ORM Model
+    """
+
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
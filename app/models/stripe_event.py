@@ -0,0 +1,24 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from app.core.database import Base
+
+
+class StripeEvent(Base):
+    """
+    Stripe Event Database Schema / SQLAlchemy ORM Model
+    """
+
+    __tablename__ = "stripe_events"
+    __table_args__ = (
+        Index("ix_stripe_events_status_received_at", "status", "received_at"),
+    )
+
+    id = Column(String, primary_key=True)  # Stripe event ID
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    received_at = Column(DateTime, nullable=False)
+    claimed_at = Column(DateTime, nullable=True)  # When processing started
+    processed_at = Column(DateTime, nullable=True)
+    error = Column(String, nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Date, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, Date, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -10,10 +10,16 @@ class Task(Base):
     """
 
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Every task read is for one user's day or date range
+        Index("ix_tasks_user_id_date", "user_id", "date"),
+    )
 
+    # On Postgres, tasks is partitioned by month of date with a primary key
+    # of (id, date); ids stay unique through their shared sequence
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    date = Column(Date)
+    date = Column(Date, nullable=False)
     title = Column(String)
     note = Column(String)
     is_completed = Column(Boolean, default=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, text
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -10,6 +10,17 @@ class User(Base):
     """
 
     __tablename__ = "users"
+    __table_args__ = (
+        # Webhooks look users up by Stripe customer and subscription
+        Index(
+            "ix_users_stripe_customer_id",
+            "stripe_customer_id",
+            unique=True,
+            postgresql_where=text("stripe_customer_id IS NOT NULL"),
+            sqlite_where=text("stripe_customer_id IS NOT NULL"),
+        ),
+        Index("ix_users_stripe_subscription_id", "stripe_subscription_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     firebase_uid = Column(String, unique=True, index=True, nullable=False)
@@ -24,6 +35,14 @@ class User(Base):
     )  # (e.g., "active", "canceled", "past_due", etc.)
     is_subscribed = Column(Boolean, default=False)
 
+    # Snapshot of the Stripe subscription, kept up to date by webhooks
+    subscription_period_end = Column(DateTime, nullable=True)
+    cancel_at_period_end = Column(Boolean, nullable=True)
+    plan_name = Column(String, nullable=True)
+    price_unit_amount = Column(Integer, nullable=True)  # In cents
+    price_currency = Column(String, nullable=True)
+    subscription_synced_at = Column(DateTime, nullable=True)
+
     tasks = relationship("Task", back_populates="user", cascade="all, delete-orphan")
     notes = relationship("Note", back_populates="user", cascade="all, delete-orphan")
     backlogs = relationship(
@@ -3,11 +3,14 @@ from typing import List, Optional
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import case, func
-from sqlalchemy.orm import Session
-
-from app.core.database import get_db
-from app.deps.auth import get_subscribed_user
+from sqlalchemy import bindparam, case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import ORDER_COMPACTION
+from app.core.database import get_async_db
+from app.core.ordering import densify_orders, display_order
+from app.core.query_stats import statement_budget
+from app.deps.auth import get_async_read_db, get_async_subscribed_user
 from app.models.backlog import Backlog
 from app.models.user import User
 from app.schemas.backlog import BacklogCreate, BacklogOut, BacklogUpdate
@@ -15,25 +18,64 @@ from app.schemas.backlog import BacklogCreate, BacklogOut, BacklogUpdate
 # Create a router
 router = APIRouter()
 
+# Hot-path statements are built once with bound parameters, so requests
+# skip rebuilding them and SQLAlchemy finds their compiled form by identity
+BACKLOG_ORDER = display_order(Backlog)
+USER_BACKLOGS = (
+    select(Backlog, BACKLOG_ORDER)
+    .where(Backlog.user_id == bindparam("user_id"))
+    .order_by(BACKLOG_ORDER)
+)
+USER_BACKLOG = select(Backlog).where(
+    Backlog.id == bindparam("backlog_id"), Backlog.user_id == bindparam("user_id")
+)
+OTHER_BACKLOGS = (
+    select(Backlog)
+    .where(
+        Backlog.user_id == bindparam("user_id"),
+        Backlog.id != bindparam("backlog_id"),
+    )
+    .order_by(Backlog.order)
+)
+
+
+async def get_user_backlog(
+    db: AsyncSession, backlog_id: int, user_id: int
+) -> Optional[Backlog]:
+    """
+    Get a backlog by id if it belongs to the user.
+    """
+    result = await db.execute(
+        USER_BACKLOG, {"backlog_id": backlog_id, "user_id": user_id}
+    )
+    return result.scalars().first()
+
 
 @router.get("/", response_model=List[BacklogOut])
-def get_backlogs(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+@statement_budget(2)
+async def get_backlogs(
+    db: AsyncSession = Depends(get_async_read_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Get backlogs for the current user.
+    Orders are renumbered at read time, so gaps left by deferred compaction
+    are never visible.
     """
-    user_id = user.id
-    query = db.query(Backlog).filter(Backlog.user_id == user_id)
-    return query.order_by(Backlog.order).all()
+    result = await db.execute(USER_BACKLOGS, {"user_id": user.id})
+
+    return [
+        BacklogOut.model_validate(backlog).model_copy(update={"order": backlog_order})
+        for backlog, backlog_order in result.all()
+    ]
 
 
 @router.post("/", response_model=BacklogOut)
-def create_backlog(
+@statement_budget(3)
+async def create_backlog(
     backlog: BacklogCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Create a new backlog for the current user.
@@ -41,8 +83,11 @@ def create_backlog(
     user_id = user.id
 
     # Shift existing backlogs' order by 1
-    db.query(Backlog).filter(Backlog.user_id == user_id).update(
-        {"order": Backlog.order + 1}
+    await db.execute(
+        update(Backlog)
+        .where(Backlog.user_id == user_id)
+        .values({"order": Backlog.order + 1})
+        .execution_options(synchronize_session=False)
     )
 
     # Create the new backlog
@@ -53,32 +98,24 @@ def create_backlog(
         order=1,
     )
 
+    # The insert fetches the new id; the rest is already in memory
     db.add(new_backlog)
-    db.commit()
-    db.refresh(new_backlog)
+    await db.commit()
 
     return new_backlog
 
 
 @router.patch("/{backlog_id}", response_model=BacklogOut)
-def update_backlog(
+async def update_backlog(
     backlog_id: int,
     updates: BacklogUpdate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Update a backlog for the current user.
     """
     user_id = user.id
-    backlog = (
-        db.query(Backlog)
-        .filter(Backlog.id == backlog_id, Backlog.user_id == user_id)
-        .first()
-    )
-    if not backlog:
-        raise HTTPException(status_code=404, detail="Backlog not found")
-
     update_data = updates.model_dump(exclude_unset=True)
 
     # Enforce only one type of update at a time
@@ -95,6 +132,26 @@ def update_backlog(
             detail="Only one type of update is allowed per request (order or detail).",
         )
 
+    # Detail updates don't move other backlogs, so they're written and read
+    # back in a single UPDATE ... RETURNING
+    if matched_groups == ["detail"]:
+        result = await db.execute(
+            update(Backlog)
+            .where(Backlog.id == backlog_id, Backlog.user_id == user_id)
+            .values(detail=update_data.get("detail"), date=date.today())
+            .returning(Backlog)
+        )
+        backlog = result.scalars().first()
+        if not backlog:
+            raise HTTPException(status_code=404, detail="Backlog not found")
+
+        await db.commit()
+        return backlog
+
+    backlog = await get_user_backlog(db, backlog_id, user_id)
+    if not backlog:
+        raise HTTPException(status_code=404, detail="Backlog not found")
+
     # Handle order update
     if "order" in update_fields:
         new_order = update_data.get("order")
@@ -102,11 +159,13 @@ def update_backlog(
             raise HTTPException(status_code=400, detail="Order must be 1 or greater")
 
         other_backlogs = (
-            db.query(Backlog)
-            .filter(Backlog.user_id == user_id, Backlog.id != backlog_id)
-            .order_by(Backlog.order)
-            .all()
-        )
+            await db.scalars(
+                OTHER_BACKLOGS, {"user_id": user_id, "backlog_id": backlog_id}
+            )
+        ).all()
+
+        # Close any gaps left by deferred compaction before shifting
+        densify_orders([backlog, *other_backlogs])
 
         # Ensure the new order is within the valid range
         max_order = len(other_backlogs) + 1
@@ -127,49 +186,54 @@ def update_backlog(
 
         setattr(backlog, "order", new_order)
 
-    # Handle detail and date update
-    elif {"detail"} & update_fields:
-        setattr(backlog, "detail", update_data.get("detail"))
-        setattr(backlog, "date", date.today())
-
-    db.commit()
-    db.refresh(backlog)
+    # Changed orders are plain values, so the backlog in memory is current
+    await db.commit()
     return backlog
 
 
 @router.delete("/{backlog_id}")
-def delete_backlog(
+async def delete_backlog(
     backlog_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Delete a backlog for the current user.
+    With deferred order compaction, only the row is deleted; reads renumber
+    the backlogs and the nightly compact_orders job fixes the stored orders.
     """
     user_id = user.id
-    backlog = (
-        db.query(Backlog)
-        .filter(Backlog.id == backlog_id, Backlog.user_id == user_id)
-        .first()
-    )
+
+    if ORDER_COMPACTION == "deferred":
+        result = await db.execute(
+            delete(Backlog)
+            .where(Backlog.id == backlog_id, Backlog.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            raise HTTPException(status_code=404, detail="Backlog not found")
+
+        await db.commit()
+        return {"message": "Backlog deleted"}
+
+    backlog = await get_user_backlog(db, backlog_id, user_id)
     if not backlog:
         raise HTTPException(status_code=404, detail="Backlog not found")
 
     backlog_order = backlog.order
 
-    db.delete(backlog)
-    db.commit()
+    await db.delete(backlog)
+    await db.commit()
 
     # Reorder the remaining backlogs
-    remaining_backlogs = (
-        db.query(Backlog)
-        .filter(Backlog.user_id == user_id, Backlog.order > backlog_order)
+    remaining_backlogs = await db.scalars(
+        select(Backlog)
+        .where(Backlog.user_id == user_id, Backlog.order > backlog_order)
         .order_by(Backlog.order)
-        .all()
     )
 
     for t in remaining_backlogs:
         setattr(t, "order", getattr(t, "order") - 1)
 
-    db.commit()
+    await db.commit()
     return {"message": "Backlog deleted and remaining reordered"}
@@ -0,0 +1,59 @@
+"""
+These routes expose internal metrics and are not meant for clients.
+"""
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db, pool_metrics
+from app.core.slow_queries import slow_query_log
+from app.deps.auth import get_internal_access
+from app.schemas.job_run import JobRunsOut
+from app.services.jobs import get_job_stats, get_recent_runs
+from app.services.note_buffer import note_buffer
+
+# Create a router
+router = APIRouter(dependencies=[Depends(get_internal_access)])
+
+
+@router.get("/metrics/note-buffer")
+def get_note_buffer_metrics():
+    """
+    Get write-behind metrics for note autosaves.
+    """
+    return note_buffer.metrics()
+
+
+@router.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    """
+    Get connection pool usage, checkout waits and connection ages per engine.
+    """
+    return {name: metrics.metrics() for name, metrics in pool_metrics.items()}
+
+
+@router.get("/slow-queries")
+def get_slow_queries():
+    """
+    Get the most recent statements over the slow query threshold, newest first,
+    with their routes, bound parameter types and any captured query plans.
+    """
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.records(),
+    }
+
+
+@router.get("/jobs", response_model=JobRunsOut)
+def get_job_runs(
+    limit: int = 20,
+    window: int = 100,
+    db: Session = Depends(get_db),
+):
+    """
+    Get recent scheduled job runs and duration percentiles per job.
+    """
+    return {
+        "recent_runs": get_recent_runs(db, limit),
+        "stats": get_job_stats(db, window),
+    }
@@ -1,111 +1,257 @@
-from datetime import date
+from datetime import date, datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.deps.auth import get_subscribed_user
+from app.core.config import NOTE_WRITE_BEHIND
+from app.core.database import get_async_db
+from app.core.query_stats import statement_budget
+from app.deps.auth import get_async_read_db, get_async_subscribed_user, pin_reads
 from app.models.note import Note
 from app.models.user import User
-from app.schemas.note import NoteCreate, NoteOut, NoteUpdate
+from app.schemas.note import (
+    NoteCreate,
+    NoteEdit,
+    NoteEdits,
+    NoteOut,
+    NoteUpdate,
+    NoteVersionOut,
+)
+from app.services.note_buffer import PendingNote, note_buffer
 
 # Create a router
 router = APIRouter()
 
 
+# Hot-path statements are built once with bound parameters, so requests
+# skip rebuilding them and SQLAlchemy finds their compiled form by identity
+USER_NOTE_BY_DATE = select(Note).where(
+    Note.user_id == bindparam("user_id"), Note.date == bindparam("date")
+)
+USER_NOTE_BY_ID = select(Note).where(
+    Note.user_id == bindparam("user_id"), Note.id == bindparam("id")
+)
+
+
+async def get_user_note(db: AsyncSession, user_id: int, **filters) -> Optional[Note]:
+    """
+    Get the user's note by date or by id.
+    """
+    statement = USER_NOTE_BY_DATE if "date" in filters else USER_NOTE_BY_ID
+    result = await db.execute(statement, {"user_id": user_id, **filters})
+    return result.scalars().first()
+
+
 @router.get("/", response_model=NoteOut)
-def get_or_create_note(
+@statement_budget(4)
+async def get_or_create_note(
     date: date,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_async_read_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Get the note for the given date.
     If it doesn't exist, create a new one and return it.
     """
-    # Get the note for the specified date
+    # Get the note for the specified date, from the primary if the replica
+    # doesn't have it (yet)
     user_id = user.id
-    note = db.query(Note).filter(Note.user_id == user_id, Note.date == date).first()
+    note = await get_user_note(read_db, user_id, date=date)
+    if not note and read_db is not db:
+        note = await get_user_note(db, user_id, date=date)
     if note:
+        # Serve autosaves that haven't been flushed yet
+        pending = note_buffer.get(note.id)
+        if pending:
+            return pending._asdict()
         return note
 
     # Create a new note if it doesn't exist
     new_note = Note(date=date, user_id=user_id, entry="")
     db.add(new_note)
-    db.commit()
-    db.refresh(new_note)
+    await db.commit()
+    pin_reads(response, user.firebase_uid)
     return new_note
 
 
 @router.post("/", response_model=NoteOut)
-def create_note(
+@statement_budget(3)
+async def create_note(
     note: NoteCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Create a new note for the current user.
     """
     # Check if note already exists for this date
     user_id = user.id
-    existing = (
-        db.query(Note).filter(Note.user_id == user_id, Note.date == note.date).first()
-    )
+    existing = await get_user_note(db, user_id, date=note.date)
     if existing:
         raise HTTPException(status_code=400, detail="Note already exists for this date")
 
     # Create the note
+    # The insert fetches the new id and the version default is set in Python
     db_note = Note(**note.model_dump(), user_id=user_id)
     db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
+    await db.commit()
     return db_note
 
 
 @router.patch("/{note_id}", response_model=NoteOut)
-def update_note(
+@statement_budget(2)
+async def update_note(
     note_id: int,
     updates: NoteUpdate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Update a note for the current user.
     """
+    user_id = user.id
+    update_data = updates.model_dump(exclude_unset=True)
+
+    # Buffer the entry and acknowledge right away when write-behind is enabled
+    if NOTE_WRITE_BEHIND and update_data.get("entry") is not None:
+        entry = update_data["entry"]
+        pending = note_buffer.save(note_id, user_id, entry)
+        if not pending:
+            note = await get_user_note(db, user_id, id=note_id)
+            if not note:
+                raise HTTPException(status_code=404, detail="Note not found")
+
+            # Mark an empty note as written before its entry only lives in
+            # this worker's buffer, so the cleanup job doesn't delete it
+            if not note.entry:
+                result = await db.execute(
+                    update(Note)
+                    .where(Note.id == note.id)
+                    .values(updated_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                if not result.rowcount:
+                    raise HTTPException(status_code=404, detail="Note not found")
+
+            stored = PendingNote(
+                id=note.id,
+                user_id=note.user_id,
+                date=note.date,
+                entry=note.entry,
+                version=note.version,
+                base_version=note.version,
+            )
+            pending = note_buffer.save(note_id, user_id, entry, stored)
+
+        return pending._asdict()
+
+    if "entry" not in update_data:
+        note = await get_user_note(db, user_id, id=note_id)
+        if not note:
+            raise HTTPException(status_code=404, detail="Note not found")
+        return note
+
+    # Write the entry and read back the note in a single UPDATE ... RETURNING,
+    # bumping the version so pending incremental edits are rejected
+    result = await db.execute(
+        update(Note)
+        .where(Note.id == note_id, Note.user_id == user_id)
+        .values(
+            {**Note.entry_values(update_data["entry"]), Note.version: Note.version + 1}
+        )
+        .returning(Note)
+    )
+    note = result.scalars().first()
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    await db.commit()
+    return note
+
+
+def apply_edits(entry: str, edits: List[NoteEdit]) -> str:
+    """
+    Apply text edits to an entry in order.
+    Each edit's offset refers to the text produced by the previous edits.
+    """
+    for edit in edits:
+        if edit.offset < 0 or edit.delete < 0:
+            raise HTTPException(
+                status_code=400, detail="Edit offset and delete must be 0 or greater"
+            )
+        if edit.offset + edit.delete > len(entry):
+            raise HTTPException(status_code=400, detail="Edit is out of range")
+
+        entry = entry[: edit.offset] + edit.insert + entry[edit.offset + edit.delete :]
+
+    return entry
+
+
+@router.patch("/{note_id}/edits", response_model=NoteVersionOut)
+@statement_budget(4)
+async def edit_note(
+    note_id: int,
+    updates: NoteEdits,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_subscribed_user),
+):
+    """
+    Apply incremental text edits to a note for the current user.
+    Only the new version is returned, so the client keeps its own copy of the entry.
+    """
+    # Write any buffered autosave first so edits apply to the latest entry
+    await db.run_sync(note_buffer.flush, note_id)
+
     # Check if note exists
     user_id = user.id
-    note = db.query(Note).filter(Note.id == note_id, Note.user_id == user_id).first()
+    note = await get_user_note(db, user_id, id=note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    # Update the note
-    update_data = updates.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(note, key, value)
+    # Reject edits made against an outdated entry
+    if note.version != updates.version:
+        raise HTTPException(status_code=409, detail="Note version conflict")
 
-    db.commit()
-    db.refresh(note)
-    return note
+    entry = apply_edits(note.entry or "", updates.edits)
+
+    # Write only if no other update landed since the version was read
+    result = await db.execute(
+        update(Note)
+        .where(Note.id == note_id, Note.version == updates.version)
+        .values({**Note.entry_values(entry), Note.version: Note.version + 1})
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Note version conflict")
+
+    await db.commit()
+    return {"id": note_id, "version": updates.version + 1}
 
 
 @router.patch("/{note_id}", response_model=NoteOut)
-def clear_note(
+async def clear_note(
     note_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Update a note for the current user.
     """
     # Check if note exists
     user_id = user.id
-    note = db.query(Note).filter(Note.id == note_id, Note.user_id == user_id).first()
+    note = await get_user_note(db, user_id, id=note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
     # Update the note
     setattr(note, "entry", "")
 
-    db.commit()
-    db.refresh(note)
+    await db.commit()
+    await db.refresh(note)
     return note
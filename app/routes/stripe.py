@@ -1,17 +1,29 @@
 import logging
 import os
-from datetime import datetime
 
-import stripe
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from firebase_admin import auth
 from sqlalchemy.orm import Session
 
+from app.core.config import (
+    STRIPE_LIFETIME_PRICE_AMOUNT,
+    STRIPE_LIFETIME_PRICE_CURRENCY,
+)
 from app.core.database import get_db
+from app.core.executor import run_blocking
 from app.deps.auth import get_subscribed_user, get_user
 from app.models.user import User
 from app.schemas.stripe import CheckoutSessionCreate, StripeCheckout, SubscriptionStatus
+from app.services.catalog import catalog
+from app.services.stripe_client import stripe
+from app.services.stripe_events import process_stripe_events, store_stripe_event
+from app.services.subscriptions import (
+    claim_snapshot_refresh,
+    is_snapshot_stale,
+    refresh_subscription_snapshot,
+    subscription_status,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -19,22 +31,36 @@ logger = logging.getLogger(__name__)
 
 @router.get("/subscription-status", response_model=SubscriptionStatus)
 def get_subscription_status(
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user: User = Depends(get_user),
 ):
     """
     Get the current subscription status for the user.
+    Served from the subscription snapshot kept by webhooks; Stripe is never
+    called on the request path. A missing or stale snapshot is served as is
+    and refreshed after the response, once per user however many requests
+    see it.
     """
     if not getattr(user, "stripe_subscription_id"):
         if getattr(user, "subscription_status") == "lifetime":
+            # Until the catalog refresh job has loaded the price, e.g. while
+            # Stripe is down, the configured price is shown; Stripe is never
+            # called from here
+            price = catalog.lifetime_price()
+            if price is None or price.unit_amount is None:
+                unit_amount = STRIPE_LIFETIME_PRICE_AMOUNT
+                currency = STRIPE_LIFETIME_PRICE_CURRENCY
+            else:
+                unit_amount, currency = price.unit_amount, price.currency
             return {
                 "is_subscribed": True,
                 "status": "lifetime",
                 "period_end_date": None,
                 "cancel_at_period_end": None,
-                "plan_name": "Lifetime Access",
-                "price_amount": 29.99,
-                "price_currency": "USD",
+                "plan_name": (price and price.product_name) or "Lifetime Access",
+                "price_amount": round(unit_amount / 100, 2),
+                "price_currency": currency.upper(),
             }
         return JSONResponse(
             {
@@ -48,42 +74,13 @@ def get_subscription_status(
             }
         )
 
-    try:
-        # Retrieve the subscription from Stripe
-        subscription = stripe.Subscription.retrieve(
-            getattr(user, "stripe_subscription_id"), expand=["items.data.price.product"]
-        )
-
-        # Parse the subscription details
-        item = subscription["items"]["data"][0]
-        period_end_timestamp = item.get("current_period_end") or subscription.get(
-            "trial_end"
-        )
-        period_end_date = (
-            datetime.fromtimestamp(period_end_timestamp).strftime("%b %d, %Y")
-            if period_end_timestamp
-            else None
-        )
-        price = item["price"]
-        product = price["product"]
+    # Build the response before claiming, which commits and expires the user
+    status = subscription_status(user)
+    user_id = getattr(user, "id")
+    if is_snapshot_stale(user) and claim_snapshot_refresh(db, user_id):
+        background_tasks.add_task(refresh_subscription_snapshot, db.get_bind(), user_id)
 
-        # Return the subscription status
-        return {
-            "is_subscribed": subscription["status"] == "active",
-            "status": subscription["status"],
-            "period_end_date": period_end_date,
-            "cancel_at_period_end": subscription.get("cancel_at_period_end", False),
-            "plan_name": product["name"],
-            "price_amount": round(price["unit_amount"] / 100, 2),
-            "price_currency": price["currency"].upper(),
-        }
-
-    except stripe.StripeError as e:
-        logger.exception("Stripe error while getting subscription status: %s", str(e))
-        raise HTTPException(
-            status_code=502,
-            detail=str(e) or "Stripe error",
-        )
+    return status
 
 
 @router.post("/create-checkout-session", response_model=StripeCheckout)
@@ -94,7 +91,31 @@ async def create_checkout_session(
 ):
     """
     Create a Stripe Checkout session for a user.
+    Stripe and database calls run in the blocking executor so a slow Stripe
+    round trip doesn't stall other requests on the event loop.
     """
+    # Check the price against the catalog before creating the session
+    if catalog.is_loaded:
+        price = catalog.get_price(checkout_session.price_id)
+        if price is None:
+            # Prices created since this worker's last refresh aren't cached
+            try:
+                price = await run_blocking(
+                    catalog.fetch_price, checkout_session.price_id
+                )
+            except stripe.StripeError as e:
+                logger.exception("Stripe error while fetching price: %s", str(e))
+                raise HTTPException(
+                    status_code=502,
+                    detail=str(e) or "Stripe error",
+                )
+        if not price or not price.active:
+            raise HTTPException(status_code=400, detail="Unknown price")
+        if price.recurring != (checkout_session.mode == "subscription"):
+            raise HTTPException(
+                status_code=400, detail="Price doesn't match checkout mode"
+            )
+
     # Get the user's Firebase UID and email
     firebase_uid = getattr(user, "firebase_uid")
     email = getattr(user, "email")
@@ -102,11 +123,11 @@ async def create_checkout_session(
     # Create a Stripe customer if the user doesn't have one
     try:
         if not getattr(user, "stripe_customer_id"):
-            customer = stripe.Customer.create(email=email)
+            customer = await run_blocking(stripe.Customer.create, email=email)
 
             # Update the user with the Stripe customer ID
             setattr(user, "stripe_customer_id", customer.id)
-            db.commit()
+            await run_blocking(db.commit)
     except stripe.StripeError as e:
         logger.exception("Stripe error while creating customer: %s", str(e))
         raise HTTPException(
@@ -117,7 +138,8 @@ async def create_checkout_session(
     # Create a Stripe Checkout session
     try:
         if checkout_session.mode == "subscription":
-            session = stripe.checkout.Session.create(
+            session = await run_blocking(
+                stripe.checkout.Session.create,
                 customer=getattr(user, "stripe_customer_id"),
                 mode=checkout_session.mode,  # type: ignore
                 line_items=[{"price": checkout_session.price_id, "quantity": 1}],
@@ -125,7 +147,8 @@ async def create_checkout_session(
                 cancel_url=checkout_session.cancel_url,
             )
         else:
-            session = stripe.checkout.Session.create(
+            session = await run_blocking(
+                stripe.checkout.Session.create,
                 customer=getattr(user, "stripe_customer_id"),
                 mode=checkout_session.mode,  # type: ignore
                 line_items=[{"price": checkout_session.price_id, "quantity": 1}],
@@ -163,6 +186,7 @@ def cancel_subscription(
 
         # Update local status immediately (optional: delay until webhook arrives)
         setattr(user, "subscription_status", "canceled")
+        setattr(user, "cancel_at_period_end", True)
         db.commit()
 
         return {
@@ -180,124 +204,47 @@ def cancel_subscription(
         )
 
 
+def drain_stripe_events(bind):
+    """
+    Applies pending events from the stripe_events inbox once the webhook
+    response has been sent.
+    """
+    db = Session(bind=bind)
+
+    try:
+        process_stripe_events(db)
+    except Exception as e:
+        logger.error("Error processing Stripe events: %s", e)
+    finally:
+        db.close()
+
+
 @router.post("/webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     """
     Handle Stripe post-checkout events.
+    Verified events are stored in the stripe_events inbox and applied after
+    the response is sent, so Stripe gets a fast 200 and replays are ignored.
     """
     # Verify the Stripe webhook signature
     payload = (await request.body()).decode("utf-8")
     sig_header = request.headers.get("stripe-signature", "")
     webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
 
-    print("STRIPE_PAYLOAD:", payload)
-    print("STRIPE_SIG_HEADER:", sig_header)
-
     try:
         event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
     except ValueError:
         raise HTTPException(400, detail="Invalid payload")
     except stripe.SignatureVerificationError as e:
-        print("Stripe signature verification failed:", e)
+        logger.warning("Stripe signature verification failed: %s", e)
         raise HTTPException(400, detail="Invalid signature")
 
-    # Get the event type and data object
-    event_type = event["type"]
-    data_object = event["data"]["object"]
-    customer_id = data_object.get("customer")
-
-    if event_type == "checkout.session.completed":
-        subscription_id = data_object.get("subscription")
-        mode = data_object.get("mode")  # "subscription" or "payment"
-        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
-
-        if user:
-            setattr(user, "is_subscribed", True)
-
-            if subscription_id and mode == "subscription":
-                # Update the user's subscription status
-                existing_subscription_id = getattr(user, "stripe_subscription_id")
-                if (
-                    existing_subscription_id
-                    and existing_subscription_id != subscription_id
-                ):
-                    # Cancel old subscription if it exists
-                    try:
-                        stripe.Subscription.delete(existing_subscription_id)
-                    except stripe.StripeError as e:
-                        logger.warning("Failed to cancel old subscription: %s", e)
-
-                setattr(user, "stripe_subscription_id", subscription_id)
-                setattr(user, "subscription_status", "active")
-            elif mode == "payment":
-                setattr(user, "subscription_status", "lifetime")
-                setattr(user, "plan_name", "Lifetime Access")
-
-                # Cancel old subscription if it exists
-                existing_subscription_id = getattr(user, "stripe_subscription_id")
-                if existing_subscription_id:
-                    try:
-                        stripe.Subscription.delete(existing_subscription_id)
-                    except stripe.StripeError as e:
-                        logger.warning("Failed to cancel old subscription: %s", e)
-
-                    setattr(user, "stripe_subscription_id", None)
-
-            db.commit()
-
-    elif event_type == "invoice.paid":
-        # Payment succeeded for an invoice (e.g. recurring payments)
-        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
-
-        if user:
-            setattr(user, "is_subscribed", True)
-            setattr(user, "subscription_status", "active")
-            db.commit()
-
-    elif event_type == "customer.subscription.updated":
-        # Update subscription details when Stripe updates them
-        subscription_id = data_object.get("id")
-        status = data_object.get(
-            "status"
-        )  # can be active, trialing, past_due, canceled, etc.
-        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
-
-        if user:
-            setattr(user, "stripe_subscription_id", subscription_id)
-            setattr(user, "subscription_status", status)
-            setattr(user, "is_subscribed", status in ("active", "trialing"))
-            db.commit()
-
-    elif event_type == "customer.subscription.deleted":
-        # A subscription was canceled or deleted.
-        subscription_id = data_object.get("id")
-        customer_id = data_object.get("customer")
-        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
-
-        # Check if the user has a subscription linked to the customer ID
-        if user and getattr(user, "stripe_subscription_id") == subscription_id:
-            if data_object.get("cancel_at_period_end"):
-                setattr(user, "subscription_status", "canceled")
-            else:
-                setattr(user, "subscription_status", "deleted")
-                setattr(user, "is_subscribed", False)
-                setattr(user, "stripe_subscription_id", None)
-
-            db.commit()
-
-    elif event_type == "invoice.payment_failed":
-        # Payment failed; mark subscription as inactive.
-        customer_id = data_object.get("customer")
-        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
-
-        if user:
-            setattr(user, "is_subscribed", False)
-            setattr(user, "subscription_status", "past_due")
-            db.commit()
-
-    else:
-        logger.warning(
-            f"Customer ID {customer_id or '[unknown]'} not linked to any user."
-        )
+    # Store the event; the sweeper job picks it up if this worker dies first
+    if await run_blocking(store_stripe_event, db, event["id"], event["type"], payload):
+        background_tasks.add_task(drain_stripe_events, db.get_bind())
 
     return {"received": True}
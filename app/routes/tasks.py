@@ -3,11 +3,14 @@ from typing import List, Optional
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import case, func
-from sqlalchemy.orm import Session
-
-from app.core.database import get_db
-from app.deps.auth import get_user
+from sqlalchemy import bindparam, case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import ORDER_COMPACTION
+from app.core.database import get_async_db
+from app.core.ordering import densify_orders, display_order
+from app.core.query_stats import statement_budget
+from app.deps.auth import get_async_read_db, get_async_user
 from app.models.task import Task
 from app.models.user import User
 from app.schemas.task import CompletionOut, TaskCreate, TaskOut, TaskUpdate
@@ -15,29 +18,98 @@ from app.schemas.task import CompletionOut, TaskCreate, TaskOut, TaskUpdate
 # Create a router
 router = APIRouter()
 
+# Hot-path statements are built once with bound parameters, so requests
+# skip rebuilding them and SQLAlchemy finds their compiled form by identity
+TASK_ORDER = display_order(Task, Task.date)
+USER_TASKS = (
+    select(Task, TASK_ORDER)
+    .where(Task.user_id == bindparam("user_id"))
+    .order_by(TASK_ORDER, Task.date)
+)
+USER_TASKS_BETWEEN = USER_TASKS.where(
+    Task.date.between(bindparam("start"), bindparam("end"))
+)
+USER_TASK = select(Task).where(
+    Task.id == bindparam("task_id"), Task.user_id == bindparam("user_id")
+)
+# The user's other tasks on a day, in stored order
+OTHER_DAY_TASKS = (
+    select(Task)
+    .where(
+        Task.user_id == bindparam("user_id"),
+        Task.date == bindparam("date"),
+        Task.id != bindparam("task_id"),
+    )
+    .order_by(Task.order)
+)
+COMPLETION = (
+    select(
+        Task.date,
+        func.count(Task.id).label("total"),
+        # Sum up completed tasks (1 if completed, else 0)
+        func.sum(case((Task.is_completed == True, 1), else_=0)).label("completed"),
+    )
+    .where(
+        Task.user_id == bindparam("user_id"),
+        Task.date.between(bindparam("start"), bindparam("end")),
+    )
+    .group_by(Task.date)
+    .order_by(Task.date)
+)
+
+
+async def get_user_task(db: AsyncSession, task_id: int, user_id: int) -> Optional[Task]:
+    """
+    Get a task by id if it belongs to the user.
+    """
+    result = await db.execute(USER_TASK, {"task_id": task_id, "user_id": user_id})
+    return result.scalars().first()
+
+
+async def get_other_day_tasks(
+    db: AsyncSession, user_id: int, day: date, task_id: int
+) -> List[Task]:
+    """
+    Get the user's tasks on a day other than the given task, in stored order.
+    """
+    result = await db.scalars(
+        OTHER_DAY_TASKS, {"user_id": user_id, "date": day, "task_id": task_id}
+    )
+    return result.all()
+
 
 @router.get("/", response_model=List[TaskOut])
-def get_tasks(
+@statement_budget(2)
+async def get_tasks(
     start: Optional[date] = None,
     end: Optional[date] = None,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_user),
+    db: AsyncSession = Depends(get_async_read_db),
+    user: User = Depends(get_async_user),
 ):
     """
     Get tasks for the current user between the start and end dates.
+    Orders are renumbered per day at read time, so gaps left by deferred
+    compaction are never visible.
     """
-    user_id = user.id
-    query = db.query(Task).filter(Task.user_id == user_id)
     if start and end:
-        query = query.filter(Task.date.between(start, end))
-    return query.order_by(Task.order).all()
+        result = await db.execute(
+            USER_TASKS_BETWEEN, {"user_id": user.id, "start": start, "end": end}
+        )
+    else:
+        result = await db.execute(USER_TASKS, {"user_id": user.id})
+
+    return [
+        TaskOut.model_validate(task).model_copy(update={"order": task_order})
+        for task, task_order in result.all()
+    ]
 
 
 @router.post("/", response_model=TaskOut)
-def create_task(
+@statement_budget(3)
+async def create_task(
     task: TaskCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_user),
 ):
     """
     Create a new task for the current user.
@@ -45,8 +117,11 @@ def create_task(
     user_id = user.id
 
     # Shift existing tasks' order by 1
-    db.query(Task).filter(Task.user_id == user_id, Task.date == task.date).update(
-        {Task.order: Task.order + 1}
+    await db.execute(
+        update(Task)
+        .where(Task.user_id == user_id, Task.date == task.date)
+        .values({Task.order: Task.order + 1})
+        .execution_options(synchronize_session=False)
     )
 
     # Create the new task
@@ -59,28 +134,24 @@ def create_task(
         order=1,
     )
 
+    # The insert fetches the new id; the rest is already in memory
     db.add(new_task)
-    db.commit()
-    db.refresh(new_task)
+    await db.commit()
 
     return new_task
 
 
 @router.patch("/{task_id}", response_model=TaskOut)
-def update_task(
+async def update_task(
     task_id: int,
     updates: TaskUpdate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_user),
 ):
     """
     Update a task for the current user.
     """
     user_id = user.id
-    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-
     update_data = updates.model_dump(exclude_unset=True)
 
     # Enforce only one type of update at a time
@@ -99,36 +170,44 @@ def update_task(
             detail="Only one type of update is allowed per request (order, title/note, or is_completed).",
         )
 
+    # Title and note updates don't move other tasks, so they're written and
+    # read back in a single UPDATE ... RETURNING
+    if matched_groups == ["text"]:
+        result = await db.execute(
+            update(Task)
+            .where(Task.id == task_id, Task.user_id == user_id)
+            .values(update_data)
+            .returning(Task)
+        )
+        task = result.scalars().first()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        await db.commit()
+        return task
+
+    task = await get_user_task(db, task_id, user_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
     # Handle date update
     if "date" in update_fields:
         new_date = update_data["date"]
         old_date = task.date
+        if new_date is None:
+            raise HTTPException(status_code=400, detail="Date is required")
 
         # Check if the new date is valid
         if new_date != old_date:
             task.date = new_date
 
             # Reorder tasks from the old date
-            old_day_tasks = (
-                db.query(Task)
-                .filter(
-                    Task.user_id == user_id, Task.date == old_date, Task.id != task.id
-                )
-                .order_by(Task.order)
-                .all()
-            )
+            old_day_tasks = await get_other_day_tasks(db, user_id, old_date, task.id)
             for idx, t in enumerate(old_day_tasks, start=1):
                 setattr(t, "order", idx)
 
             # Shift other tasks on the new date
-            new_day_tasks = (
-                db.query(Task)
-                .filter(
-                    Task.user_id == user_id, Task.date == new_date, Task.id != task.id
-                )
-                .order_by(Task.order.desc())
-                .all()
-            )
+            new_day_tasks = await get_other_day_tasks(db, user_id, new_date, task.id)
             for t in new_day_tasks:
                 setattr(t, "order", getattr(t, "order") + 1)
 
@@ -141,12 +220,10 @@ def update_task(
         if new_order is None or new_order < 1:
             raise HTTPException(status_code=400, detail="Order must be 1 or greater")
 
-        same_day_tasks = (
-            db.query(Task)
-            .filter(Task.user_id == user_id, Task.date == task.date, Task.id != task_id)
-            .order_by(Task.order)
-            .all()
-        )
+        same_day_tasks = await get_other_day_tasks(db, user_id, task.date, task_id)
+
+        # Close any gaps left by deferred compaction before shifting
+        densify_orders([task, *same_day_tasks])
 
         # Ensure the new order is within the valid range
         max_order = len(same_day_tasks) + 1
@@ -167,24 +244,16 @@ def update_task(
 
         setattr(task, "order", new_order)
 
-    # Handle title/note update
-    elif {"title", "note"} & update_fields:
-        update_title_or_note = any(k in update_data for k in ["title", "note"])
-        for key, value in update_data.items():
-            setattr(task, key, value)
-
     # Handle is_completed update
     elif "is_completed" in update_fields:
         new_status = update_data["is_completed"]
         task.is_completed = new_status
 
         # Get all tasks for the same day (excluding the current task)
-        same_day_tasks = (
-            db.query(Task)
-            .filter(Task.user_id == user_id, Task.date == task.date, Task.id != task.id)
-            .order_by(Task.order)
-            .all()
-        )
+        same_day_tasks = await get_other_day_tasks(db, user_id, task.date, task.id)
+
+        # Close any gaps left by deferred compaction before shifting
+        densify_orders([task, *same_day_tasks])
 
         if new_status:
             # If marking as completed, move the task to the last position.
@@ -200,22 +269,37 @@ def update_task(
                 setattr(t, "order", getattr(t, "order") + 1)
             setattr(task, "order", 1)
 
-    db.commit()
-    db.refresh(task)
+    # Changed orders are plain values, so the task in memory is current
+    await db.commit()
     return task
 
 
 @router.delete("/{task_id}")
-def delete_task(
+async def delete_task(
     task_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_user),
 ):
     """
     Delete a task for the current user.
+    With deferred order compaction, only the row is deleted; reads renumber
+    the day and the nightly compact_orders job fixes the stored orders.
     """
     user_id = user.id
-    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
+
+    if ORDER_COMPACTION == "deferred":
+        result = await db.execute(
+            delete(Task)
+            .where(Task.id == task_id, Task.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        await db.commit()
+        return {"message": "Task(s) deleted"}
+
+    task = await get_user_task(db, task_id, user_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
@@ -223,54 +307,32 @@ def delete_task(
 
     # Delete the single task
     affected_dates = [task.date]
-    db.delete(task)
+    await db.delete(task)
 
-    db.commit()
+    await db.commit()
 
     # Reorder the remaining tasks
     for d in affected_dates:
-        remaining_tasks = (
-            db.query(Task)
-            .filter(Task.user_id == user_id, Task.date == d)
-            .order_by(Task.order)
-            .all()
-        )
+        remaining_tasks = await get_other_day_tasks(db, user_id, d, task_id)
 
         for i, t in enumerate(remaining_tasks, start=1):
             setattr(t, "order", i)
 
-    db.commit()
+    await db.commit()
     return {"message": "Task(s) deleted and reordered"}
 
 
 @router.get("/completion/", response_model=List[CompletionOut])
-def get_completion_status(
+@statement_budget(2)
+async def get_completion_status(
     start: date,
     end: date,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_user),
+    db: AsyncSession = Depends(get_async_read_db),
+    user: User = Depends(get_async_user),
 ):
-    user_id = user.id
-
-    # Create an expression to sum up completed tasks (1 if completed, else 0)
-    completed_sum = func.sum(case((Task.is_completed == True, 1), else_=0)).label(
-        "completed"
-    )
-
     # Query for each day: count total tasks and sum the completed tasks.
-    results = (
-        db.query(
-            Task.date,
-            func.count(Task.id).label("total"),
-            completed_sum,
-        )
-        .filter(
-            Task.user_id == user_id,
-            Task.date.between(start, end),
-        )
-        .group_by(Task.date)
-        .order_by(Task.date)
-        .all()
+    results = await db.execute(
+        COMPLETION, {"user_id": user.id, "start": start, "end": end}
     )
 
     # Format the results
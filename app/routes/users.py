@@ -5,10 +5,13 @@ These routes are only for testing purposes.
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
-from app.core.database import get_db
-from app.deps.auth import get_subscribed_user, get_token
+from app.core.database import get_async_db
+from app.core.query_stats import statement_budget
+from app.deps.auth import USER_BY_FIREBASE_UID, get_async_subscribed_user, get_token
 from app.models.user import User
 from app.schemas.user import UserOut, UserOutFull, UserUpdate
 
@@ -17,46 +20,46 @@ router = APIRouter()
 
 
 @router.get("/all", response_model=List[UserOut])
-def get_users(
-    db: Session = Depends(get_db),
+async def get_users(
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Get all users along with their tasks, notes, and backlogs.
     This is for testing purposes only.
     """
-    users = (
-        db.query(User)
+    result = await db.execute(
+        select(User)
         .options(
             joinedload(User.tasks), joinedload(User.notes), joinedload(User.backlogs)
         )
         .order_by(User.id)
-        .all()
     )
-    return users
+    return result.unique().scalars().all()
 
 
 @router.get("/by_id/{user_id}", response_model=UserOutFull)
-def get_user_with_data(user_id: int, db: Session = Depends(get_db)):
+async def get_user_with_data(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get a specific user by user id along with their tasks, notes, and backlogs.
     This is for testing purposes only.
     """
-    user = (
-        db.query(User)
+    result = await db.execute(
+        select(User)
         .options(
             joinedload(User.tasks), joinedload(User.notes), joinedload(User.backlogs)
         )
-        .filter(User.id == user_id)
-        .first()
+        .where(User.id == user_id)
     )
+    user = result.unique().scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
 @router.get("/get_current", response_model=UserOut)
-def get_current_user(
-    db: Session = Depends(get_db),
+@statement_budget(2)
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db),
     decoded_token: dict = Depends(get_token),
 ) -> User:
     """
@@ -69,7 +72,8 @@ def get_current_user(
     name = decoded_token.get("name")
 
     # Check if the user exists by Firebase UID
-    user = db.query(User).filter(User.firebase_uid == firebase_uid).first()
+    result = await db.execute(USER_BY_FIREBASE_UID, {"firebase_uid": firebase_uid})
+    user = result.scalars().first()
     if user:
         return user
 
@@ -81,34 +85,38 @@ def get_current_user(
         is_subscribed=False,
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     print(f"New user created: {new_user}")
     return new_user
 
 
 @router.patch("/{user_id}", response_model=UserOut)
-def update_user(
+@statement_budget(2)
+async def update_user(
     user_id: int,
     updates: UserUpdate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_subscribed_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_async_subscribed_user),
 ):
     """
     Update a user by user id.
     """
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     update_data = updates.model_dump(exclude_unset=True)
+    if not update_data:
+        user = await db.get(User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
 
-    # Update the user
-    update_data = updates.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(user, key, value)
+    # Update the user and read it back in a single UPDATE ... RETURNING
+    result = await db.execute(
+        update(User).where(User.id == user_id).values(update_data).returning(User)
+    )
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return user
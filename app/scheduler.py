@@ -1,37 +1,622 @@
 # app/scheduler.py
 
-from datetime import datetime
+import asyncio
+import functools
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import and_, delete, func, or_, select, text, update
 
+from app.core.config import (
+    NOTE_FLUSH_INTERVAL_SECONDS,
+    NOTE_WRITE_BEHIND,
+    SCHEDULER_LEASE_TTL_SECONDS,
+    SCHEDULER_MAX_CONCURRENCY,
+    SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS,
+    STRIPE_CATALOG_REFRESH_SECONDS,
+    STRIPE_CATALOG_SYNC_SECONDS,
+    STRIPE_EVENTS_SWEEP_INTERVAL_SECONDS,
+    TASK_PARTITION_MONTHS_AHEAD,
+)
 from app.core.database import SessionLocal
+from app.models.backlog import Backlog
 from app.models.note import Note
+from app.models.task import Task
+from app.models.user import User
+from app.services.catalog import catalog, get_catalog_version
+from app.services.jobs import track_job
+from app.services.leases import Lease, LeaseLost
+from app.services.note_buffer import note_buffer
+from app.services.partitions import (
+    add_months,
+    create_missing_partitions,
+    is_partitioned,
+    month_start,
+)
+from app.services.stripe_client import stripe, to_dict
+from app.services.stripe_events import process_stripe_events
+from app.services.subscriptions import expected_subscription_state
 
+logger = logging.getLogger(__name__)
 
-def delete_empty_notes():
+# Number of empty notes deleted per transaction
+EMPTY_NOTES_BATCH_SIZE = 1000
+
+# Empty notes written this recently are kept, as autosaves for them may
+# still be buffered in another worker
+EMPTY_NOTES_MIN_AGE = timedelta(hours=1)
+
+# Number of users whose orders are compacted per transaction
+COMPACT_ORDERS_USER_BATCH_SIZE = 500
+
+# Number of Stripe subscriptions compared with users per transaction
+RECONCILE_SUBSCRIPTIONS_BATCH_SIZE = 500
+
+# Number of subscriptions per Stripe list page (Stripe's maximum)
+RECONCILE_SUBSCRIPTIONS_PAGE_SIZE = 100
+
+# Every worker starts a scheduler, but only the lease holder runs shared jobs
+scheduler_lease = Lease("scheduler", SCHEDULER_LEASE_TTL_SECONDS)
+
+# Set while a shared job runs, so it can check the lease between batches
+running_as_leader = ContextVar("running_as_leader", default=False)
+
+
+def renew_scheduler_lease():
+    """
+    Takes or renews the scheduler lease.
+    Standby workers take over here once a dead leader's lease expires.
+    """
+    db = SessionLocal()
+
+    try:
+        scheduler_lease.acquire(db)
+    except Exception as e:
+        db.rollback()
+        scheduler_lease.is_held = False
+        logger.error("Error renewing scheduler lease: %s", e)
+    finally:
+        db.close()
+
+
+def release_scheduler_lease():
+    """
+    Releases the scheduler lease if this worker holds it.
+    """
+    if not scheduler_lease.is_held:
+        return
+
+    db = SessionLocal()
+
+    try:
+        scheduler_lease.release(db)
+    except Exception as e:
+        db.rollback()
+        logger.error("Error releasing scheduler lease: %s", e)
+    finally:
+        db.close()
+
+
+def leader_only(job):
+    """
+    Wraps a job so it only runs in the worker holding the scheduler lease.
+    The lease is renewed right before the job runs, so a worker that lost it
+    during an outage never runs alongside the new leader, and long jobs check
+    it again between batches with ensure_leader.
+    """
+
+    @functools.wraps(job)
+    def wrapper(*args, **kwargs):
+        renew_scheduler_lease()
+        if not scheduler_lease.holds():
+            logger.info("Skipping %s, not the scheduler leader", job.__name__)
+            return None
+
+        token = running_as_leader.set(True)
+        try:
+            return job(*args, **kwargs)
+        finally:
+            running_as_leader.reset(token)
+
+    return wrapper
+
+
+def ensure_leader():
+    """
+    Raises LeaseLost when a shared job runs in a worker that no longer holds
+    the scheduler lease, e.g. because renewals failed during a long run.
+    Shared jobs call it between batches so they stop before the next leader
+    starts them again. Does nothing when a job is run directly.
+    """
+    if running_as_leader.get() and not scheduler_lease.holds():
+        raise LeaseLost("Lost the scheduler lease")
+
+
+def delete_empty_notes(batch_size: int = EMPTY_NOTES_BATCH_SIZE) -> int:
     """
     Deletes all note entries that are empty (i.e., have no entry).
+    Rows are deleted in id-ordered chunks, each in its own short transaction,
+    so memory stays flat and locks are held briefly however many rows match.
+    Notes written in the last EMPTY_NOTES_MIN_AGE are skipped.
+    Returns the number of deleted notes, and raises after rolling back
+    the current chunk if a statement fails.
+    """
+    db = SessionLocal()
+    started = time.perf_counter()
+    deleted = 0
+
+    try:
+        # Write buffered autosaves so notes being typed into aren't treated as
+        # empty. Other workers' buffers can't be flushed from here, but a note
+        # is touched when it first gets buffered, so the age check spares it.
+        note_buffer.flush(db)
+        cutoff = datetime.utcnow() - EMPTY_NOTES_MIN_AGE
+        is_stale_empty = and_(
+            Note.entry == "",
+            or_(Note.updated_at.is_(None), Note.updated_at < cutoff),
+        )
+
+        last_id = 0
+        while True:
+            ensure_leader()
+            ids = (
+                db.execute(
+                    select(Note.id)
+                    .where(is_stale_empty, Note.id > last_id)
+                    .order_by(Note.id)
+                    .limit(batch_size)
+                )
+                .scalars()
+                .all()
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            # Re-check in case the note was written since the select
+            result = db.execute(
+                delete(Note)
+                .where(Note.id.in_(ids), is_stale_empty)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            deleted += result.rowcount
+
+        duration = time.perf_counter() - started
+        logger.info("Deleted %d empty notes in %.2fs", deleted, duration)
+    except Exception:
+        db.rollback()
+        logger.error("Error deleting empty notes after %d deleted", deleted)
+        raise
+    finally:
+        db.close()
+
+    return deleted
+
+
+def compact_model_orders(db, model, partition_by, first_user_id, last_user_id):
+    """
+    Renumbers the order of a model's rows to 1..n within each partition for
+    a range of users, keeping the current (order, id) sequence.
+    Only rows whose order changes are updated, so groups without gaps or
+    duplicates aren't touched. Returns the number of updated rows.
+    """
+    ranked = (
+        select(
+            model.id.label("id"),
+            func.row_number()
+            .over(partition_by=partition_by, order_by=(model.order, model.id))
+            .label("new_order"),
+        )
+        .where(model.user_id.between(first_user_id, last_user_id))
+        .subquery()
+    )
+    result = db.execute(
+        update(model)
+        .where(
+            model.id == ranked.c.id, model.order.is_distinct_from(ranked.c.new_order)
+        )
+        .values(order=ranked.c.new_order)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def compact_orders(user_batch_size: int = COMPACT_ORDERS_USER_BATCH_SIZE) -> int:
+    """
+    Removes gaps and duplicates from task orders within each (user, date)
+    and from backlog orders within each user.
+    Users are processed in id-ordered batches, each in its own transaction,
+    and the hot tables are analyzed afterwards.
+    Returns the number of updated rows.
     """
     db = SessionLocal()
+    started = time.perf_counter()
+    updated = 0
 
     try:
-        empty_notes = db.query(Note).filter(Note.entry == "").all()
-        for note in empty_notes:
-            db.delete(note)
+        last_id = 0
+        while True:
+            ensure_leader()
+            user_ids = (
+                db.execute(
+                    select(User.id)
+                    .where(User.id > last_id)
+                    .order_by(User.id)
+                    .limit(user_batch_size)
+                )
+                .scalars()
+                .all()
+            )
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            updated += compact_model_orders(
+                db, Task, (Task.user_id, Task.date), user_ids[0], last_id
+            )
+            updated += compact_model_orders(
+                db, Backlog, (Backlog.user_id,), user_ids[0], last_id
+            )
+            db.commit()
+
+        # Refresh planner statistics for the tables every request touches
+        for table in (Task.__tablename__, Backlog.__tablename__, Note.__tablename__):
+            db.execute(text(f"ANALYZE {table}"))
         db.commit()
-        print(f"{datetime.now()}: Deleted {len(empty_notes)} empty notes.")
+
+        duration = time.perf_counter() - started
+        logger.info("Compacted %d task and backlog orders in %.2fs", updated, duration)
+    except Exception:
+        db.rollback()
+        logger.error("Error compacting orders after %d updated", updated)
+        raise
+    finally:
+        db.close()
+
+    return updated
+
+
+def create_task_partitions(months_ahead: int = TASK_PARTITION_MONTHS_AHEAD) -> int:
+    """
+    Creates the monthly partitions of the tasks table from the current month
+    through months_ahead, so new tasks don't land in the default partition.
+    Does nothing unless tasks is partitioned, which only happens on Postgres.
+    Returns the number of created partitions.
+    """
+    db = SessionLocal()
+    created = []
+
+    try:
+        if not is_partitioned(db, Task.__tablename__):
+            return 0
+
+        this_month = month_start(date.today())
+        created = create_missing_partitions(
+            db, Task.__tablename__, this_month, add_months(this_month, months_ahead)
+        )
+        logger.info("Created %d task partitions: %s", len(created), created)
+    except Exception:
+        db.rollback()
+        logger.error("Error creating task partitions after %d created", len(created))
+        raise
+    finally:
+        db.close()
+
+    return len(created)
+
+
+def reconcile_subscription_batch(db, subscriptions: dict) -> Counter:
+    """
+    Compares a batch of Stripe subscriptions, keyed by id, with the users
+    linked to them and corrects drifted users in a single bulk UPDATE.
+    Returns drift counts by field, plus the number of corrected users.
+    """
+    users = db.execute(
+        select(
+            User.id,
+            User.stripe_subscription_id,
+            User.subscription_status,
+            User.is_subscribed,
+        ).where(User.stripe_subscription_id.in_(list(subscriptions)))
+    ).all()
+
+    drift = Counter()
+    corrections = []
+    for user in users:
+        subscription = subscriptions[user.stripe_subscription_id]
+        expected = expected_subscription_state(subscription, user.subscription_status)
+
+        fields = [
+            field for field, value in expected.items() if getattr(user, field) != value
+        ]
+        if fields:
+            drift.update(fields)
+            corrections.append({"id": user.id, **expected})
+
+    if corrections:
+        db.execute(update(User), corrections)
+    drift["users"] += len(corrections)
+
+    return drift
+
+
+def reconcile_subscriptions(
+    batch_size: int = RECONCILE_SUBSCRIPTIONS_BATCH_SIZE,
+) -> int:
+    """
+    Corrects users whose subscription state drifted from Stripe, e.g. after
+    a missed webhook.
+    Pages through every subscription with the SDK's auto-pagination and
+    compares them with users in batches, each in its own transaction.
+    Logs drift counts by field and returns the number of corrected users.
+    """
+    db = SessionLocal()
+    started = time.perf_counter()
+    checked = 0
+    drift = Counter()
+
+    try:
+        batch = {}
+        subscriptions = stripe.Subscription.list(
+            status="all", limit=RECONCILE_SUBSCRIPTIONS_PAGE_SIZE
+        )
+        for subscription in subscriptions.auto_paging_iter():
+            batch[subscription.id] = to_dict(subscription)
+            if len(batch) >= batch_size:
+                ensure_leader()
+                drift += reconcile_subscription_batch(db, batch)
+                db.commit()
+                checked += len(batch)
+                batch = {}
+
+        if batch:
+            ensure_leader()
+            drift += reconcile_subscription_batch(db, batch)
+            db.commit()
+            checked += len(batch)
+
+        duration = time.perf_counter() - started
+        logger.info(
+            "Reconciled %d subscriptions in %.2fs, drift: %s",
+            checked,
+            duration,
+            dict(drift),
+        )
+    except Exception:
+        db.rollback()
+        logger.error("Error reconciling subscriptions after %d checked", checked)
+        raise
+    finally:
+        db.close()
+
+    return drift["users"]
+
+
+def flush_note_buffer():
+    """
+    Writes buffered note autosaves to the database.
+    """
+    db = SessionLocal()
+
+    try:
+        note_buffer.flush(db)
+    except Exception as e:
+        logger.error("Error flushing note buffer: %s", e)
+    finally:
+        db.close()
+
+
+def sweep_stripe_events():
+    """
+    Applies Stripe events still pending in the inbox, e.g. because the worker
+    that received them died or applying them failed.
+    Runs in every worker; claimed events are skipped by the others.
+    """
+    db = SessionLocal()
+
+    try:
+        process_stripe_events(db)
     except Exception as e:
         db.rollback()
-        print(f"Error deleting empty notes: {e}")
+        logger.error("Error sweeping Stripe events: %s", e)
     finally:
         db.close()
 
 
-def start_scheduler():
+def refresh_stripe_catalog():
+    """
+    Reloads the Stripe catalog of this worker when a price or product webhook,
+    applied by any worker, changed the catalog version in the database, and
+    at least every STRIPE_CATALOG_REFRESH_SECONDS.
+    """
+    db = SessionLocal()
+
+    try:
+        version = get_catalog_version(db)
+    except Exception as e:
+        logger.error("Error reading Stripe catalog version: %s", e)
+        return
+    finally:
+        db.close()
+
+    if catalog.is_stale(version, STRIPE_CATALOG_REFRESH_SECONDS):
+        catalog.refresh(version)
+
+
+# Jobs that can be scheduled or run on demand, by id
+JOBS = {
+    "renew_scheduler_lease": renew_scheduler_lease,
+    "delete_empty_notes": leader_only(track_job(delete_empty_notes)),
+    "compact_orders": leader_only(track_job(compact_orders)),
+    "reconcile_subscriptions": leader_only(track_job(reconcile_subscriptions)),
+    "create_task_partitions": leader_only(track_job(create_task_partitions)),
+    "flush_note_buffer": flush_note_buffer,
+    "sweep_stripe_events": sweep_stripe_events,
+    "refresh_stripe_catalog": refresh_stripe_catalog,
+}
+
+# Limits how many jobs run (and hold a pool connection) at once
+job_slots = None
+
+# Jobs that run without a slot, so long jobs can't hold them up: lease
+# renewal and the short interval jobs, which run at most one at a time each
+UNSLOTTED_JOBS = {
+    "renew_scheduler_lease",
+    "flush_note_buffer",
+    "sweep_stripe_events",
+    "refresh_stripe_catalog",
+}
+
+
+def get_job_slots() -> asyncio.Semaphore:
+    """
+    Gets the semaphore capping concurrent jobs, creating it on first use.
+    """
+    global job_slots
+    if job_slots is None:
+        job_slots = asyncio.Semaphore(SCHEDULER_MAX_CONCURRENCY)
+    return job_slots
+
+
+async def run_job(job_id: str):
+    """
+    Runs a job by id and waits for its result.
+    Jobs are blocking database work, so they run in a worker thread while
+    holding one of SCHEDULER_MAX_CONCURRENCY slots; this keeps scheduled
+    jobs from taking more than that many connections from the app's pool.
+    Lease renewal and the interval jobs skip the slots: renewal must keep
+    running while long jobs fill them, or the leader loses the lease in the
+    middle of a job, and autosaves and Stripe events must not wait hours
+    for the nightly jobs to finish.
+    Also used to run jobs on demand, e.g. from tests.
+    """
+    if job_id in UNSLOTTED_JOBS:
+        return await asyncio.to_thread(JOBS[job_id])
+
+    async with get_job_slots():
+        return await asyncio.to_thread(JOBS[job_id])
+
+
+def start_scheduler() -> AsyncIOScheduler:
     """
-    Initializes the APScheduler and schedules the delete_empty_notes job
-    to run every day at midnight.
+    Initializes the APScheduler on the running event loop and schedules the
+    delete_empty_notes job to run every day at midnight, followed by the
+    compact_orders job, subscription reconciliation with Stripe and the
+    creation of upcoming tasks partitions.
+    Pending Stripe events are swept and the Stripe catalog cache of this
+    worker is checked against the database version on intervals.
+    Runs of shared jobs are recorded in the job_runs table.
+    Shared jobs only run in the worker holding the scheduler lease, which
+    every worker tries to take or renew a few times per lease period.
+    When note write-behind is enabled, buffered autosaves are also flushed
+    on a short interval in every worker.
     """
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(delete_empty_notes, "cron", hour=0, minute=0)
+    global job_slots
+    job_slots = asyncio.Semaphore(SCHEDULER_MAX_CONCURRENCY)
+
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        run_job,
+        "interval",
+        args=["renew_scheduler_lease"],
+        id="renew_scheduler_lease",
+        seconds=SCHEDULER_LEASE_TTL_SECONDS / 3,
+        next_run_time=datetime.now(),
+    )
+    scheduler.add_job(
+        run_job,
+        "cron",
+        args=["delete_empty_notes"],
+        id="delete_empty_notes",
+        hour=0,
+        minute=0,
+    )
+    scheduler.add_job(
+        run_job,
+        "cron",
+        args=["compact_orders"],
+        id="compact_orders",
+        hour=0,
+        minute=30,
+    )
+    scheduler.add_job(
+        run_job,
+        "cron",
+        args=["reconcile_subscriptions"],
+        id="reconcile_subscriptions",
+        hour=1,
+        minute=0,
+    )
+    scheduler.add_job(
+        run_job,
+        "cron",
+        args=["create_task_partitions"],
+        id="create_task_partitions",
+        hour=1,
+        minute=30,
+    )
+    scheduler.add_job(
+        run_job,
+        "interval",
+        args=["sweep_stripe_events"],
+        id="sweep_stripe_events",
+        seconds=STRIPE_EVENTS_SWEEP_INTERVAL_SECONDS,
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        run_job,
+        "interval",
+        args=["refresh_stripe_catalog"],
+        id="refresh_stripe_catalog",
+        seconds=STRIPE_CATALOG_SYNC_SECONDS,
+        max_instances=1,
+        coalesce=True,
+    )
+    if NOTE_WRITE_BEHIND:
+        scheduler.add_job(
+            run_job,
+            "interval",
+            args=["flush_note_buffer"],
+            id="flush_note_buffer",
+            seconds=NOTE_FLUSH_INTERVAL_SECONDS,
+            max_instances=1,
+            coalesce=True,
+        )
     scheduler.start()
+    return scheduler
+
+
+async def stop_scheduler(scheduler: AsyncIOScheduler):
+    """
+    Stops scheduling new runs, waits for running jobs to finish, then
+    flushes buffered note autosaves and releases the scheduler lease so a
+    standby worker can take over right away.
+    """
+    scheduler.shutdown(wait=False)
+
+    # Running jobs hold a slot each, so taking every slot waits for them
+    slots = get_job_slots()
+    acquired = 0
+
+    async def take_all_slots():
+        nonlocal acquired
+        for _ in range(SCHEDULER_MAX_CONCURRENCY):
+            await slots.acquire()
+            acquired += 1
+
+    try:
+        await asyncio.wait_for(take_all_slots(), SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("Scheduled jobs still running after shutdown timeout")
+    finally:
+        for _ in range(acquired):
+            slots.release()
+
+    await asyncio.to_thread(flush_note_buffer)
+    await asyncio.to_thread(release_scheduler_lease)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class JobRunOut(BaseModel):
+    """
+    Job Run Out Pydantic Schema (response to internal clients)
+    """
+
+    id: int
+    job_name: str
+    started_at: datetime
+    duration_ms: float
+    rows_affected: Optional[int] = None
+    error: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class JobStatsOut(BaseModel):
+    """
+    Job Stats Out Pydantic Schema (duration percentiles over recent runs)
+    """
+
+    job_name: str
+    runs: int
+    failures: int
+    p50_ms: float
+    p95_ms: float
+    last_started_at: datetime
+
+
+class JobRunsOut(BaseModel):
+    """
+    Job Runs Out Pydantic Schema (response to internal clients)
+    """
+
+    recent_runs: List[JobRunOut]
+    stats: List[JobStatsOut]
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict
 
@@ -21,6 +21,25 @@ class NoteUpdate(BaseModel):
     entry: Optional[str] = None
 
 
+class NoteEdit(BaseModel):
+    """
+    Note Edit Pydantic Schema (a single text edit within a PATCH request)
+    """
+
+    offset: int
+    delete: int = 0
+    insert: str = ""
+
+
+class NoteEdits(BaseModel):
+    """
+    Note Edits Pydantic Schema (for incremental PATCH requests)
+    """
+
+    version: int
+    edits: List[NoteEdit]
+
+
 class NoteOut(BaseModel):
     """
     Note Out Pydantic Schema (response to client)
@@ -29,5 +48,17 @@ class NoteOut(BaseModel):
     id: int
     date: date
     entry: Optional[str] = ""
+    version: int = 1
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class NoteVersionOut(BaseModel):
+    """
+    Note Version Out Pydantic Schema (response to incremental PATCH requests)
+    """
+
+    id: int
+    version: int
 
     model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,227 @@
+"""
+Load benchmark of the async task routes against the sync stack.
+Serves both over HTTP with uvicorn and reports requests/sec and p99 latency
+of GET /tasks/ for a week of tasks under concurrent load.
+Run manually: `python -m app.scripts.bench_async_routes [--url URL]`
+Defaults to a temporary SQLite file; pass a Postgres URL to measure there.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import List
+
+import httpx
+import uvicorn
+from fastapi import Depends, FastAPI, Header
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.database import Base, get_async_db, to_async_url
+from app.core.ordering import display_order
+from app.deps.auth import get_async_read_db, get_async_user
+from app.models import (
+    backlog,
+    catalog_version,
+    job_run,
+    note,
+    scheduler_lease,
+    stripe_event,
+    task,
+    user,
+)
+from app.models.task import Task
+from app.models.user import User
+from app.routes import tasks
+from app.schemas.task import TaskOut
+
+START = date(2025, 1, 6)
+
+
+def seed(engine, users, tasks_per_day):
+    """
+    Insert users with a week of tasks each.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {"id": i, "firebase_uid": f"uid-{i}", "email": f"{i}@x"}
+                for i in range(1, users + 1)
+            ],
+        )
+        conn.execute(
+            insert(Task),
+            [
+                {
+                    "user_id": i,
+                    "date": START + timedelta(days=day),
+                    "title": f"Task {n}",
+                    "order": n,
+                    "is_completed": False,
+                }
+                for i in range(1, users + 1)
+                for day in range(7)
+                for n in range(1, tasks_per_day + 1)
+            ],
+        )
+
+
+def build_app(url):
+    """
+    Serve the async tasks router under /async and the sync stack's
+    get_tasks under /sync, both on the same database.
+    """
+    engine = create_engine(url)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = create_async_engine(to_async_url(url))
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+    def get_sync_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_bench_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    def get_bench_user(x_user_id: int = Header()):
+        return User(id=x_user_id)
+
+    bench = FastAPI()
+
+    @bench.get("/sync/tasks/", response_model=List[TaskOut])
+    def get_tasks_sync(
+        start: date,
+        end: date,
+        db: Session = Depends(get_sync_db),
+        user: User = Depends(get_bench_user),
+    ):
+        # The sync get_tasks route, run in the threadpool
+        order = display_order(Task, Task.date)
+        query = (
+            db.query(Task, order)
+            .filter(Task.user_id == user.id)
+            .filter(Task.date.between(start, end))
+        )
+        return [
+            TaskOut.model_validate(task).model_copy(update={"order": task_order})
+            for task, task_order in query.order_by(order, Task.date).all()
+        ]
+
+    bench.include_router(tasks.router, prefix="/async/tasks")
+    bench.dependency_overrides[get_async_db] = get_bench_async_db
+    bench.dependency_overrides[get_async_read_db] = get_bench_async_db
+    bench.dependency_overrides[get_async_user] = get_bench_user
+    return bench, engine
+
+
+def serve(bench):
+    """
+    Start uvicorn on a free local port in a background thread.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(
+        uvicorn.Config(bench, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+async def load(base_url, path, users, requests, concurrency):
+    """
+    Send requests for random users from concurrent clients.
+    """
+    rng = random.Random(7)
+    params = {"start": START.isoformat(), "end": (START + timedelta(6)).isoformat()}
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker(client):
+        for _ in remaining:
+            headers = {"x-user-id": str(rng.randint(1, users))}
+            t0 = time.perf_counter()
+            res = await client.get(path, params=params, headers=headers)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            res.raise_for_status()
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        # Warm up connections and caches before measuring
+        await client.get(path, params=params, headers={"x-user-id": "1"})
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99)],
+    }
+
+
+def run(url, users, tasks_per_day, requests, concurrency):
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    seed(engine, users, tasks_per_day)
+    engine.dispose()
+
+    bench, bench_engine = build_app(url)
+    server, thread, base_url = serve(bench)
+    try:
+        results = {
+            stack: asyncio.run(
+                load(base_url, f"/{stack}/tasks/", users, requests, concurrency)
+            )
+            for stack in ("sync", "async")
+        }
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    bench_engine.dispose()
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="database URL (default: temp SQLite file)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks-per-day", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_routes.db")
+    url = args.url or f"sqlite:///{path}"
+
+    results = run(url, args.users, args.tasks_per_day, args.requests, args.concurrency)
+    for stack, result in results.items():
+        print(
+            f"stack={stack:<6} {result['rps']:8.1f} req/s  "
+            f"p50={result['p50_ms']:.1f} ms  p99={result['p99_ms']:.1f} ms"
+        )
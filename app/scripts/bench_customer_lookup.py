@@ -0,0 +1,126 @@
+"""
+Benchmark webhook user lookups by Stripe customer ID on synthetic users.
+Compares lookup latency without and with the users Stripe ID indexes.
+Run manually: `python -m app.scripts.bench_customer_lookup [--url URL]`
+Defaults to a temporary SQLite file; pass a Postgres URL to measure there.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models import (
+    backlog,
+    catalog_version,
+    job_run,
+    note,
+    scheduler_lease,
+    stripe_event,
+    task,
+    user,
+)
+from app.models.user import User
+
+BATCH_SIZE = 10_000
+
+
+def seed_users(engine, users):
+    """
+    Insert users in batches; about a third of them have a Stripe customer.
+    """
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(1, users + 1, BATCH_SIZE):
+            rows = []
+            for user_id in range(start, min(start + BATCH_SIZE, users + 1)):
+                customer = rng.random() < 0.35
+                rows.append(
+                    {
+                        "id": user_id,
+                        "firebase_uid": f"uid-{user_id}",
+                        "email": f"{user_id}@x",
+                        "stripe_customer_id": f"cus_{user_id}" if customer else None,
+                        "stripe_subscription_id": (
+                            f"sub_{user_id}" if customer else None
+                        ),
+                    }
+                )
+            conn.execute(insert(User), rows)
+
+
+def time_lookups(Session, users, lookups):
+    """
+    Time webhook-style lookups of random customers through the ORM.
+    """
+    rng = random.Random(7)
+    latencies = []
+    with Session() as db:
+        for _ in range(lookups):
+            customer_id = f"cus_{rng.randint(1, users)}"
+            t0 = time.perf_counter()
+            db.query(User).filter_by(stripe_customer_id=customer_id).first()
+            latencies.append((time.perf_counter() - t0) * 1000)
+            db.expunge_all()
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95)],
+    }
+
+
+def run(url, users, lookups):
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    # Measure without the Stripe ID indexes first
+    indexes = [
+        index
+        for index in User.__table__.indexes
+        if index.name.startswith("ix_users_stripe_")
+    ]
+    for index in indexes:
+        index.drop(engine)
+
+    t0 = time.perf_counter()
+    seed_users(engine, users)
+    print(f"Seeded {users} users in {time.perf_counter() - t0:.1f}s")
+
+    results = {"none": time_lookups(Session, users, lookups)}
+
+    t0 = time.perf_counter()
+    for index in indexes:
+        index.create(engine)
+    print(f"Built indexes in {time.perf_counter() - t0:.1f}s")
+
+    results["indexed"] = time_lookups(Session, users, lookups)
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="database URL (default: temp SQLite file)")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_users.db")
+    url = args.url or f"sqlite:///{path}"
+
+    for label, result in run(url, args.users, args.lookups).items():
+        print(
+            f"index={label:<8} "
+            f"lookup p50={result['p50_ms']:.3f} ms  p95={result['p95_ms']:.3f} ms"
+        )
@@ -0,0 +1,147 @@
+"""
+Benchmark note entry compression on a synthetic journaling corpus.
+Compares table size and read latency with compression off and on.
+Run manually: `python -m app.scripts.bench_note_compression [--url URL]`
+Defaults to a temporary SQLite file; pass a Postgres URL to measure there.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import app.core.compression as compression
+from app.core.database import Base
+from app.models import (
+    backlog,
+    catalog_version,
+    job_run,
+    note,
+    scheduler_lease,
+    stripe_event,
+    task,
+    user,
+)
+from app.models.note import Note
+from app.models.user import User
+
+WORDS = (
+    "today felt long but good I went for a walk after work and thought about "
+    "the week ahead finally finished the project we started in spring need to "
+    "call mom tomorrow the weather was grey and quiet coffee with friends made "
+    "everything better still behind on reading goals grateful for small wins"
+).split()
+
+
+def make_entry(rng: random.Random) -> str:
+    """
+    Most users write a few sentences; a few heavy journalers write pages.
+    """
+    if rng.random() < 0.1:
+        size = rng.randint(5_000, 40_000)
+    else:
+        size = rng.randint(50, 800)
+
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def table_size(engine, path) -> int:
+    """
+    Size in bytes of the notes table (whole file for SQLite).
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("VACUUM FULL notes"))
+            return conn.execute(
+                text("SELECT pg_total_relation_size('notes')")
+            ).scalar_one()
+        conn.exec_driver_sql("VACUUM")
+    return os.path.getsize(path)
+
+
+def run(url, path, enabled, users, days, reads):
+    compression.NOTE_COMPRESSION = enabled
+    engine = create_engine(url)
+    if engine.dialect.name == "postgresql":
+        engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    # Seed the same corpus for both runs
+    rng = random.Random(42)
+    start = date(2024, 1, 1)
+    with Session() as db:
+        for user_id in range(1, users + 1):
+            db.add(
+                User(id=user_id, firebase_uid=f"uid-{user_id}", email=f"{user_id}@x")
+            )
+            db.add_all(
+                Note(
+                    user_id=user_id,
+                    date=start + timedelta(days=d),
+                    entry=make_entry(rng),
+                )
+                for d in range(days)
+            )
+            db.commit()
+
+    size = table_size(engine, path)
+
+    # Time reads of random user-days through the ORM, including decompression
+    latencies = []
+    with Session() as db:
+        for _ in range(reads):
+            user_id = rng.randint(1, users)
+            day = start + timedelta(days=rng.randrange(days))
+            t0 = time.perf_counter()
+            n = db.query(Note).filter(Note.user_id == user_id, Note.date == day).first()
+            _ = n.entry
+            latencies.append((time.perf_counter() - t0) * 1000)
+            db.expunge_all()
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+    latencies.sort()
+    return {
+        "size_mb": size / 1024 / 1024,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95)],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="database URL (default: temp SQLite file)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_notes.db")
+    url = args.url or f"sqlite:///{path}"
+
+    print(
+        f"Corpus: {args.users} users x {args.days} days, "
+        f"threshold {compression.NOTE_COMPRESSION_THRESHOLD} bytes"
+    )
+    for enabled in (False, True):
+        result = run(url, path, enabled, args.users, args.days, args.reads)
+        print(
+            f"compression={'on ' if enabled else 'off'}  "
+            f"size={result['size_mb']:.1f} MB  "
+            f"read p50={result['p50_ms']:.3f} ms  p95={result['p95_ms']:.3f} ms"
+        )
@@ -0,0 +1,104 @@
+"""
+Micro-benchmark of the Python-side cost of the per-request task lookups.
+Compares building a legacy Query, building a select() per request and
+executing the prebuilt statements from app.routes.tasks with bound params.
+Run manually: `python -m app.scripts.bench_statement_overhead [--iterations N]`
+Uses an in-memory SQLite database, so nearly all of the time is Python.
+"""
+
+import argparse
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models import (
+    backlog,
+    catalog_version,
+    job_run,
+    note,
+    scheduler_lease,
+    stripe_event,
+    task,
+    user,
+)
+from app.models.task import Task
+from app.models.user import User
+from app.routes.tasks import OTHER_DAY_TASKS, USER_TASK
+
+DAY = date(2025, 1, 6)
+
+
+def query_lookups(db, task_id):
+    # Legacy Query objects, rebuilt on every request
+    db.query(Task).filter(Task.id == task_id, Task.user_id == 1).first()
+    db.query(Task).filter(
+        Task.user_id == 1, Task.date == DAY, Task.id != task_id
+    ).order_by(Task.order).all()
+
+
+def select_lookups(db, task_id):
+    # 2.0-style select(), rebuilt on every request
+    db.execute(select(Task).where(Task.id == task_id, Task.user_id == 1)).first()
+    db.scalars(
+        select(Task)
+        .where(Task.user_id == 1, Task.date == DAY, Task.id != task_id)
+        .order_by(Task.order)
+    ).all()
+
+
+def prebuilt_lookups(db, task_id):
+    # Module-level statements with bound parameters
+    db.execute(USER_TASK, {"task_id": task_id, "user_id": 1}).first()
+    db.scalars(OTHER_DAY_TASKS, {"user_id": 1, "date": DAY, "task_id": task_id}).all()
+
+
+def time_lookups(Session, lookups, iterations):
+    """
+    Time one request's lookups, returning microseconds per request.
+    """
+    with Session() as db:
+        # Warm the compiled statement cache
+        lookups(db, 1)
+        t0 = time.perf_counter()
+        for i in range(iterations):
+            lookups(db, i % 8 + 1)
+            db.expunge_all()
+        return (time.perf_counter() - t0) / iterations * 1_000_000
+
+
+def run(iterations):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "firebase_uid": "uid", "email": "x"}])
+        conn.execute(
+            insert(Task),
+            [
+                {"id": n, "user_id": 1, "date": DAY, "title": f"Task {n}", "order": n}
+                for n in range(1, 9)
+            ],
+        )
+    Session = sessionmaker(bind=engine)
+
+    results = {
+        name: time_lookups(Session, lookups, iterations)
+        for name, lookups in (
+            ("query", query_lookups),
+            ("select", select_lookups),
+            ("prebuilt", prebuilt_lookups),
+        )
+    }
+    engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    for name, us in run(args.iterations).items():
+        print(f"statements={name:<9} {us:8.1f} us/request")
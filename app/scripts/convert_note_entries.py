@@ -0,0 +1,93 @@
+"""
+Convert stored note entries to the current compression settings.
+Compresses large entries when NOTE_COMPRESSION is on, and decompresses every
+entry when it's off, e.g. before downgrading past the entry_compressed column.
+Safe to rerun and to run while the app is serving.
+Run manually: `python -m app.scripts.convert_note_entries [--batch-size N]`
+"""
+
+import argparse
+
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.orm import Session
+
+from app.core.compression import compress_entry, decompress_entry
+from app.core.database import SessionLocal
+from app.models.note import Note
+
+BATCH_SIZE = 1000
+
+
+def convert_note_entries(db: Session, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Rewrite entries stored differently from how compress_entry stores them now.
+    Notes are walked by id in batches, each committed on its own, and a note
+    is only rewritten if its version hasn't changed since it was read; the app
+    stores a newer save in the current format itself.
+    Returns the number of converted notes (or, on drivers that can't count
+    them per batch, of notes due for conversion).
+    """
+    table = Note.__table__
+    statement = (
+        update(table)
+        .where(
+            and_(
+                table.c.id == bindparam("b_id"),
+                table.c.version == bindparam("b_version"),
+            )
+        )
+        .values(
+            entry=bindparam("b_entry"),
+            entry_compressed=bindparam("b_entry_compressed"),
+        )
+    )
+    converted = 0
+
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(table.c.id, table.c.entry, table.c.entry_compressed, table.c.version)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        params = []
+        for row in rows:
+            entry = decompress_entry(row.entry, row.entry_compressed)
+            text, compressed = compress_entry(entry)
+            if (compressed is None) != (row.entry_compressed is None):
+                params.append(
+                    {
+                        "b_id": row.id,
+                        "b_version": row.version,
+                        "b_entry": text,
+                        "b_entry_compressed": compressed,
+                    }
+                )
+        if params:
+            result = db.execute(statement, params)
+            # Some drivers can't count rows across a batch of parameters
+            if result.supports_sane_multi_rowcount():
+                converted += result.rowcount
+            else:
+                converted += len(params)
+        db.commit()
+
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = convert_note_entries(db, args.batch_size)
+        print(f"Converted {count} notes.")
+    finally:
+        db.close()
@@ -0,0 +1,176 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import STRIPE_LIFETIME_PRICE_ID
+from app.core.database import insert_if_missing
+from app.models.catalog_version import CatalogVersion
+from app.services.stripe_client import stripe, to_dict
+
+logger = logging.getLogger(__name__)
+
+# Row of the catalog_versions table tracking the Stripe catalog
+CATALOG_NAME = "stripe"
+
+
+class CatalogPrice(NamedTuple):
+    """
+    A Stripe price with the name of its product.
+    """
+
+    id: str
+    product_id: str
+    product_name: Optional[str]
+    unit_amount: Optional[int]  # In cents
+    currency: str
+    recurring: bool
+    active: bool
+
+
+def to_catalog_price(price: dict) -> CatalogPrice:
+    """
+    Convert a Stripe price, with its product expanded or not.
+    """
+    product = price.get("product")
+    if isinstance(product, str):
+        product = {"id": product}
+
+    return CatalogPrice(
+        id=price["id"],
+        product_id=product.get("id"),
+        product_name=product.get("name"),
+        unit_amount=price.get("unit_amount"),
+        currency=price["currency"],
+        recurring=bool(price.get("recurring")),
+        active=bool(price.get("active")) and product.get("active", True),
+    )
+
+
+class StripeCatalog:
+    """
+    In-process cache of Stripe prices and their products.
+    load() replaces the whole catalog at once, so readers never see a
+    partially loaded catalog. Lookups never call Stripe; callers fetch
+    prices missing from the catalog with fetch_price().
+    Each worker has its own copy. Price and product webhooks bump the catalog
+    version in the database, which every worker's refresh job compares with
+    the version it loaded, so workers other than the one applying the
+    webhook serve stale prices for up to STRIPE_CATALOG_SYNC_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prices: Dict[str, CatalogPrice] = {}
+        self.loaded_at: Optional[datetime] = None
+        # Database catalog version read before the last load, if known
+        self.version: Optional[int] = None
+
+    def load(self) -> int:
+        """
+        Fetch every price, with its product expanded, and replace the catalog.
+        Returns the number of prices loaded.
+        """
+        prices = {}
+        listing = stripe.Price.list(limit=100, expand=["data.product"])
+        for price in listing.auto_paging_iter():
+            price = to_catalog_price(to_dict(price))
+            prices[price.id] = price
+
+        with self._lock:
+            self._prices = prices
+            self.loaded_at = datetime.utcnow()
+
+        return len(prices)
+
+    def fetch_price(self, price_id: str) -> Optional[CatalogPrice]:
+        """
+        Retrieve one price from Stripe and add it to the catalog, for prices
+        created or changed since the last load. Returns None if Stripe has
+        no such price. Raises stripe.StripeError if Stripe can't be reached.
+        """
+        try:
+            price = stripe.Price.retrieve(price_id, expand=["product"])
+        except stripe.InvalidRequestError:
+            return None
+
+        price = to_catalog_price(to_dict(price))
+        with self._lock:
+            # Copy, so the catalog is still only ever swapped whole
+            self._prices = {**self._prices, price.id: price}
+        return price
+
+    def refresh(self, version: Optional[int] = None):
+        """
+        Reload the catalog, keeping the current one if Stripe can't be reached.
+        Pass the database catalog version read before reloading to record
+        which changes the reloaded catalog includes.
+        """
+        try:
+            count = self.load()
+            self.version = version
+            logger.info("Loaded %d Stripe prices", count)
+        except stripe.StripeError as e:
+            logger.error("Error loading Stripe catalog: %s", e)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def is_stale(self, version: int, max_age: float) -> bool:
+        """
+        Whether the catalog must be reloaded: the database catalog version
+        changed since it was loaded, or it is older than max_age seconds.
+        """
+        if not self.is_loaded or version != self.version:
+            return True
+        return (datetime.utcnow() - self.loaded_at).total_seconds() >= max_age
+
+    def get_price(self, price_id: Optional[str]) -> Optional[CatalogPrice]:
+        """
+        Look up a price by id.
+        """
+        with self._lock:
+            return self._prices.get(price_id)
+
+    def lifetime_price(self) -> Optional[CatalogPrice]:
+        """
+        Get the one-time price of lifetime access: STRIPE_LIFETIME_PRICE_ID if
+        set, otherwise the first active one-time price.
+        """
+        if STRIPE_LIFETIME_PRICE_ID:
+            return self.get_price(STRIPE_LIFETIME_PRICE_ID)
+
+        with self._lock:
+            prices = list(self._prices.values())
+        return next((p for p in prices if p.active and not p.recurring), None)
+
+
+def get_catalog_version(db: Session) -> int:
+    """
+    Get the database version of the Stripe catalog, 0 until first bumped.
+    """
+    version = db.scalar(
+        select(CatalogVersion.version).where(CatalogVersion.name == CATALOG_NAME)
+    )
+    return version or 0
+
+
+def bump_catalog_version(db: Session):
+    """
+    Mark the Stripe catalog as changed, so every worker reloads it on its
+    next refresh. The caller commits.
+    """
+    insert_if_missing(db, CatalogVersion, name=CATALOG_NAME, version=0)
+    db.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.name == CATALOG_NAME)
+        .values(version=CatalogVersion.version + 1, updated_at=datetime.utcnow())
+    )
+
+
+# Shared catalog for this process
+catalog = StripeCatalog()
@@ -0,0 +1,128 @@
+import functools
+import logging
+import time
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import JOB_SLOW_SECONDS
+from app.core.database import SessionLocal
+from app.models.job_run import JobRun
+
+logger = logging.getLogger(__name__)
+
+
+def record_job_run(job_name, started_at, duration_ms, rows_affected, error):
+    """
+    Stores one run in the job_runs table.
+    Failing to record a run never fails the job itself.
+    """
+    db = SessionLocal()
+
+    try:
+        db.add(
+            JobRun(
+                job_name=job_name,
+                started_at=started_at,
+                duration_ms=duration_ms,
+                rows_affected=rows_affected,
+                error=error,
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to record run of job %s", job_name)
+    finally:
+        db.close()
+
+
+def track_job(job, name=None):
+    """
+    Wraps a scheduled job so every run is timed and recorded in job_runs.
+    The job's return value is stored as the number of rows it affected, and
+    a run slower than JOB_SLOW_SECONDS logs a warning.
+    """
+    job_name = name or job.__name__
+
+    @functools.wraps(job)
+    def wrapper(*args, **kwargs):
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        rows_affected = None
+        error = None
+
+        try:
+            rows_affected = job(*args, **kwargs)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.exception("Job %s failed", job_name)
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms > JOB_SLOW_SECONDS * 1000:
+            logger.warning(
+                "Job %s took %.0f ms, over the %.0f s threshold",
+                job_name,
+                duration_ms,
+                JOB_SLOW_SECONDS,
+            )
+
+        record_job_run(job_name, started_at, duration_ms, rows_affected, error)
+        return rows_affected
+
+    return wrapper
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a non-empty list.
+    """
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def get_recent_runs(db: Session, limit: int = 20) -> List[JobRun]:
+    """
+    Get the most recent runs across all jobs.
+    """
+    return (
+        db.execute(select(JobRun).order_by(JobRun.started_at.desc()).limit(limit))
+        .scalars()
+        .all()
+    )
+
+
+def get_job_stats(db: Session, window: int = 100) -> List[dict]:
+    """
+    Get run counts and p50/p95 durations over the last `window` runs of each job.
+    """
+    job_names = db.execute(select(JobRun.job_name).distinct()).scalars().all()
+
+    stats = []
+    for job_name in sorted(job_names):
+        runs = (
+            db.execute(
+                select(JobRun)
+                .where(JobRun.job_name == job_name)
+                .order_by(JobRun.started_at.desc())
+                .limit(window)
+            )
+            .scalars()
+            .all()
+        )
+        durations = [r.duration_ms for r in runs]
+        stats.append(
+            {
+                "job_name": job_name,
+                "runs": len(runs),
+                "failures": sum(1 for r in runs if r.error),
+                "p50_ms": percentile(durations, 50),
+                "p95_ms": percentile(durations, 95),
+                "last_started_at": runs[0].started_at,
+            }
+        )
+
+    return stats
@@ -0,0 +1,116 @@
+import os
+import socket
+import time
+from datetime import timedelta
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy import DateTime, delete, func, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.database import insert_if_missing
+from app.models.scheduler_lease import SchedulerLease
+
+
+class LeaseLost(Exception):
+    """
+    Raised when a job finds its worker no longer holds the lease it runs under.
+    """
+
+
+def db_now(db: Session, seconds: int = 0):
+    """
+    SQL expression for the database's current UTC time plus some seconds.
+    Lease expiry is read and written with the database clock only, so skew
+    between the workers' host clocks can't hand a lease to two holders.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:%M:%f", "now", f"+{seconds} seconds")
+    now = func.timezone("UTC", func.now(), type_=DateTime)
+    return now + timedelta(seconds=seconds)
+
+
+class Lease:
+    """
+    A named lease stored in the scheduler_leases table.
+    At most one holder owns a lease until it expires. The holder keeps it by
+    renewing before expiry; if the holder dies, another process takes it over
+    once it has expired. Works on any database with atomic UPDATEs.
+    Expiry is kept on the database clock, while the holder tracks how long
+    its last renewal is good for on its own monotonic clock.
+    """
+
+    def __init__(self, name: str, ttl_seconds: int, holder: Optional[str] = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.holder = (
+            holder or f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        )
+        self.is_held = False
+        self.held_until = 0.0
+
+    def holds(self) -> bool:
+        """
+        Whether this holder owns the lease right now.
+        Counts the TTL from before the last renewal was sent, so it runs out
+        no later than the expiry the database stored, even if renewals stall.
+        """
+        return self.is_held and time.monotonic() < self.held_until
+
+    def acquire(self, db: Session) -> bool:
+        """
+        Take or renew the lease and return whether this holder owns it.
+        The caller's session is committed.
+        """
+        started = time.monotonic()
+        expires_at = db_now(db, self.ttl_seconds)
+
+        # Renew our own lease or take over an expired one in a single statement
+        result = db.execute(
+            update(SchedulerLease)
+            .where(
+                SchedulerLease.name == self.name,
+                or_(
+                    SchedulerLease.holder == self.holder,
+                    SchedulerLease.expires_at < db_now(db),
+                ),
+            )
+            .values(holder=self.holder, expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+        if not result.rowcount:
+            # Nobody has held the lease yet; the primary key lets only one
+            # insert win, and a standby's insert does nothing rather than fail
+            inserted = insert_if_missing(
+                db,
+                SchedulerLease,
+                name=self.name,
+                holder=self.holder,
+                expires_at=expires_at,
+            )
+            db.commit()
+            if not inserted:
+                self.is_held = False
+                return False
+
+        self.is_held = True
+        self.held_until = started + self.ttl_seconds
+        return True
+
+    def release(self, db: Session):
+        """
+        Give up the lease so a standby can take over without waiting for expiry.
+        The caller's session is committed.
+        """
+        db.execute(
+            delete(SchedulerLease)
+            .where(
+                SchedulerLease.name == self.name,
+                SchedulerLease.holder == self.holder,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        self.is_held = False
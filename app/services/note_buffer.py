@@ -0,0 +1,225 @@
+import logging
+import threading
+from collections import Counter, deque
+from datetime import date
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.orm import Session
+
+from app.core.compression import compress_entry
+from app.core.config import NOTE_FLUSH_BATCH_SIZE
+from app.models.note import Note
+
+logger = logging.getLogger(__name__)
+
+
+class PendingNote(NamedTuple):
+    """
+    Latest buffered state of a note waiting to be written.
+    """
+
+    id: int
+    user_id: int
+    date: date
+    entry: str
+    version: int
+    base_version: int  # Version in the database the entry was made from
+
+
+class NoteWriteBuffer:
+    """
+    Write-behind buffer for note entries.
+    Autosaves replace the pending entry of a note in memory, and flush()
+    writes only the latest entry of each note in batched UPDATEs.
+    The buffer lives in one process, so with several workers each note's
+    autosaves must reach the same worker (a single worker or sticky routing
+    by user). Otherwise workers buffer competing entries; flush() only writes
+    a note still at its base version, so the first write wins and the others
+    are logged and dropped rather than overwriting it.
+    """
+
+    def __init__(self, batch_size: int = NOTE_FLUSH_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending: Dict[int, PendingNote] = {}
+        self._saves = Counter()
+
+        # Metrics
+        self.flushes = 0
+        self.saves_total = 0
+        self.writes_total = 0
+        self.conflicts_total = 0
+        self.recent_flushes = deque(maxlen=100)
+
+    def save(
+        self,
+        note_id: int,
+        user_id: int,
+        entry: str,
+        stored: Optional[PendingNote] = None,
+    ) -> Optional[PendingNote]:
+        """
+        Buffer an autosave on top of the note's latest state and return it.
+        That's the user's buffered entry if any, else stored, the note as read
+        from the database. With neither, nothing is buffered and None is
+        returned, so the caller can read the note and save again.
+        The entry is read and replaced under the lock, so a flush can't write
+        and remove it in between; a save made while its note is written is
+        rebased onto the written version once the flush completes.
+        """
+        with self._lock:
+            current = self._pending.get(note_id)
+            if not current or current.user_id != user_id:
+                current = stored
+            if not current:
+                return None
+
+            note = current._replace(entry=entry, version=current.version + 1)
+            self._pending[note_id] = note
+            self._saves[note_id] += 1
+            self.saves_total += 1
+            return note
+
+    def get(self, note_id: int) -> Optional[PendingNote]:
+        """
+        Get the buffered state of a note, if any.
+        """
+        with self._lock:
+            return self._pending.get(note_id)
+
+    def flush(self, db: Session, note_id: Optional[int] = None) -> int:
+        """
+        Write buffered entries to the database and return the number of rows written.
+        If note_id is given, only that note is flushed.
+        A note is only written if its row is still at the version its entry
+        was made from; notes changed or deleted since are logged and dropped.
+        Entries stay readable while they're written, and saves made meanwhile
+        are kept for the next flush. The caller's session is committed.
+        """
+        with self._lock:
+            if note_id is None:
+                pending = list(self._pending.values())
+            else:
+                note = self._pending.get(note_id)
+                pending = [note] if note else []
+            saves = {n.id: self._saves.pop(n.id, 0) for n in pending}
+
+        if not pending:
+            return 0
+
+        table = Note.__table__
+        statement = (
+            update(table)
+            .where(
+                and_(
+                    table.c.id == bindparam("b_id"),
+                    table.c.user_id == bindparam("b_user_id"),
+                    table.c.version == bindparam("b_base_version"),
+                )
+            )
+            .values(
+                entry=bindparam("b_entry"),
+                entry_compressed=bindparam("b_entry_compressed"),
+                version=bindparam("b_version"),
+            )
+        )
+
+        conflicts = []
+        try:
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start : start + self.batch_size]
+
+                # Lock the rows and skip notes written elsewhere since their
+                # base version, e.g. by another worker's buffer
+                versions = dict(
+                    db.execute(
+                        select(table.c.id, table.c.version)
+                        .where(table.c.id.in_([n.id for n in batch]))
+                        .order_by(table.c.id)
+                        .with_for_update()
+                    ).all()
+                )
+                params = []
+                for n in batch:
+                    if versions.get(n.id) != n.base_version:
+                        conflicts.append(n)
+                        continue
+                    text, compressed = compress_entry(n.entry)
+                    params.append(
+                        {
+                            "b_id": n.id,
+                            "b_user_id": n.user_id,
+                            "b_entry": text,
+                            "b_entry_compressed": compressed,
+                            "b_version": n.version,
+                            "b_base_version": n.base_version,
+                        }
+                    )
+                if params:
+                    db.execute(statement, params)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Count the saves again with the next flush
+            with self._lock:
+                self._saves.update(saves)
+            raise
+
+        conflicted = {n.id for n in conflicts}
+        with self._lock:
+            for n in pending:
+                current = self._pending.get(n.id)
+                if current is n:
+                    del self._pending[n.id]
+                elif current and current.base_version == n.base_version:
+                    # Saved on top of the flushed entry while it was written
+                    if n.id in conflicted:
+                        del self._pending[n.id]
+                    else:
+                        self._pending[n.id] = current._replace(base_version=n.version)
+
+            written = len(pending) - len(conflicts)
+            self.flushes += 1
+            self.writes_total += written
+            self.conflicts_total += len(conflicts)
+            self.recent_flushes.append(
+                {"saves": sum(saves.values()), "writes": written}
+            )
+
+        for n in conflicts:
+            logger.warning(
+                "Dropped buffered entry of note %d, changed since version %d",
+                n.id,
+                n.base_version,
+            )
+
+        return written
+
+    def metrics(self) -> dict:
+        """
+        Get buffer metrics, including the number of saves coalesced per flush.
+        """
+        with self._lock:
+            recent = list(self.recent_flushes)
+            pending = len(self._pending)
+
+        saves_per_flush = [f["saves"] for f in recent]
+        return {
+            "pending_notes": pending,
+            "flushes": self.flushes,
+            "saves_total": self.saves_total,
+            "writes_total": self.writes_total,
+            "conflicts_total": self.conflicts_total,
+            "last_flush_saves": saves_per_flush[-1] if saves_per_flush else 0,
+            "avg_saves_per_flush": (
+                round(sum(saves_per_flush) / len(saves_per_flush), 2)
+                if saves_per_flush
+                else 0
+            ),
+            "recent_flushes": recent,
+        }
+
+
+# Shared buffer for this process
+note_buffer = NoteWriteBuffer()
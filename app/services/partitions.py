@@ -0,0 +1,116 @@
+from datetime import date
+from typing import List, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Get the first day of the month a number of months after the given one.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """
+    Name of a table's partition for a month, e.g. tasks_2026_10.
+    """
+    return f"{table}_{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(db: Session, table: str) -> bool:
+    """
+    Check whether a table is partitioned. Only Postgres tables can be.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return (
+        db.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+            ),
+            {"table": table},
+        ).first()
+        is not None
+    )
+
+
+def get_partitions(db: Session, table: str) -> Set[str]:
+    """
+    Get the names of a partitioned table's partitions.
+    """
+    return set(
+        db.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "WHERE parent.relname = :table AND pg_table_is_visible(parent.oid)"
+            ),
+            {"table": table},
+        ).scalars()
+    )
+
+
+def create_month_partition(db: Session, table: str, month: date):
+    """
+    Create a table's partition for a month.
+    Rows of the month that landed in the default partition are moved into
+    the new partition before it's attached, since attaching fails while the
+    default partition holds rows of its range. The caller commits.
+    """
+    name = partition_name(table, month)
+    bounds = {"start": month, "end": add_months(month, 1)}
+
+    db.execute(
+        text(
+            f'CREATE TABLE "{name}" '
+            f'(LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+    )
+    db.execute(
+        text(
+            f'WITH moved AS (DELETE FROM "{table}_default" '
+            "WHERE date >= :start AND date < :end RETURNING *) "
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        ),
+        bounds,
+    )
+    # Bounds are literals in DDL, so they can't be bound parameters
+    db.execute(
+        text(
+            f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+        )
+    )
+
+
+def create_missing_partitions(
+    db: Session, table: str, first_month: date, last_month: date
+) -> List[str]:
+    """
+    Create a table's monthly partitions from the first through the last month
+    that don't exist yet, each in its own transaction.
+    Returns the names of the created partitions.
+    """
+    existing = get_partitions(db, table)
+    created = []
+
+    month = month_start(first_month)
+    while month <= last_month:
+        name = partition_name(table, month)
+        if name not in existing:
+            create_month_partition(db, table, month)
+            db.commit()
+            created.append(name)
+        month = add_months(month, 1)
+
+    return created
@@ -0,0 +1,59 @@
+from typing import Optional
+
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+
+from app.core.config import (
+    STRIPE_API_BASE,
+    STRIPE_CONNECT_TIMEOUT_SECONDS,
+    STRIPE_MAX_NETWORK_RETRIES,
+    STRIPE_POOL_SIZE,
+    STRIPE_READ_TIMEOUT_SECONDS,
+)
+
+
+def configure_stripe(
+    api_base: Optional[str] = STRIPE_API_BASE,
+    connect_timeout: float = STRIPE_CONNECT_TIMEOUT_SECONDS,
+    read_timeout: float = STRIPE_READ_TIMEOUT_SECONDS,
+    max_network_retries: int = STRIPE_MAX_NETWORK_RETRIES,
+    pool_size: int = STRIPE_POOL_SIZE,
+) -> stripe.RequestsClient:
+    """
+    Install the HTTP client used by every Stripe SDK call.
+    All threads share one keep-alive connection pool sized for the blocking
+    executor, requests fail fast on explicit connect/read timeouts, and
+    failed requests are retried up to max_network_retries times with the
+    SDK's exponential backoff and jitter (POSTs reuse an idempotency key).
+    api_base points the SDK at another server, e.g. a local stub in tests.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    client = stripe.RequestsClient(
+        timeout=(connect_timeout, read_timeout), session=session
+    )
+    stripe.default_http_client = client
+    stripe.max_network_retries = max_network_retries
+    stripe.api_base = api_base or stripe.DEFAULT_API_BASE
+
+    return client
+
+
+def to_dict(obj) -> dict:
+    """
+    Convert an SDK response to plain dicts, which unlike StripeObjects support
+    .get(); plain dicts (e.g. parsed webhook payloads) are returned as is.
+    """
+    if isinstance(obj, stripe.StripeObject):
+        return obj.to_dict()
+    return obj
+
+
+configure_stripe()
+
+# Re-export stripe so callers use the configured client
+__all__ = ["stripe"]
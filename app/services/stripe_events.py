@@ -0,0 +1,310 @@
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import and_, case, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    STRIPE_EVENT_CLAIM_TIMEOUT_SECONDS,
+    STRIPE_EVENT_MAX_ATTEMPTS,
+)
+from app.models.stripe_event import StripeEvent
+from app.models.user import User
+from app.services.catalog import bump_catalog_version, catalog
+from app.services.stripe_client import stripe
+from app.services.subscriptions import (
+    apply_subscription_snapshot,
+    fetch_missing_price,
+    fetch_subscription,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def store_stripe_event(db: Session, event_id: str, event_type: str, payload: str):
+    """
+    Insert a verified event into the stripe_events inbox and return whether it
+    is new. Replays of an event already in the inbox are ignored.
+    The caller's session is committed.
+    """
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    result = db.execute(
+        insert(StripeEvent)
+        .values(
+            id=event_id,
+            type=event_type,
+            payload=payload,
+            status="pending",
+            attempts=0,
+            received_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    db.commit()
+
+    return bool(result.rowcount)
+
+
+def cancel_old_subscription(subscription_id: str):
+    try:
+        stripe.Subscription.delete(subscription_id)
+    except stripe.StripeError as e:
+        logger.warning("Failed to cancel old subscription: %s", e)
+
+
+def call_stripe_for_event(db: Session, event: dict) -> dict:
+    """
+    Make the Stripe calls an event needs before it is applied, e.g. cancelling
+    a replaced subscription or retrieving a new one. The user is read in a
+    transaction that ends before Stripe is called, so no transaction or row
+    lock is held during network calls.
+    Returns the Stripe data for apply_stripe_event.
+    """
+    event_type = event["type"]
+    data_object = event["data"]["object"]
+    stripe_data = {}
+
+    if event_type == "checkout.session.completed":
+        subscription_id = data_object.get("subscription")
+        mode = data_object.get("mode")  # "subscription" or "payment"
+        user = db.execute(
+            select(User.id, User.stripe_subscription_id).where(
+                User.stripe_customer_id == data_object.get("customer")
+            )
+        ).first()
+        db.rollback()
+        if not user:
+            return stripe_data
+        existing_subscription_id = user.stripe_subscription_id
+
+        if subscription_id and mode == "subscription":
+            if existing_subscription_id and existing_subscription_id != subscription_id:
+                # Cancel old subscription if it exists
+                cancel_old_subscription(existing_subscription_id)
+
+            # Snapshot the new subscription for the status endpoint
+            try:
+                stripe_data["subscription"] = fetch_subscription(subscription_id)
+            except stripe.StripeError as e:
+                logger.warning("Failed to snapshot new subscription: %s", e)
+        elif mode == "payment" and existing_subscription_id:
+            cancel_old_subscription(existing_subscription_id)
+
+    elif event_type == "customer.subscription.updated":
+        fetch_missing_price(data_object)
+
+    elif event_type.startswith(("price.", "product.")):
+        # Prices or products changed in the dashboard
+        catalog.refresh()
+
+    return stripe_data
+
+
+def apply_stripe_event(db: Session, event: dict, stripe_data: Optional[dict] = None):
+    """
+    Apply a Stripe event to the user it belongs to, with the Stripe data
+    from call_stripe_for_event. Makes no Stripe calls.
+    Changes are left for the caller to commit.
+    """
+    stripe_data = stripe_data or {}
+
+    # Get the event type and data object
+    event_type = event["type"]
+    data_object = event["data"]["object"]
+    customer_id = data_object.get("customer")
+
+    if event_type == "checkout.session.completed":
+        subscription_id = data_object.get("subscription")
+        mode = data_object.get("mode")  # "subscription" or "payment"
+        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
+
+        if user:
+            setattr(user, "is_subscribed", True)
+
+            if subscription_id and mode == "subscription":
+                # Update the user's subscription status
+                setattr(user, "stripe_subscription_id", subscription_id)
+                setattr(user, "subscription_status", "active")
+
+                if stripe_data.get("subscription"):
+                    apply_subscription_snapshot(user, stripe_data["subscription"])
+                else:
+                    setattr(user, "subscription_synced_at", None)
+            elif mode == "payment":
+                setattr(user, "subscription_status", "lifetime")
+                setattr(user, "plan_name", "Lifetime Access")
+                # Any old subscription was cancelled before applying
+                setattr(user, "stripe_subscription_id", None)
+
+    elif event_type == "invoice.paid":
+        # Payment succeeded for an invoice (e.g. recurring payments)
+        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
+
+        if user:
+            setattr(user, "is_subscribed", True)
+            setattr(user, "subscription_status", "active")
+
+    elif event_type == "customer.subscription.updated":
+        # Update subscription details when Stripe updates them; the status
+        # (active, trialing, past_due, canceled, etc.) and access come with
+        # the snapshot
+        subscription_id = data_object.get("id")
+        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
+
+        if user:
+            setattr(user, "stripe_subscription_id", subscription_id)
+            apply_subscription_snapshot(user, data_object)
+
+    elif event_type == "customer.subscription.deleted":
+        # A subscription was canceled or deleted.
+        subscription_id = data_object.get("id")
+        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
+
+        # Check if the user has a subscription linked to the customer ID
+        if user and getattr(user, "stripe_subscription_id") == subscription_id:
+            if data_object.get("cancel_at_period_end"):
+                setattr(user, "subscription_status", "canceled")
+                setattr(user, "cancel_at_period_end", True)
+            else:
+                setattr(user, "subscription_status", "deleted")
+                setattr(user, "is_subscribed", False)
+                setattr(user, "stripe_subscription_id", None)
+
+    elif event_type == "invoice.payment_failed":
+        # Payment failed; mark subscription as inactive.
+        user = db.query(User).filter_by(stripe_customer_id=customer_id).first()
+
+        if user:
+            setattr(user, "is_subscribed", False)
+            setattr(user, "subscription_status", "past_due")
+
+    elif event_type.startswith(("price.", "product.")):
+        # This worker reloaded the catalog before applying; the others
+        # reload it once they see the new version
+        bump_catalog_version(db)
+
+    else:
+        logger.warning(
+            f"Customer ID {customer_id or '[unknown]'} not linked to any user."
+        )
+
+
+class ClaimedEvent(NamedTuple):
+    """
+    Fields of a claimed event, copied before the claim commits, so reading
+    them doesn't load the expired row again.
+    """
+
+    id: str
+    status: str
+    payload: str
+
+
+def claim_stripe_event(db: Session, skip: List[str]) -> Optional[ClaimedEvent]:
+    """
+    Claim the oldest pending event, or one whose claim has timed out, e.g.
+    because its worker died, by marking it processing. The row is only
+    locked, with SELECT ... FOR UPDATE SKIP LOCKED, until the claim commits.
+    """
+    now = datetime.utcnow()
+    event = db.scalars(
+        select(StripeEvent)
+        .where(
+            or_(
+                StripeEvent.status == "pending",
+                and_(
+                    StripeEvent.status == "processing",
+                    StripeEvent.claimed_at
+                    < now - timedelta(seconds=STRIPE_EVENT_CLAIM_TIMEOUT_SECONDS),
+                ),
+            ),
+            StripeEvent.id.not_in(skip),
+        )
+        .order_by(StripeEvent.received_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    if event is None:
+        db.rollback()
+        return None
+
+    event.attempts += 1
+    if event.status == "processing" and event.attempts > STRIPE_EVENT_MAX_ATTEMPTS:
+        # Its last allowed attempt never finished
+        event.status = "failed"
+        event.error = event.error or "Claim timed out"
+    else:
+        event.status = "processing"
+        event.claimed_at = now
+    claimed = ClaimedEvent(event.id, event.status, event.payload)
+    db.commit()
+    return claimed
+
+
+def process_stripe_events(db: Session, limit: int = 100) -> int:
+    """
+    Apply pending events from the stripe_events inbox, oldest first, and
+    return the number applied.
+    Each event is claimed in a short transaction of its own, so several
+    workers can drain the inbox at once. Stripe is then called outside any
+    transaction, and the event's changes are applied and it is marked
+    processed in a second short transaction, so its changes are made once.
+    A failed event is retried on later runs until it reaches
+    STRIPE_EVENT_MAX_ATTEMPTS.
+    The caller's session is committed after each event.
+    """
+    applied = 0
+    tried = []
+
+    for _ in range(limit):
+        event = claim_stripe_event(db, tried)
+        if event is None:
+            break
+
+        event_id = event.id
+        tried.append(event_id)
+        if event.status == "failed":
+            continue
+
+        try:
+            payload = json.loads(event.payload)
+            stripe_data = call_stripe_for_event(db, payload)
+            apply_stripe_event(db, payload, stripe_data)
+            db.execute(
+                update(StripeEvent)
+                .where(StripeEvent.id == event_id)
+                .values(
+                    status="processed",
+                    processed_at=datetime.utcnow(),
+                    error=None,
+                )
+            )
+            db.commit()
+            applied += 1
+        except Exception as e:
+            db.rollback()
+            logger.exception("Error applying Stripe event %s", event_id)
+
+            # Record the failure outside the rolled back transaction, and
+            # release the claim for a retry until attempts run out
+            db.execute(
+                update(StripeEvent)
+                .where(StripeEvent.id == event_id)
+                .values(
+                    status=case(
+                        (
+                            StripeEvent.attempts >= STRIPE_EVENT_MAX_ATTEMPTS,
+                            "failed",
+                        ),
+                        else_="pending",
+                    ),
+                    error=f"{type(e).__name__}: {e}",
+                )
+            )
+            db.commit()
+
+    return applied
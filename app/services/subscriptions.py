@@ -0,0 +1,220 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    SUBSCRIPTION_REFRESH_RETRY_SECONDS,
+    SUBSCRIPTION_SNAPSHOT_TTL_SECONDS,
+)
+from app.models.user import User
+from app.services.catalog import catalog
+from app.services.stripe_client import stripe, to_dict
+
+logger = logging.getLogger(__name__)
+
+
+def apply_subscription_snapshot(user: User, subscription):
+    """
+    Copy the details shown on the subscription page from a Stripe subscription
+    onto the user. The plan name comes from the expanded product or, when
+    the product isn't expanded, from the catalog cache.
+    Changes are left for the caller to commit.
+    """
+    items = (subscription.get("items") or {}).get("data") or []
+    item = items[0] if items else {}
+    period_end_timestamp = item.get("current_period_end") or subscription.get(
+        "trial_end"
+    )
+    price = item.get("price") or {}
+    product = price.get("product")
+
+    # Status and access follow the same rule as the webhooks and the nightly
+    # reconciliation, so a refreshed snapshot never disagrees with them
+    state = expected_subscription_state(
+        subscription, getattr(user, "subscription_status")
+    )
+    setattr(user, "subscription_status", state["subscription_status"])
+    setattr(user, "is_subscribed", state["is_subscribed"])
+    # Ended subscriptions are unlinked; linking is left to the caller
+    if subscription["status"] == "canceled":
+        setattr(user, "stripe_subscription_id", None)
+    setattr(
+        user,
+        "subscription_period_end",
+        (
+            datetime.utcfromtimestamp(period_end_timestamp)
+            if period_end_timestamp
+            else None
+        ),
+    )
+    setattr(
+        user,
+        "cancel_at_period_end",
+        subscription.get("cancel_at_period_end", False),
+    )
+    if product and not isinstance(product, str):
+        setattr(user, "plan_name", product.get("name"))
+    elif catalog.get_price(price.get("id")):
+        setattr(user, "plan_name", catalog.get_price(price.get("id")).product_name)
+    setattr(user, "price_unit_amount", price.get("unit_amount"))
+    setattr(user, "price_currency", price.get("currency"))
+    setattr(user, "subscription_synced_at", datetime.utcnow())
+
+
+def expected_subscription_state(
+    subscription, current_status: Optional[str] = None
+) -> dict:
+    """
+    Get the user fields the webhooks would have set for a Stripe subscription.
+    A subscription the user cancelled at period end keeps the local
+    "canceled" status until it ends, given the user's current status.
+    """
+    status = subscription["status"]
+
+    # An ended subscription is unlinked, as on customer.subscription.deleted
+    if status == "canceled":
+        return {
+            "subscription_status": "deleted",
+            "is_subscribed": False,
+            "stripe_subscription_id": None,
+        }
+
+    is_subscribed = status in ("active", "trialing")
+    # Cancelling at period end is shown as canceled until the period ends
+    if (
+        current_status == "canceled"
+        and subscription.get("cancel_at_period_end")
+        and is_subscribed
+    ):
+        status = "canceled"
+
+    return {
+        "subscription_status": status,
+        "is_subscribed": is_subscribed,
+        "stripe_subscription_id": subscription.get("id"),
+    }
+
+
+def fetch_missing_price(subscription: dict):
+    """
+    Fetch a subscription's price into this worker's catalog when it's missing,
+    e.g. created since the last refresh, so snapshots get its plan name.
+    Prices with their product expanded don't need the catalog.
+    """
+    items = (subscription.get("items") or {}).get("data") or []
+    price = (items[0] if items else {}).get("price") or {}
+    price_id = price.get("id")
+    if not price_id or not isinstance(price.get("product"), str):
+        return
+    if catalog.get_price(price_id):
+        return
+
+    try:
+        catalog.fetch_price(price_id)
+    except stripe.StripeError as e:
+        logger.warning("Failed to fetch Stripe price %s: %s", price_id, e)
+
+
+def fetch_subscription(subscription_id: str) -> dict:
+    """
+    Retrieve a subscription from Stripe, with its price in the catalog.
+    Raises stripe.StripeError if Stripe can't be reached.
+    """
+    subscription = to_dict(stripe.Subscription.retrieve(subscription_id))
+    fetch_missing_price(subscription)
+    return subscription
+
+
+def sync_subscription_snapshot(user: User):
+    """
+    Retrieve the user's subscription from Stripe and store its snapshot.
+    Raises stripe.StripeError if Stripe can't be reached.
+    Changes are left for the caller to commit.
+    """
+    subscription = fetch_subscription(getattr(user, "stripe_subscription_id"))
+    apply_subscription_snapshot(user, subscription)
+
+
+def is_snapshot_stale(user: User) -> bool:
+    """
+    Check whether the user's snapshot is older than SUBSCRIPTION_SNAPSHOT_TTL_SECONDS.
+    """
+    synced_at = getattr(user, "subscription_synced_at")
+    return synced_at is None or datetime.utcnow() - synced_at > timedelta(
+        seconds=SUBSCRIPTION_SNAPSHOT_TTL_SECONDS
+    )
+
+
+def claim_snapshot_refresh(db: Session, user_id: int) -> bool:
+    """
+    Claim the refresh of a user's missing or stale snapshot and return
+    whether this caller got it.
+    The check and the claim are one conditional UPDATE of
+    subscription_synced_at, so concurrent requests in any worker schedule a
+    single refresh. The claim makes the snapshot look fresh for
+    SUBSCRIPTION_REFRESH_RETRY_SECONDS, after which a failed refresh is
+    claimed again. The caller's session is committed.
+    """
+    now = datetime.utcnow()
+    ttl = timedelta(seconds=SUBSCRIPTION_SNAPSHOT_TTL_SECONDS)
+    result = db.execute(
+        update(User)
+        .where(
+            User.id == user_id,
+            or_(
+                User.subscription_synced_at.is_(None),
+                User.subscription_synced_at < now - ttl,
+            ),
+        )
+        .values(
+            subscription_synced_at=now
+            - ttl
+            + timedelta(seconds=SUBSCRIPTION_REFRESH_RETRY_SECONDS)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return bool(result.rowcount)
+
+
+def refresh_subscription_snapshot(bind, user_id: int):
+    """
+    Refresh a user's snapshot from Stripe in its own session.
+    Used to revalidate stale snapshots after the response has been sent.
+    """
+    db = Session(bind=bind)
+
+    try:
+        user = db.get(User, user_id)
+        if user and getattr(user, "stripe_subscription_id"):
+            sync_subscription_snapshot(user)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Failed to refresh subscription of user %s: %s", user_id, e)
+    finally:
+        db.close()
+
+
+def subscription_status(user: User) -> dict:
+    """
+    Build the subscription status response from the user's snapshot.
+    """
+    period_end = getattr(user, "subscription_period_end")
+    unit_amount = getattr(user, "price_unit_amount")
+    currency = getattr(user, "price_currency")
+
+    return {
+        "is_subscribed": getattr(user, "subscription_status") == "active",
+        "status": getattr(user, "subscription_status"),
+        "period_end_date": period_end.strftime("%b %d, %Y") if period_end else None,
+        "cancel_at_period_end": bool(getattr(user, "cancel_at_period_end")),
+        "plan_name": getattr(user, "plan_name"),
+        "price_amount": (
+            round(unit_amount / 100, 2) if unit_amount is not None else None
+        ),
+        "price_currency": currency.upper() if currency else None,
+    }
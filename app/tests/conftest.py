@@ -1,19 +1,41 @@
 import os
 
 import pytest
+import stripe
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-from app.core.database import Base, get_db
-from app.deps.auth import get_subscribed_user, get_token, get_user
+from app.core.database import (
+    Base,
+    get_async_db,
+    get_async_replica_db,
+    get_db,
+    to_async_url,
+)
+from app.deps.auth import (
+    get_async_subscribed_user,
+    get_async_token,
+    get_async_user,
+    get_subscribed_user,
+    get_token,
+    get_user,
+)
 from app.main import app
 from app.models.user import User
+from app.services.stripe_client import configure_stripe
+from app.tests.stripe_stub import StubStripe
 
 # Force SQLite for tests - override any environment DATABASE_URL
 os.environ["DATABASE_URL"] = "sqlite:///file::memory:?cache=shared"
 TEST_DATABASE_URL = "sqlite:///file::memory:?cache=shared"
 
+# Optional Postgres for tests of query plans and partitioning
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
 # Create a new engine and session for each test
 engine = create_engine(
     TEST_DATABASE_URL,
@@ -76,7 +98,10 @@ def setup_dependency_overrides():
     app.dependency_overrides[get_db] = override_get_db
     app.dependency_overrides[get_user] = override_get_user
     app.dependency_overrides[get_subscribed_user] = override_get_subscribed_user
+    app.dependency_overrides[get_async_user] = override_get_user
+    app.dependency_overrides[get_async_subscribed_user] = override_get_subscribed_user
     app.dependency_overrides[get_token] = override_get_token
+    app.dependency_overrides[get_async_token] = override_get_token
     yield
     # Clean up overrides
     app.dependency_overrides.clear()
@@ -100,6 +125,19 @@ def client():
         finally:
             db.close()
 
+    # TestClient may run each request on a new event loop, so async
+    # connections aren't pooled across requests
+    test_async_engine = create_async_engine(
+        to_async_url(TEST_DATABASE_URL), poolclass=NullPool
+    )
+    TestAsyncSessionLocal = async_sessionmaker(
+        test_async_engine, autoflush=False, expire_on_commit=False
+    )
+
+    async def override_get_async_db():
+        async with TestAsyncSessionLocal() as db:
+            yield db
+
     # Clean slate for each test
     Base.metadata.drop_all(bind=test_engine)
     Base.metadata.create_all(bind=test_engine)
@@ -107,6 +145,8 @@ def client():
     # Override the database dependency
     original_override = app.dependency_overrides.get(get_db)
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_replica_db] = override_get_async_db
 
     try:
         yield TestClient(app)
@@ -116,11 +156,21 @@ def client():
             app.dependency_overrides[get_db] = original_override
         else:
             app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_async_db, None)
+        app.dependency_overrides.pop(get_async_replica_db, None)
         # Clean up
         Base.metadata.drop_all(bind=test_engine)
         test_engine.dispose()
 
 
+# Provide a client that sends the internal token, for the internal routes
+@pytest.fixture
+def internal_client(client, monkeypatch):
+    monkeypatch.setattr("app.deps.auth.INTERNAL_API_TOKEN", "test-internal-token")
+    client.headers["X-Internal-Token"] = "test-internal-token"
+    return client
+
+
 # Create new user for each test
 @pytest.fixture
 def seeded_client(client):
@@ -146,3 +196,69 @@ def seeded_client(client):
     finally:
         db.close()
     return client
+
+
+# Point the Stripe SDK at a local stub server
+@pytest.fixture
+def stripe_stub(monkeypatch):
+    # The SDK refuses to send requests without a key, even to the stub
+    monkeypatch.setattr(stripe, "api_key", "sk_test_stub")
+    stub = StubStripe()
+    stub.start()
+    configure_stripe(
+        api_base=stub.url, connect_timeout=1, read_timeout=1, max_network_retries=1
+    )
+    try:
+        yield stub
+    finally:
+        configure_stripe()
+        stub.stop()
+
+
+# SQL of an executed statement, with its parameters (the first row of an
+# executemany)
+class RecordedStatement(str):
+    parameters = None
+
+
+# Record the SQL statements executed on any engine, e.g. by one request
+@pytest.fixture
+def statements():
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded_statement = RecordedStatement(statement)
+        recorded_statement.parameters = parameters[0] if executemany else parameters
+        recorded.append(recorded_statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield recorded
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+
+# Get the kind of each recorded statement, e.g. SELECT or UPDATE
+def statement_kinds(statements):
+    return [statement.split()[0] for statement in statements]
+
+
+# Provide an engine on an empty Postgres schema, dropped afterwards
+@pytest.fixture(scope="module")
+def postgres_engine():
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+
+    schema = "app_tests"
+    pg_engine = create_engine(
+        TEST_POSTGRES_URL, connect_args={"options": f"-csearch_path={schema}"}
+    )
+    with pg_engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+
+    yield pg_engine
+
+    with pg_engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    pg_engine.dispose()
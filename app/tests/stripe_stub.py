@@ -0,0 +1,114 @@
+"""
+Local stub of the Stripe API for offline tests
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubStripe:
+    """
+    Serves canned JSON responses by method and path on a local port.
+    Latency and failures can be injected, and every request is recorded
+    along with the client port it arrived on (to check connection reuse).
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.latency = 0.0
+        self.failures = []
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def do_POST(self):
+                stub._handle(self)
+
+            def do_DELETE(self):
+                stub._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add(self, method, path, body, status=200):
+        """
+        Respond to method and path with a JSON body. A callable body is
+        called with the request's query and form params.
+        """
+        self.routes[(method, path)] = (status, body)
+
+    def fail_next(self, count=1, status=500):
+        """
+        Fail the next count requests with an API error.
+        """
+        with self._lock:
+            self.failures.extend([status] * count)
+
+    def _handle(self, handler):
+        url = urlparse(handler.path)
+        length = int(handler.headers.get("Content-Length") or 0)
+        form = handler.rfile.read(length).decode() if length else ""
+        params = {**parse_qs(url.query), **parse_qs(form)}
+
+        with self._lock:
+            self.requests.append(
+                {
+                    "method": handler.command,
+                    "path": url.path,
+                    "params": params,
+                    "headers": dict(handler.headers),
+                    "client_port": handler.client_address[1],
+                }
+            )
+            status = self.failures.pop(0) if self.failures else None
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if status is not None:
+            body = {"error": {"type": "api_error", "message": "Stub failure"}}
+        elif (handler.command, url.path) in self.routes:
+            status, body = self.routes[(handler.command, url.path)]
+            if callable(body):
+                body = body(params)
+        else:
+            status = 404
+            body = {
+                "error": {
+                    "type": "invalid_request_error",
+                    "message": f"No stub for {handler.command} {url.path}",
+                }
+            }
+
+        data = json.dumps(body).encode()
+        try:
+            handler.send_response(status)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(data)))
+            handler.end_headers()
+            handler.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. after a read timeout
+            pass
@@ -34,7 +34,7 @@ class TestAuthentication:
             name="Test User",
             is_subscribed=True,
         )
-        mock_db.query.return_value.filter.return_value.first.return_value = mock_user
+        mock_db.execute.return_value.scalars.return_value.first.return_value = mock_user
 
         # Create mock credentials
         mock_credentials = HTTPAuthorizationCredentials(
@@ -79,7 +79,7 @@ class TestAuthentication:
         # Mock database session with no user found
         mock_db = Mock()
         mock_get_db.return_value = mock_db
-        mock_db.query.return_value.filter.return_value.first.return_value = None
+        mock_db.execute.return_value.scalars.return_value.first.return_value = None
 
         mock_credentials = HTTPAuthorizationCredentials(
             scheme="Bearer", credentials="valid_token"
@@ -189,13 +189,13 @@ class TestAuthenticationIntegration:
     def test_protected_endpoint_no_auth(self, client):
         """Test accessing protected endpoint without authentication"""
         # Temporarily remove auth overrides to test real auth behavior
-        from app.deps.auth import get_user
+        from app.deps.auth import get_async_user
         from app.main import app
 
         # Remove the override temporarily
-        original_override = app.dependency_overrides.get(get_user)
-        if get_user in app.dependency_overrides:
-            del app.dependency_overrides[get_user]
+        original_override = app.dependency_overrides.get(get_async_user)
+        if get_async_user in app.dependency_overrides:
+            del app.dependency_overrides[get_async_user]
 
         try:
             response = client.get("/tasks/")
@@ -204,18 +204,18 @@ class TestAuthenticationIntegration:
         finally:
             # Restore the override
             if original_override:
-                app.dependency_overrides[get_user] = original_override
+                app.dependency_overrides[get_async_user] = original_override
 
     def test_protected_endpoint_invalid_auth(self, client):
         """Test accessing protected endpoint with invalid authentication"""
         # Temporarily remove auth overrides to test real auth behavior
-        from app.deps.auth import get_user
+        from app.deps.auth import get_async_user
         from app.main import app
 
         # Remove the override temporarily
-        original_override = app.dependency_overrides.get(get_user)
-        if get_user in app.dependency_overrides:
-            del app.dependency_overrides[get_user]
+        original_override = app.dependency_overrides.get(get_async_user)
+        if get_async_user in app.dependency_overrides:
+            del app.dependency_overrides[get_async_user]
 
         try:
             response = client.get(
@@ -226,19 +226,20 @@ class TestAuthenticationIntegration:
         finally:
             # Restore the override
             if original_override:
-                app.dependency_overrides[get_user] = original_override
+                app.dependency_overrides[get_async_user] = original_override
 
     @patch("app.deps.auth.firebase_auth.verify_id_token")
     def test_protected_endpoint_valid_auth(self, mock_verify_token, client):
         """Test accessing protected endpoint with valid authentication"""
         # Temporarily remove auth overrides to test real auth behavior
-        from app.deps.auth import get_user
+        from app.deps.auth import get_async_token, get_async_user
         from app.main import app
 
-        # Remove the override temporarily
-        original_override = app.dependency_overrides.get(get_user)
-        if get_user in app.dependency_overrides:
-            del app.dependency_overrides[get_user]
+        # Remove the overrides temporarily
+        original_override = app.dependency_overrides.get(get_async_user)
+        if get_async_user in app.dependency_overrides:
+            del app.dependency_overrides[get_async_user]
+        original_token_override = app.dependency_overrides.pop(get_async_token, None)
 
         try:
             # Mock Firebase verification
@@ -256,9 +257,11 @@ class TestAuthenticationIntegration:
             assert response.status_code == 404  # User not found in database
             assert "User not found" in response.json()["detail"]
         finally:
-            # Restore the override
+            # Restore the overrides
             if original_override:
-                app.dependency_overrides[get_user] = original_override
+                app.dependency_overrides[get_async_user] = original_override
+            if original_token_override:
+                app.dependency_overrides[get_async_token] = original_token_override
 
     def test_subscription_required_endpoint_no_subscription(self, client):
         """Test accessing subscription-required endpoint without subscription"""
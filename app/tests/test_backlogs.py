@@ -1,4 +1,7 @@
 from datetime import date
+from unittest.mock import patch
+
+from app.tests.conftest import statement_kinds
 
 
 def test_create_single_backlog(client):
@@ -186,3 +189,57 @@ def test_delete_backlog_not_found(client):
     delete_res = client.delete(f"/backlogs/{non_existent_id}")
     assert delete_res.status_code == 404
     assert "Backlog not found" in delete_res.json()["detail"]
+
+
+@patch("app.routes.backlogs.ORDER_COMPACTION", "deferred")
+def test_deferred_delete_backlog_leaves_dense_display_order(client):
+    """
+    A deferred delete should only remove the row while reads stay dense.
+    """
+    ids = []
+    for i in range(4):
+        res = client.post("/backlogs/", json={"detail": f"Backlog {i+1}"})
+        ids.append(res.json()["id"])
+
+    # Delete "Backlog 3" (order 2), leaving a gap in the stored orders
+    delete = client.delete(f"/backlogs/{ids[2]}")
+    assert delete.status_code == 200
+
+    res = client.get("/backlogs/")
+    assert [b["detail"] for b in res.json()] == ["Backlog 4", "Backlog 2", "Backlog 1"]
+    assert [b["order"] for b in res.json()] == [1, 2, 3]
+
+    # Moving a backlog down still lands on the requested display position
+    client.patch(f"/backlogs/{ids[3]}", json={"order": 3})
+    res = client.get("/backlogs/")
+    assert [b["detail"] for b in res.json()] == ["Backlog 2", "Backlog 1", "Backlog 4"]
+
+    # Missing backlogs still return 404
+    assert client.delete("/backlogs/99999").status_code == 404
+
+
+def test_create_backlog_statement_count(client, statements):
+    """
+    Test that creating a backlog shifts the others and inserts without reading back.
+    """
+    statements.clear()
+    res = client.post("/backlogs/", json={"detail": "Backlog"})
+
+    assert res.status_code == 200
+    assert statement_kinds(statements) == ["UPDATE", "INSERT"]
+
+
+def test_update_backlog_detail_statement_count(client, statements):
+    """
+    Test that a detail update is written and returned in one UPDATE ... RETURNING.
+    """
+    backlog = client.post("/backlogs/", json={"detail": "Old"}).json()
+
+    statements.clear()
+    res = client.patch(f"/backlogs/{backlog['id']}", json={"detail": "New"})
+
+    assert res.status_code == 200
+    assert res.json()["detail"] == "New"
+    assert res.json()["date"] == date.today().isoformat()
+    assert statement_kinds(statements) == ["UPDATE"]
+    assert "RETURNING" in statements[0]
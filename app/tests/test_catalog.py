@@ -0,0 +1,274 @@
+"""
+Test suite for the Stripe price and product catalog cache
+"""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.deps.auth import get_user
+from app.main import app
+from app.models.user import User
+from app.scheduler import refresh_stripe_catalog
+from app.services.catalog import StripeCatalog, get_catalog_version
+from app.services.subscriptions import (
+    apply_subscription_snapshot,
+    sync_subscription_snapshot,
+)
+from app.tests.conftest import TestingSessionLocal, override_get_user
+
+MONTHLY = {
+    "id": "price_monthly",
+    "object": "price",
+    "active": True,
+    "currency": "usd",
+    "unit_amount": 499,
+    "recurring": {"interval": "month"},
+    "product": {"id": "prod_pro", "object": "product", "name": "Pro", "active": True},
+}
+LIFETIME = {
+    "id": "price_lifetime",
+    "object": "price",
+    "active": True,
+    "currency": "usd",
+    "unit_amount": 2999,
+    "recurring": None,
+    "product": {
+        "id": "prod_lifetime",
+        "object": "product",
+        "name": "Lifetime Access",
+        "active": True,
+    },
+}
+
+
+def price_list(prices):
+    """Build a Stripe list response of prices"""
+    return lambda params: {
+        "object": "list",
+        "url": "/v1/prices",
+        "data": prices,
+        "has_more": False,
+    }
+
+
+@pytest.fixture
+def catalog(stripe_stub):
+    """Provide a catalog loaded from the stub and wired into the app"""
+    stripe_stub.add("GET", "/v1/prices", price_list([MONTHLY, LIFETIME]))
+    catalog = StripeCatalog()
+    catalog.load()
+    with patch("app.routes.stripe.catalog", catalog), patch(
+        "app.services.stripe_events.catalog", catalog
+    ), patch("app.services.subscriptions.catalog", catalog):
+        yield catalog
+
+
+def checkout(client, price_id, mode):
+    return client.post(
+        "/api/stripe/create-checkout-session",
+        json={
+            "price_id": price_id,
+            "mode": mode,
+            "success_url": "https://example.com/success",
+            "cancel_url": "https://example.com/cancel",
+        },
+    )
+
+
+class TestStripeCatalog:
+    """Test suite for the Stripe catalog cache"""
+
+    def test_load(self, catalog, stripe_stub):
+        """Test that prices are loaded with their products in one listing"""
+        price = catalog.get_price("price_monthly")
+
+        assert price.product_name == "Pro"
+        assert price.unit_amount == 499
+        assert price.recurring is True
+        assert catalog.lifetime_price().id == "price_lifetime"
+        assert stripe_stub.requests[0]["params"]["expand[0]"] == ["data.product"]
+
+    def test_lookups_are_local(self, catalog, stripe_stub):
+        """Test that lookups never call Stripe"""
+        requests = len(stripe_stub.requests)
+
+        catalog.get_price("price_monthly")
+        catalog.get_price("price_missing")
+        catalog.lifetime_price()
+
+        assert len(stripe_stub.requests) == requests
+
+    def test_refresh_keeps_catalog_when_stripe_fails(self, catalog, stripe_stub):
+        """Test that a failed refresh keeps serving the last catalog"""
+        stripe_stub.fail_next(5)
+
+        catalog.refresh()
+
+        assert catalog.get_price("price_monthly").product_name == "Pro"
+
+    def test_price_webhook_refreshes_catalog(self, client, catalog, stripe_stub):
+        """Test that price and product events reload the catalog"""
+        renamed = {**MONTHLY, "product": {**MONTHLY["product"], "name": "Pro Plus"}}
+        stripe_stub.add("GET", "/v1/prices", price_list([renamed, LIFETIME]))
+        event = {"id": "evt_product", "type": "product.updated", "data": {"object": {}}}
+
+        with patch("stripe.Webhook.construct_event", return_value=event):
+            client.post(
+                "/api/stripe/webhook",
+                content=json.dumps(event),
+                headers={"stripe-signature": "test_sig"},
+            )
+
+        assert catalog.get_price("price_monthly").product_name == "Pro Plus"
+
+    def test_price_webhook_reloads_other_workers(self, client, catalog, stripe_stub):
+        """Test that other workers reload once they see the new catalog version"""
+        other = StripeCatalog()
+        with patch("app.scheduler.SessionLocal", TestingSessionLocal), patch(
+            "app.scheduler.catalog", other
+        ):
+            refresh_stripe_catalog()
+            loads = len(stripe_stub.requests)
+
+            # Unchanged and recently loaded, so nothing to reload
+            refresh_stripe_catalog()
+            assert len(stripe_stub.requests) == loads
+
+            renamed = {**MONTHLY, "product": {**MONTHLY["product"], "name": "Pro Plus"}}
+            stripe_stub.add("GET", "/v1/prices", price_list([renamed, LIFETIME]))
+            event = {
+                "id": "evt_product",
+                "type": "product.updated",
+                "data": {"object": {}},
+            }
+            with patch("stripe.Webhook.construct_event", return_value=event):
+                client.post(
+                    "/api/stripe/webhook",
+                    content=json.dumps(event),
+                    headers={"stripe-signature": "test_sig"},
+                )
+            assert other.get_price("price_monthly").product_name == "Pro"
+
+            refresh_stripe_catalog()
+
+        db = TestingSessionLocal()
+        try:
+            assert other.version == get_catalog_version(db) == 1
+        finally:
+            db.close()
+        assert other.get_price("price_monthly").product_name == "Pro Plus"
+
+    def test_lifetime_status_uses_catalog(self, client, catalog):
+        """Test that the lifetime plan's price comes from the catalog"""
+        app.dependency_overrides[get_user] = lambda: User(
+            id=1, subscription_status="lifetime"
+        )
+        try:
+            data = client.get("/api/stripe/subscription-status").json()
+        finally:
+            app.dependency_overrides[get_user] = override_get_user
+
+        assert data["plan_name"] == "Lifetime Access"
+        assert data["price_amount"] == 29.99
+        assert data["price_currency"] == "USD"
+
+    def test_checkout_rejects_unknown_price(self, client, catalog, stripe_stub):
+        """Test that checkout checks prices before creating a session"""
+        requests = len(stripe_stub.requests)
+
+        res = checkout(client, "price_lifetime", "subscription")
+        assert res.status_code == 400
+        assert res.json()["detail"] == "Price doesn't match checkout mode"
+        assert len(stripe_stub.requests) == requests
+
+        # Prices missing from the catalog are looked up once on Stripe
+        res = checkout(client, "price_missing", "subscription")
+        assert res.status_code == 400
+        assert res.json()["detail"] == "Unknown price"
+        assert [r["path"] for r in stripe_stub.requests[requests:]] == [
+            "/v1/prices/price_missing"
+        ]
+
+    def test_checkout_accepts_price_created_since_load(
+        self, client, catalog, stripe_stub
+    ):
+        """Test that a new price is fetched into the catalog, not rejected"""
+        stripe_stub.add(
+            "GET", "/v1/prices/price_yearly", {**MONTHLY, "id": "price_yearly"}
+        )
+        stripe_stub.add(
+            "POST", "/v1/customers", {"id": "cus_new", "object": "customer"}
+        )
+        stripe_stub.add(
+            "POST",
+            "/v1/checkout/sessions",
+            {"id": "cs_1", "object": "checkout.session", "url": "https://pay"},
+        )
+
+        res = checkout(client, "price_yearly", "subscription")
+
+        assert res.status_code == 200
+        assert catalog.get_price("price_yearly").product_name == "Pro"
+
+    def test_lifetime_status_without_catalog_price(self, client, stripe_stub):
+        """Test that the lifetime plan falls back to the configured price"""
+        app.dependency_overrides[get_user] = lambda: User(
+            id=1, subscription_status="lifetime"
+        )
+        try:
+            with patch("app.routes.stripe.catalog", StripeCatalog()):
+                data = client.get("/api/stripe/subscription-status").json()
+        finally:
+            app.dependency_overrides[get_user] = override_get_user
+
+        assert data["plan_name"] == "Lifetime Access"
+        assert data["price_amount"] == 29.99
+        assert data["price_currency"] == "USD"
+        # The catalog refresh job fills the cache, not the read path
+        assert stripe_stub.requests == []
+
+    def test_subscription_snapshot_fetches_missing_price(self, catalog, stripe_stub):
+        """Test that a price missing from the catalog is fetched for its name"""
+        yearly = {
+            **MONTHLY,
+            "id": "price_yearly",
+            "product": {**MONTHLY["product"], "name": "Pro Yearly"},
+        }
+        stripe_stub.add("GET", "/v1/prices/price_yearly", yearly)
+        stripe_stub.add(
+            "GET",
+            "/v1/subscriptions/sub_1",
+            {
+                "id": "sub_1",
+                "object": "subscription",
+                "status": "active",
+                "items": {
+                    "object": "list",
+                    "data": [{"price": {**yearly, "product": "prod_pro"}}],
+                },
+            },
+        )
+        user = User(id=1, stripe_subscription_id="sub_1")
+
+        sync_subscription_snapshot(user)
+
+        assert user.plan_name == "Pro Yearly"
+        assert catalog.get_price("price_yearly") is not None
+
+    def test_subscription_snapshot_plan_name_from_catalog(self, catalog):
+        """Test that snapshots without an expanded product use the catalog"""
+
+        user = User(id=1)
+        apply_subscription_snapshot(
+            user,
+            {
+                "status": "active",
+                "items": {
+                    "data": [{"price": {**MONTHLY, "product": "prod_pro"}}],
+                },
+            },
+        )
+
+        assert user.plan_name == "Pro"
@@ -0,0 +1,157 @@
+"""
+Test suite for note entry compression
+"""
+
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from app.core.compression import compress_entry, decompress_entry
+from app.models.note import Note
+from app.scripts.convert_note_entries import convert_note_entries
+from app.tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def compression_on():
+    """Enable compression for entries above 16 bytes"""
+    with patch("app.core.compression.NOTE_COMPRESSION", True), patch(
+        "app.core.compression.NOTE_COMPRESSION_THRESHOLD", 16
+    ):
+        yield
+
+
+@pytest.fixture
+def db(client):
+    """Provide a session on the test database"""
+    test_engine = create_engine(
+        TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    session = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        test_engine.dispose()
+
+
+def get_stored_note(note_id):
+    """Load the raw stored columns of a note"""
+    test_engine = create_engine(
+        TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    db = sessionmaker(bind=test_engine)()
+    try:
+        return db.get(Note, note_id)
+    finally:
+        db.close()
+        test_engine.dispose()
+
+
+class TestNoteCompression:
+    """Test suite for note entry compression"""
+
+    def test_compression_disabled_by_default(self):
+        """Test that entries are stored as text unless compression is enabled"""
+        assert compress_entry("x" * 10_000) == ("x" * 10_000, None)
+
+    def test_small_entries_stay_uncompressed(self, compression_on):
+        """Test that entries below the threshold are stored as text"""
+        assert compress_entry("short") == ("short", None)
+        assert compress_entry(None) == (None, None)
+
+    def test_round_trip(self, compression_on):
+        """Test that compressed entries decompress to the original text"""
+        entry = "Dear diary, " * 100 + "ünïcödé"
+        text, compressed = compress_entry(entry)
+
+        assert text is None
+        assert len(compressed) < len(entry)
+        assert decompress_entry(text, compressed) == entry
+
+    def test_routes_store_large_entries_compressed(self, client, compression_on):
+        """Test that note routes transparently compress and decompress entries"""
+        entry = "A long day of journaling. " * 50
+        note = client.post("/notes/", json={"date": "2025-06-01", "entry": entry})
+        note_id = note.json()["id"]
+        assert note.json()["entry"] == entry
+
+        stored = get_stored_note(note_id)
+        assert stored.entry_text is None
+        assert stored.entry_compressed is not None
+
+        # Incremental edits apply to the decompressed text
+        res = client.patch(
+            f"/notes/{note_id}/edits",
+            json={"version": 1, "edits": [{"offset": 0, "delete": 1, "insert": "One"}]},
+        )
+        assert res.status_code == 200
+
+        data = client.get("/notes/?date=2025-06-01").json()
+        assert data["entry"] == "One" + entry[1:]
+
+        # Shrinking the entry stores it as text again
+        client.patch(f"/notes/{note_id}", json={"entry": "Short"})
+        stored = get_stored_note(note_id)
+        assert stored.entry_text == "Short"
+        assert stored.entry_compressed is None
+
+
+class TestConvertNoteEntries:
+    """Test suite for converting stored entries to the current settings"""
+
+    def test_converts_to_current_settings(self, db):
+        """Test that entries are compressed when enabled and decompressed when not"""
+        entry = "A long day of journaling. " * 50
+        db.add_all(
+            [
+                Note(id=1, user_id=1, date=date(2025, 6, 1), entry=entry),
+                Note(id=2, user_id=1, date=date(2025, 6, 2), entry="Short"),
+            ]
+        )
+        db.commit()
+
+        with patch("app.core.compression.NOTE_COMPRESSION", True), patch(
+            "app.core.compression.NOTE_COMPRESSION_THRESHOLD", 16
+        ):
+            assert convert_note_entries(db, batch_size=1) == 1
+            # Rerunning finds nothing left to convert
+            assert convert_note_entries(db) == 0
+
+        db.expire_all()
+        assert db.get(Note, 1).entry_text is None
+        assert db.get(Note, 1).entry == entry
+        assert db.get(Note, 2).entry_compressed is None
+
+        # Turning compression off again decompresses everything
+        assert convert_note_entries(db) == 1
+        db.expire_all()
+        assert db.get(Note, 1).entry_text == entry
+        assert db.get(Note, 1).entry_compressed is None
+
+    def test_skips_notes_saved_meanwhile(self, db, compression_on):
+        """Test that a save landing during the conversion isn't overwritten"""
+        # Stored uncompressed, from before compression was enabled
+        db.add(Note(id=1, user_id=1, date=date(2025, 6, 1), entry_text="Old " * 50))
+        db.commit()
+        execute = db.execute
+
+        def save_after_select(statement, *args, **kwargs):
+            result = execute(statement, *args, **kwargs)
+            if statement.is_select:
+                # The app saves the note after the batch was read
+                execute(
+                    update(Note)
+                    .where(Note.id == 1)
+                    .values(entry_text="New", version=Note.version + 1)
+                )
+            return result
+
+        with patch.object(db, "execute", side_effect=save_after_select):
+            assert convert_note_entries(db) == 0
+
+        db.expire_all()
+        assert db.get(Note, 1).entry == "New"
@@ -2,13 +2,28 @@
 Test suite for database core functionality
 """
 
+import asyncio
+import threading
 from unittest.mock import Mock, patch
 
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
-from app.core.database import Base, SessionLocal, get_db
+from app.core.database import (
+    Base,
+    SessionLocal,
+    async_connect_args,
+    get_async_db,
+    get_db,
+    to_async_url,
+)
+from app.core.db_pool import (
+    InstrumentedAsyncAdaptedQueuePool,
+    InstrumentedQueuePool,
+    PoolMetrics,
+)
 
 
 class TestDatabase:
@@ -136,3 +151,92 @@ class TestDatabase:
         finally:
             session1.close()
             session2.close()
+
+    def test_async_url_for_postgres(self):
+        """Test that Postgres URLs keep their credentials with the asyncpg driver"""
+        url = to_async_url("postgresql+psycopg2://app:secret@db:5432/app")
+        assert url == "postgresql+asyncpg://app:secret@db:5432/app"
+
+    def test_async_url_for_sqlite(self):
+        """Test that SQLite URLs keep their path with the aiosqlite driver"""
+        url = to_async_url("sqlite:///file::memory:?cache=shared")
+        assert url == "sqlite+aiosqlite:///file::memory:?cache=shared"
+
+    def test_async_url_unsupported_backend(self):
+        """Test that databases without an async driver are rejected"""
+        with pytest.raises(ValueError):
+            to_async_url("mysql://app@db/app")
+
+    def test_async_connect_args_cache_prepared_statements(self):
+        """Test that asyncpg connections cache prepared statements"""
+        from app.core.config import DB_PREPARED_STATEMENT_CACHE_SIZE
+
+        assert async_connect_args("postgresql://app@db/app") == {
+            "prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE
+        }
+        assert async_connect_args("sqlite:///app.db") == {}
+
+    def test_get_async_db_session(self):
+        """Test that get_async_db yields an async session and closes it"""
+
+        async def use_session():
+            db_generator = get_async_db()
+            db_session = await db_generator.__anext__()
+            assert isinstance(db_session, AsyncSession)
+            assert (await db_session.execute(text("SELECT 1"))).scalar() == 1
+            await db_generator.aclose()
+
+        asyncio.run(use_session())
+
+
+class TestPoolMetrics:
+    """Test suite for connection pool configuration and metrics"""
+
+    def test_engine_uses_configured_pool(self):
+        """Test that the app engines use the instrumented, configured pools"""
+        from app.core.config import DB_MAX_OVERFLOW, DB_POOL_SIZE
+        from app.core.database import async_engine, engine
+
+        assert isinstance(engine.pool, InstrumentedQueuePool)
+        assert engine.pool.size() == DB_POOL_SIZE
+        assert engine.pool._max_overflow == DB_MAX_OVERFLOW
+        assert engine.pool._pre_ping is True
+        assert isinstance(async_engine.pool, InstrumentedAsyncAdaptedQueuePool)
+
+    def test_checkout_wait_is_recorded(self, tmp_path):
+        """Test that a checkout waiting on a full pool shows up in the metrics"""
+        test_engine = create_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}",
+            poolclass=InstrumentedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            connect_args={"check_same_thread": False},
+        )
+        metrics = PoolMetrics().attach(test_engine)
+
+        held = test_engine.connect()
+        assert metrics.metrics()["checked_out"] == 1
+
+        # Return the only connection while another thread waits for it
+        timer = threading.Timer(0.1, held.close)
+        timer.start()
+        with test_engine.connect():
+            pass
+        timer.join()
+
+        data = metrics.metrics()
+        assert data["connects"] == 1
+        assert data["checkouts"] == 2
+        assert data["checked_out"] == 0
+        assert data["wait_ms"]["max"] >= 90
+        assert sum(b["count"] for b in data["wait_ms"]["histogram"]) == 2
+        assert data["connection_age_seconds"]["open"] == 1
+        test_engine.dispose()
+
+    def test_db_pool_metrics_endpoint(self, internal_client):
+        """Test that pool metrics are served per engine on the internal routes"""
+        res = internal_client.get("/internal/metrics/db-pool")
+
+        assert res.status_code == 200
+        assert set(res.json()) == {"sync", "async"}
+        assert res.json()["sync"]["pool"] == "InstrumentedQueuePool"
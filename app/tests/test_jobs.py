@@ -0,0 +1,99 @@
+"""
+Test suite for scheduled job run tracking
+"""
+
+import logging
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.job_run import JobRun
+from app.services.jobs import percentile, track_job
+from app.tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def session_local(client):
+    """Record job runs in the clean test database"""
+    test_engine = create_engine(
+        TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+    with patch("app.services.jobs.SessionLocal", TestSessionLocal):
+        yield TestSessionLocal
+    test_engine.dispose()
+
+
+def get_runs(session_local):
+    """Load all recorded job runs"""
+    db = session_local()
+    try:
+        return db.query(JobRun).order_by(JobRun.id).all()
+    finally:
+        db.close()
+
+
+class TestJobTracking:
+    """Test suite for scheduled job run tracking"""
+
+    def test_successful_run_is_recorded(self, session_local):
+        """Test that a run's duration and affected rows are recorded"""
+
+        def cleanup():
+            return 42
+
+        assert track_job(cleanup)() == 42
+
+        runs = get_runs(session_local)
+        assert len(runs) == 1
+        assert runs[0].job_name == "cleanup"
+        assert runs[0].rows_affected == 42
+        assert runs[0].duration_ms >= 0
+        assert runs[0].error is None
+
+    def test_failed_run_is_recorded(self, session_local, caplog):
+        """Test that a failing job is recorded with its error and doesn't raise"""
+
+        def cleanup():
+            raise RuntimeError("boom")
+
+        assert track_job(cleanup, name="nightly_cleanup")() is None
+
+        runs = get_runs(session_local)
+        assert runs[0].job_name == "nightly_cleanup"
+        assert runs[0].error == "RuntimeError: boom"
+        assert "Job nightly_cleanup failed" in caplog.text
+
+    def test_slow_run_warns(self, session_local, caplog):
+        """Test that a run over the slow threshold logs a warning"""
+        with patch("app.services.jobs.JOB_SLOW_SECONDS", 0):
+            with caplog.at_level(logging.WARNING, logger="app.services.jobs"):
+                track_job(lambda: 0, name="slow_job")()
+
+        assert "Job slow_job took" in caplog.text
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = [float(v) for v in range(1, 101)]
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile([7.0], 95) == 7
+
+    def test_job_runs_endpoint(self, session_local, internal_client):
+        """Test the internal endpoint reports recent runs and percentiles"""
+        for rows in range(1, 5):
+            track_job(lambda: rows, name="cleanup")()
+        track_job(lambda: 1, name="reconcile")()
+
+        res = internal_client.get("/internal/jobs?limit=3")
+
+        assert res.status_code == 200
+        data = res.json()
+        assert len(data["recent_runs"]) == 3
+        assert [s["job_name"] for s in data["stats"]] == ["cleanup", "reconcile"]
+        assert data["stats"][0]["runs"] == 4
+        assert data["stats"][0]["failures"] == 0
+        assert data["stats"][0]["p95_ms"] >= data["stats"][0]["p50_ms"]
@@ -2,7 +2,7 @@
 
 import asyncio
 import importlib
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import app.main
 
@@ -11,15 +11,20 @@ def test_lifespan_context_manager():
     """Test the lifespan context manager directly"""
     from app.main import app, lifespan
 
-    with patch("app.main.start_scheduler") as mock_scheduler:
+    with patch("app.main.start_scheduler") as mock_scheduler, patch(
+        "app.main.stop_scheduler", new_callable=AsyncMock
+    ) as mock_stop, patch("app.main.catalog") as mock_catalog:
 
         async def run_lifespan():
             async with lifespan(app):
                 # Test that we're in the running state
                 assert mock_scheduler.called
+                mock_stop.assert_not_called()
 
         asyncio.run(run_lifespan())
         mock_scheduler.assert_called_once()
+        mock_catalog.refresh.assert_called_once()
+        mock_stop.assert_awaited_once_with(mock_scheduler.return_value)
 
 
 def test_cors_print_statement():
@@ -0,0 +1,245 @@
+"""
+Test suite for note write-behind buffering
+"""
+
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models.note import Note
+from app.services.note_buffer import NoteWriteBuffer, PendingNote
+from app.tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def buffer():
+    """Provide an empty buffer wired into the note routes"""
+    buffer = NoteWriteBuffer(batch_size=2)
+    with patch("app.routes.notes.NOTE_WRITE_BEHIND", True), patch(
+        "app.routes.notes.note_buffer", buffer
+    ), patch("app.routes.internal.note_buffer", buffer):
+        yield buffer
+
+
+@pytest.fixture
+def db(client):
+    """Provide a session on the test database"""
+    test_engine = create_engine(
+        TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    session = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        test_engine.dispose()
+
+
+class TestNoteWriteBuffer:
+    """Test suite for note write-behind buffering"""
+
+    def test_autosave_is_buffered_and_readable(self, client, buffer, db):
+        """Test that autosaves are acknowledged without writing the row"""
+        note = client.post("/notes/", json={"date": "2025-05-01", "entry": ""}).json()
+
+        res = client.patch(f"/notes/{note['id']}", json={"entry": "Draft 1"})
+        assert res.status_code == 200
+        assert res.json()["entry"] == "Draft 1"
+        assert res.json()["version"] == 2
+
+        # The row is untouched until the buffer is flushed
+        assert db.get(Note, note["id"]).entry == ""
+
+        # Reads see the buffered entry
+        data = client.get("/notes/?date=2025-05-01").json()
+        assert data["entry"] == "Draft 1"
+        assert data["version"] == 2
+
+    def test_autosave_touches_empty_note(self, client, buffer, db):
+        """Test that buffering an empty note marks it as recently written"""
+        note = client.post("/notes/", json={"date": "2025-05-01", "entry": ""}).json()
+        db.query(Note).filter(Note.id == note["id"]).update(
+            {"updated_at": datetime.utcnow() - timedelta(days=2)}
+        )
+        db.commit()
+
+        client.patch(f"/notes/{note['id']}", json={"entry": "Draft 1"})
+
+        # The cleanup job's age check now spares the note in every worker
+        db.expire_all()
+        row = db.get(Note, note["id"])
+        assert row.entry == ""
+        assert row.updated_at > datetime.utcnow() - timedelta(minutes=1)
+
+    def test_flush_coalesces_saves(self, client, buffer, db):
+        """Test that only the latest save of each note is written"""
+        ids = [
+            client.post("/notes/", json={"date": f"2025-05-0{d}"}).json()["id"]
+            for d in range(1, 4)
+        ]
+
+        for i in range(3):
+            for note_id in ids:
+                client.patch(f"/notes/{note_id}", json={"entry": f"Draft {i}"})
+
+        assert buffer.flush(db) == 3
+
+        rows = db.query(Note).filter(Note.id.in_(ids)).all()
+        assert {n.entry for n in rows} == {"Draft 2"}
+        assert {n.version for n in rows} == {4}
+
+        metrics = buffer.metrics()
+        assert metrics["pending_notes"] == 0
+        assert metrics["flushes"] == 1
+        assert metrics["last_flush_saves"] == 9
+        assert metrics["writes_total"] == 3
+
+    def test_autosave_unknown_note(self, client, buffer):
+        """Test that autosaves to a missing note are rejected"""
+        res = client.patch("/notes/9999", json={"entry": "Ghost update"})
+
+        assert res.status_code == 404
+        assert buffer.get(9999) is None
+
+    def test_edit_note_applies_to_buffered_entry(self, client, buffer):
+        """Test that incremental edits flush the pending autosave first"""
+        note_id = client.post("/notes/", json={"date": "2025-05-01"}).json()["id"]
+        version = client.patch(f"/notes/{note_id}", json={"entry": "Hello"}).json()[
+            "version"
+        ]
+
+        res = client.patch(
+            f"/notes/{note_id}/edits",
+            json={"version": version, "edits": [{"offset": 5, "insert": "!"}]},
+        )
+
+        assert res.status_code == 200
+        assert buffer.get(note_id) is None
+        assert client.get("/notes/?date=2025-05-01").json()["entry"] == "Hello!"
+
+    def test_flush_skips_notes_written_elsewhere(self, client, buffer, db, caplog):
+        """Test that a worker's flush doesn't overwrite another worker's write"""
+        note_id = client.post("/notes/", json={"date": "2025-05-01"}).json()["id"]
+        client.patch(f"/notes/{note_id}", json={"entry": "Worker 1"})
+
+        # Another worker buffered the same note from the same version and
+        # flushed first
+        other = NoteWriteBuffer()
+        stored = PendingNote(note_id, 1, date(2025, 5, 1), "", 1, base_version=1)
+        other.save(note_id, 1, "Worker 2", stored)
+        assert other.flush(db) == 1
+
+        with caplog.at_level(logging.WARNING, logger="app.services.note_buffer"):
+            assert buffer.flush(db) == 0
+
+        db.expire_all()
+        assert db.get(Note, note_id).entry == "Worker 2"
+        assert buffer.get(note_id) is None
+        assert buffer.metrics()["conflicts_total"] == 1
+        assert f"Dropped buffered entry of note {note_id}" in caplog.text
+
+    def test_saves_during_flush_are_kept(self, client, buffer, db):
+        """Test that an autosave made while its note is flushed isn't lost"""
+        note_id = client.post("/notes/", json={"date": "2025-05-01"}).json()["id"]
+        client.patch(f"/notes/{note_id}", json={"entry": "Draft 1"})
+
+        def save_then_commit():
+            client.patch(f"/notes/{note_id}", json={"entry": "Draft 2"})
+            Session.commit(db)
+
+        with patch.object(db, "commit", side_effect=save_then_commit):
+            assert buffer.flush(db) == 1
+
+        # The newer save is now based on the flushed version
+        assert buffer.get(note_id).entry == "Draft 2"
+        assert buffer.flush(db) == 1
+        db.expire_all()
+        assert db.get(Note, note_id).entry == "Draft 2"
+        assert db.get(Note, note_id).version == 3
+
+    def test_save_interleaved_with_flush_thread(self, client, buffer, db):
+        """Test that autosaves racing a scheduler flush are all written"""
+        note_id = client.post("/notes/", json={"date": "2025-05-01"}).json()["id"]
+        client.patch(f"/notes/{note_id}", json={"entry": "Draft 1"})
+        writing = threading.Event()
+        resume = threading.Event()
+
+        def paused_commit():
+            writing.set()
+            resume.wait(5)
+            Session.commit(db)
+
+        # The scheduler's flush pauses while writing Draft 1 ...
+        with patch.object(db, "commit", side_effect=paused_commit):
+            flusher = threading.Thread(target=buffer.flush, args=(db,))
+            flusher.start()
+            assert writing.wait(5)
+
+            # ... while the user keeps typing
+            client.patch(f"/notes/{note_id}", json={"entry": "Draft 2"})
+            resume.set()
+            flusher.join(5)
+
+        client.patch(f"/notes/{note_id}", json={"entry": "Draft 3"})
+        assert buffer.flush(db) == 1
+
+        db.expire_all()
+        assert db.get(Note, note_id).entry == "Draft 3"
+        assert db.get(Note, note_id).version == 4
+        assert buffer.metrics()["conflicts_total"] == 0
+
+    def test_flush_one_note_counts_its_saves(self, client, buffer, db):
+        """Test that flushing one note only counts that note's saves"""
+        ids = [
+            client.post("/notes/", json={"date": f"2025-05-0{d}"}).json()["id"]
+            for d in range(1, 3)
+        ]
+        for entry in ("a", "ab", "abc"):
+            client.patch(f"/notes/{ids[0]}", json={"entry": entry})
+        client.patch(f"/notes/{ids[1]}", json={"entry": "x"})
+
+        buffer.flush(db, ids[0])
+        assert buffer.metrics()["last_flush_saves"] == 3
+
+        buffer.flush(db)
+        assert buffer.metrics()["last_flush_saves"] == 1
+
+    def test_note_buffer_metrics_endpoint(self, internal_client, buffer):
+        """Test the internal metrics endpoint"""
+        client = internal_client
+        note_id = client.post("/notes/", json={"date": "2025-05-01"}).json()["id"]
+        client.patch(f"/notes/{note_id}", json={"entry": "Draft"})
+
+        res = client.get("/internal/metrics/note-buffer")
+
+        assert res.status_code == 200
+        assert res.json()["pending_notes"] == 1
+        assert res.json()["saves_total"] == 1
+
+    def test_internal_endpoint_requires_token(self, client):
+        """Test that internal endpoints check the internal token"""
+        with patch("app.deps.auth.INTERNAL_API_TOKEN", "secret"):
+            assert client.get("/internal/metrics/note-buffer").status_code == 403
+            res = client.get(
+                "/internal/metrics/note-buffer",
+                headers={"X-Internal-Token": "wrong"},
+            )
+            assert res.status_code == 403
+
+            res = client.get(
+                "/internal/metrics/note-buffer",
+                headers={"X-Internal-Token": "secret"},
+            )
+            assert res.status_code == 200
+
+    def test_internal_endpoint_closed_without_token(self, client):
+        """Test that internal endpoints are closed when no token is configured"""
+        with patch("app.deps.auth.INTERNAL_API_TOKEN", None), patch(
+            "app.core.config.ENV", "dev"
+        ):
+            assert client.get("/internal/metrics/note-buffer").status_code == 403
@@ -0,0 +1,194 @@
+"""
+Test suite for monthly partitioning of tasks
+Partitioning itself needs Postgres, so those tests only run when
+TEST_POSTGRES_URL is set.
+"""
+
+import importlib.util
+import re
+from datetime import date
+from pathlib import Path
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import Session
+
+from app.core.database import Base
+from app.core.slow_queries import Explain
+from app.models.task import Task
+from app.models.user import User
+from app.routes.tasks import COMPLETION, OTHER_DAY_TASKS, USER_TASKS_BETWEEN
+from app.services.partitions import (
+    add_months,
+    create_missing_partitions,
+    get_partitions,
+    is_partitioned,
+    month_start,
+    partition_name,
+)
+from app.tests.conftest import TEST_DATABASE_URL
+
+MIGRATION = (
+    Path(__file__).parents[2]
+    / "migrations"
+    / "versions"
+    / "c9e1a3b5d7f8_partition_tasks_by_month.py"
+)
+
+# Partitions named in a query plan
+PARTITION = re.compile(r"\btasks_(?:\d{4}_\d{2}|default)\b")
+
+
+def load_migration():
+    spec = importlib.util.spec_from_file_location("partition_tasks", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+def run_migration(conn, step):
+    """Run the migration's upgrade or downgrade on a connection"""
+    migration = load_migration()
+    with Operations.context(MigrationContext.configure(conn)):
+        getattr(migration, step)()
+
+
+@pytest.fixture(scope="module")
+def partitioned_postgres(postgres_engine):
+    """Partition a Postgres schema's tasks, with tasks across 2025"""
+    with postgres_engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        conn.execute(
+            insert(User), [{"id": 1, "firebase_uid": "uid", "email": "x@example.com"}]
+        )
+        conn.execute(
+            insert(Task),
+            [
+                {"user_id": 1, "date": date(2025, month, day), "title": "T", "order": n}
+                for month in range(1, 13)
+                for day in (1, 15, 28)
+                for n in (1, 2)
+            ],
+        )
+        run_migration(conn, "upgrade")
+    return postgres_engine
+
+
+def plan_partitions(engine, statement, params):
+    """Get the partitions a statement's plan reads"""
+    with engine.connect() as conn:
+        plan = "\n".join(
+            row[-1] for row in conn.execute(Explain(statement), params).all()
+        )
+    return set(PARTITION.findall(plan))
+
+
+class TestPartitionNames:
+    """Test suite for partition month helpers"""
+
+    def test_add_months(self):
+        """Test that months roll over into the next and previous years"""
+        assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+        assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+        assert add_months(date(2025, 1, 1), 0) == date(2025, 1, 1)
+
+    def test_month_start(self):
+        """Test that a day maps to the first of its month"""
+        assert month_start(date(2025, 2, 28)) == date(2025, 2, 1)
+
+    def test_partition_name(self):
+        """Test that partitions are named by table, year and month"""
+        assert partition_name("tasks", date(2026, 3, 1)) == "tasks_2026_03"
+
+    def test_sqlite_is_not_partitioned(self, client):
+        """Test that tables on SQLite are never reported as partitioned"""
+        engine = create_engine(TEST_DATABASE_URL)
+        try:
+            with Session(engine) as db:
+                assert not is_partitioned(db, "tasks")
+        finally:
+            engine.dispose()
+
+
+class TestTaskPartitions:
+    """Test suite for tasks partitioned by month on Postgres"""
+
+    def test_migration_partitions_tasks(self, partitioned_postgres):
+        """Test that tasks are partitioned by month with every row kept"""
+        with Session(partitioned_postgres) as db:
+            assert is_partitioned(db, "tasks")
+            partitions = get_partitions(db, "tasks")
+            assert {"tasks_2025_01", "tasks_2025_12", "tasks_default"} <= partitions
+            assert db.scalar(text("SELECT count(*) FROM tasks")) == 72
+            assert db.scalar(text("SELECT count(*) FROM tasks_2025_06")) == 6
+            assert db.scalar(text("SELECT count(*) FROM tasks_default")) == 0
+
+    def test_ids_continue_after_migration(self, partitioned_postgres):
+        """Test that new tasks take ids from the existing sequence"""
+        with Session(partitioned_postgres) as db:
+            task = Task(user_id=1, date=date(2025, 6, 2), title="New", order=3)
+            db.add(task)
+            db.flush()
+            assert task.id == 73
+            db.rollback()
+
+    @pytest.mark.parametrize(
+        "statement, params, partitions",
+        [
+            (
+                USER_TASKS_BETWEEN,
+                {"user_id": 1, "start": date(2025, 3, 3), "end": date(2025, 3, 9)},
+                {"tasks_2025_03"},
+            ),
+            (
+                OTHER_DAY_TASKS,
+                {"user_id": 1, "date": date(2025, 7, 15), "task_id": 1},
+                {"tasks_2025_07"},
+            ),
+            (
+                COMPLETION,
+                {"user_id": 1, "start": date(2025, 4, 28), "end": date(2025, 5, 4)},
+                {"tasks_2025_04", "tasks_2025_05"},
+            ),
+        ],
+    )
+    def test_route_statements_prune(
+        self, partitioned_postgres, statement, params, partitions
+    ):
+        """Test that date-filtered task statements only read their months"""
+        assert plan_partitions(partitioned_postgres, statement, params) == partitions
+
+    def test_create_missing_partitions_moves_default_rows(self, partitioned_postgres):
+        """Test that rows in the default partition move into a new partition"""
+        with Session(partitioned_postgres) as db:
+            db.add(Task(user_id=1, date=date(2030, 1, 5), title="Far", order=1))
+            db.commit()
+            assert db.scalar(text("SELECT count(*) FROM tasks_default")) == 1
+
+            created = create_missing_partitions(
+                db, "tasks", date(2029, 12, 1), date(2030, 1, 1)
+            )
+
+            assert created == ["tasks_2029_12", "tasks_2030_01"]
+            assert db.scalar(text("SELECT count(*) FROM tasks_default")) == 0
+            assert db.scalar(text("SELECT count(*) FROM tasks_2030_01")) == 1
+            assert (
+                create_missing_partitions(
+                    db, "tasks", date(2029, 12, 1), date(2030, 1, 1)
+                )
+                == []
+            )
+
+    def test_downgrade_restores_plain_table(
+        self, postgres_engine, partitioned_postgres
+    ):
+        """Test that the downgrade moves every task back to an unpartitioned table"""
+        with postgres_engine.begin() as conn:
+            count = conn.scalar(text("SELECT count(*) FROM tasks"))
+            run_migration(conn, "downgrade")
+
+        with Session(postgres_engine) as db:
+            assert not is_partitioned(db, "tasks")
+            assert db.scalar(text("SELECT count(*) FROM tasks")) == count
@@ -0,0 +1,336 @@
+"""
+Performance regression suite: statement budgets and index usage per endpoint,
+against a year of tasks, notes and backlogs for the user and their neighbours.
+Index usage is also checked on Postgres when TEST_POSTGRES_URL is set.
+"""
+
+import re
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+import app.core.query_stats as query_stats
+from app.core.database import Base
+from app.core.slow_queries import Explain
+from app.models.backlog import Backlog
+from app.models.note import Note
+from app.models.task import Task
+from app.models.user import User
+from app.routes.backlogs import OTHER_BACKLOGS, USER_BACKLOG, USER_BACKLOGS
+from app.routes.notes import USER_NOTE_BY_DATE, USER_NOTE_BY_ID
+from app.routes.tasks import (
+    COMPLETION,
+    OTHER_DAY_TASKS,
+    USER_TASK,
+    USER_TASKS,
+    USER_TASKS_BETWEEN,
+)
+from app.tests.conftest import TEST_DATABASE_URL
+
+START = date(2025, 1, 1)
+DAYS = 365
+TASKS_PER_DAY = 10
+BACKLOGS = 200
+# Neighbours make user filters selective, as in production
+OTHER_USERS = 20
+OTHER_TASKS_PER_DAY = 3
+OTHER_BACKLOGS_PER_USER = 50
+
+# A day in the middle of the seeded year, and one of its tasks
+DAY = START + timedelta(days=200)
+TASK_ID = 200 * TASKS_PER_DAY + 1
+BACKLOG_ID = 1
+NOTE_ID = 201
+
+# SQLite plan lines that read a whole table (or a whole index) instead of
+# seeking to the user's rows
+FULL_SCAN = re.compile(r"^SCAN (tasks|backlogs|notes|users)\b")
+# Postgres plan nodes that read a whole table
+SEQ_SCAN = re.compile(r"Seq Scan on (tasks|backlogs|notes|users)\b")
+
+
+def seed(conn):
+    """
+    Insert the user's year of tasks and notes, their backlogs, and
+    neighbours with tasks on the same days.
+    """
+    conn.execute(
+        insert(User),
+        [
+            {
+                "id": i,
+                # The first user is the one signed in through the test overrides
+                "firebase_uid": "test-firebase-uid" if i == 1 else f"uid-{i}",
+                "email": f"{i}@example.com",
+                "is_subscribed": True,
+            }
+            for i in range(1, OTHER_USERS + 2)
+        ],
+    )
+    conn.execute(
+        insert(Task),
+        [
+            {
+                "id": day * TASKS_PER_DAY + n,
+                "user_id": 1,
+                "date": START + timedelta(days=day),
+                "title": f"Task {n}",
+                "order": n,
+                "is_completed": n % 3 == 0,
+            }
+            for day in range(DAYS)
+            for n in range(1, TASKS_PER_DAY + 1)
+        ],
+    )
+    conn.execute(
+        insert(Task),
+        [
+            {
+                "user_id": user_id,
+                "date": START + timedelta(days=day),
+                "title": f"Task {n}",
+                "order": n,
+                "is_completed": False,
+            }
+            for user_id in range(2, OTHER_USERS + 2)
+            for day in range(DAYS)
+            for n in range(1, OTHER_TASKS_PER_DAY + 1)
+        ],
+    )
+    conn.execute(
+        insert(Backlog),
+        [
+            {"id": n, "user_id": 1, "date": START, "detail": f"Backlog {n}", "order": n}
+            for n in range(1, BACKLOGS + 1)
+        ],
+    )
+    conn.execute(
+        insert(Backlog),
+        [
+            {"user_id": user_id, "date": START, "detail": f"Backlog {n}", "order": n}
+            for user_id in range(2, OTHER_USERS + 2)
+            for n in range(1, OTHER_BACKLOGS_PER_USER + 1)
+        ],
+    )
+    conn.execute(
+        insert(Note),
+        [
+            {
+                "id": day + 1,
+                "user_id": 1,
+                "date": START + timedelta(days=day),
+                "entry": f"Note {day}",
+                "version": 1,
+            }
+            for day in range(DAYS)
+        ],
+    )
+
+
+@pytest.fixture(scope="module")
+def seeded_template():
+    """Seed an in-memory SQLite database once, to copy for each test"""
+    template_engine = create_engine("sqlite://")
+    Base.metadata.create_all(template_engine)
+    with template_engine.begin() as conn:
+        seed(conn)
+        conn.exec_driver_sql("ANALYZE")
+    yield template_engine
+    template_engine.dispose()
+
+
+@pytest.fixture
+def perf_client(client, seeded_template, monkeypatch):
+    """Provide a client on a copy of the seeded database, with X-DB-* headers"""
+    test_engine = create_engine(TEST_DATABASE_URL)
+    with seeded_template.connect() as src, test_engine.connect() as dst:
+        src.connection.dbapi_connection.backup(dst.connection.dbapi_connection)
+    test_engine.dispose()
+
+    monkeypatch.setattr(query_stats, "DB_STATS_HEADERS", True)
+    # Connect once, so dialect setup isn't counted against the first request
+    client.get("/users/get_current")
+    return client
+
+
+# Method, URL, body and the most statements each endpoint may run for the
+# seeded user. Auth is overridden in tests, so the user lookup isn't counted.
+# Reorders write one row per moved task or backlog, so their budgets follow
+# the seeded day and backlog sizes.
+ENDPOINTS = {
+    "get_tasks_week": (
+        "GET",
+        f"/tasks/?start={DAY}&end={DAY + timedelta(days=6)}",
+        None,
+        1,
+    ),
+    "get_tasks_all": ("GET", "/tasks/", None, 1),
+    "get_completion_month": (
+        "GET",
+        f"/tasks/completion/?start={DAY}&end={DAY + timedelta(days=30)}",
+        None,
+        1,
+    ),
+    "create_task": ("POST", "/tasks/", {"date": str(DAY), "title": "New"}, 2),
+    "update_task_title": ("PATCH", f"/tasks/{TASK_ID}", {"title": "New"}, 1),
+    "update_task_order": (
+        "PATCH",
+        f"/tasks/{TASK_ID}",
+        {"order": TASKS_PER_DAY},
+        2 + TASKS_PER_DAY,
+    ),
+    "complete_task": (
+        "PATCH",
+        f"/tasks/{TASK_ID}",
+        {"is_completed": True},
+        2 + TASKS_PER_DAY,
+    ),
+    "move_task_date": (
+        "PATCH",
+        f"/tasks/{TASK_ID}",
+        {"date": str(DAY + timedelta(days=1))},
+        3 + 2 * TASKS_PER_DAY,
+    ),
+    "delete_task": ("DELETE", f"/tasks/{TASK_ID}", None, 3 + TASKS_PER_DAY),
+    "get_backlogs": ("GET", "/backlogs/", None, 1),
+    "create_backlog": ("POST", "/backlogs/", {"detail": "New"}, 2),
+    "update_backlog_detail": (
+        "PATCH",
+        f"/backlogs/{BACKLOG_ID}",
+        {"detail": "New"},
+        1,
+    ),
+    "update_backlog_order": (
+        "PATCH",
+        f"/backlogs/{BACKLOG_ID}",
+        {"order": 10},
+        2 + 10,
+    ),
+    "delete_backlog": ("DELETE", f"/backlogs/{BACKLOG_ID}", None, 3 + BACKLOGS),
+    "get_note": ("GET", f"/notes/?date={DAY}", None, 1),
+    # A missing note is looked for again on the primary before it's created
+    "get_new_note": ("GET", f"/notes/?date={START - timedelta(days=1)}", None, 3),
+    "create_note": (
+        "POST",
+        "/notes/",
+        {"date": str(START - timedelta(days=1)), "entry": "New"},
+        2,
+    ),
+    "update_note": ("PATCH", f"/notes/{NOTE_ID}", {"entry": "New"}, 1),
+    "edit_note": (
+        "PATCH",
+        f"/notes/{NOTE_ID}/edits",
+        {"version": 1, "edits": [{"offset": 0, "delete": 4, "insert": "Day"}]},
+        2,
+    ),
+    "get_current_user": ("GET", "/users/get_current", None, 1),
+    "update_user": ("PATCH", "/users/1", {"name": "New"}, 1),
+}
+
+
+def call(client, endpoint):
+    method, url, body, _ = ENDPOINTS[endpoint]
+    res = client.request(method, url, json=body)
+    assert res.status_code == 200, res.text
+    return res
+
+
+class TestStatementBudgets:
+    """Test that endpoints stay within their statement budgets at volume"""
+
+    @pytest.mark.parametrize("endpoint", ENDPOINTS)
+    def test_statement_budget(self, perf_client, endpoint):
+        """Test that the endpoint runs no more statements than its budget"""
+        budget = ENDPOINTS[endpoint][3]
+
+        res = call(perf_client, endpoint)
+
+        statements = int(res.headers["X-DB-Statements"])
+        assert statements <= budget, f"{endpoint} ran {statements} statements"
+
+    @pytest.mark.parametrize("endpoint", ENDPOINTS)
+    def test_no_lazy_loads(self, perf_client, endpoint):
+        """Test that the endpoint loads no relationship per row"""
+        res = call(perf_client, endpoint)
+
+        assert res.headers["X-DB-Lazy-Loads"] == "0"
+
+
+class TestIndexUsage:
+    """Test that endpoints seek to the user's rows instead of scanning tables"""
+
+    @pytest.mark.parametrize("endpoint", ENDPOINTS)
+    def test_no_full_scans(self, perf_client, statements, endpoint):
+        """Test that none of the endpoint's statements scans a whole table"""
+        call(perf_client, endpoint)
+
+        test_engine = create_engine(TEST_DATABASE_URL)
+        try:
+            with test_engine.connect() as conn:
+                for statement in statements:
+                    if not statement.lstrip().startswith(
+                        ("SELECT", "UPDATE", "DELETE")
+                    ):
+                        continue
+                    plan = conn.exec_driver_sql(
+                        "EXPLAIN QUERY PLAN " + statement, tuple(statement.parameters)
+                    ).all()
+                    scans = [row[-1] for row in plan if FULL_SCAN.match(row[-1])]
+                    assert not scans, f"{endpoint} scans {scans}: {statement}"
+        finally:
+            test_engine.dispose()
+
+
+# The routes' prebuilt statements with parameters for the seeded user
+STATEMENTS = {
+    "user_tasks": (USER_TASKS, {"user_id": 1}),
+    "user_tasks_between": (
+        USER_TASKS_BETWEEN,
+        {"user_id": 1, "start": DAY, "end": DAY + timedelta(days=6)},
+    ),
+    "user_task": (USER_TASK, {"user_id": 1, "task_id": TASK_ID}),
+    "other_day_tasks": (
+        OTHER_DAY_TASKS,
+        {"user_id": 1, "date": DAY, "task_id": TASK_ID},
+    ),
+    "completion": (
+        COMPLETION,
+        {"user_id": 1, "start": DAY, "end": DAY + timedelta(days=30)},
+    ),
+    "user_backlogs": (USER_BACKLOGS, {"user_id": 1}),
+    "user_backlog": (USER_BACKLOG, {"user_id": 1, "backlog_id": BACKLOG_ID}),
+    "other_backlogs": (OTHER_BACKLOGS, {"user_id": 1, "backlog_id": BACKLOG_ID}),
+    "user_note_by_date": (USER_NOTE_BY_DATE, {"user_id": 1, "date": DAY}),
+    "user_note_by_id": (USER_NOTE_BY_ID, {"user_id": 1, "id": NOTE_ID}),
+}
+
+
+@pytest.fixture(scope="module")
+def seeded_postgres(postgres_engine):
+    """Seed the Postgres test schema, skipped without TEST_POSTGRES_URL"""
+    with postgres_engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        seed(conn)
+        conn.execute(text("ANALYZE"))
+    return postgres_engine
+
+
+class TestPostgresIndexUsage:
+    """Test that the routes' statements can use an index on Postgres"""
+
+    @pytest.mark.parametrize("name", STATEMENTS)
+    def test_index_scan(self, seeded_postgres, name):
+        """Test that the statement plans without a sequential scan"""
+        statement, params = STATEMENTS[name]
+
+        with seeded_postgres.connect() as conn:
+            # Small tables favour sequential scans; without them, the planner
+            # falls back to one only when no index fits the statement
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            plan = "\n".join(
+                row[-1] for row in conn.execute(Explain(statement), params).all()
+            )
+            conn.rollback()
+
+        assert not SEQ_SCAN.search(plan), plan
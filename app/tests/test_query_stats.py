@@ -0,0 +1,165 @@
+"""
+Test suite for per-request SQL statement stats
+"""
+
+from datetime import date
+
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import app.core.query_stats as query_stats
+from app.core.query_stats import (
+    LazyLoadDetected,
+    QueryBudgetExceeded,
+    QueryStatsMiddleware,
+    apply_route_stats,
+    collect_query_stats,
+    current_route,
+)
+from app.models.task import Task
+from app.models.user import User
+from app.routes.tasks import get_tasks
+from app.tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def strict(monkeypatch):
+    """Enforce statement budgets and forbid lazy loads"""
+    monkeypatch.setattr(query_stats, "DB_STRICT_MODE", True)
+
+
+@pytest.fixture
+def session_local(client):
+    """Provide sessions on the clean test database with a user's task"""
+    test_engine = create_engine(
+        TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    TestSessionLocal = sessionmaker(autoflush=False, bind=test_engine)
+    db = TestSessionLocal()
+    try:
+        db.add(User(id=1, firebase_uid="uid", email="test@example.com"))
+        db.add(Task(id=1, user_id=1, date=date(2025, 1, 2), title="Task", order=1))
+        db.commit()
+    finally:
+        db.close()
+
+    yield TestSessionLocal
+    test_engine.dispose()
+
+
+class TestQueryStats:
+    """Test suite for per-request SQL statement stats"""
+
+    def test_stats_headers(self, client, monkeypatch):
+        """Test that responses carry the request's statement count and DB time"""
+        monkeypatch.setattr(query_stats, "DB_STATS_HEADERS", True)
+        client.post("/tasks/", json={"date": "2025-01-02", "title": "Task"})
+
+        res = client.get("/tasks/")
+
+        assert res.headers["X-DB-Statements"] == "1"
+        assert float(res.headers["X-DB-Time-Ms"]) > 0
+        assert res.headers["X-DB-Lazy-Loads"] == "0"
+
+    def test_no_headers_when_disabled(self, client, monkeypatch):
+        """Test that stats headers are left out when disabled"""
+        monkeypatch.setattr(query_stats, "DB_STATS_HEADERS", False)
+
+        res = client.get("/tasks/")
+
+        assert "X-DB-Statements" not in res.headers
+
+    def test_routes_within_budget(self, client, strict):
+        """Test that budgeted routes run within their budgets in strict mode"""
+        task = client.post("/tasks/", json={"date": "2025-01-02", "title": "A"})
+        assert task.status_code == 200
+        assert client.get("/tasks/").status_code == 200
+        assert client.post("/backlogs/", json={"detail": "B"}).status_code == 200
+        assert client.get("/backlogs/").status_code == 200
+        assert client.get("/notes/", params={"date": "2025-01-02"}).status_code == 200
+
+    def test_route_over_budget_raises(self, client, strict, monkeypatch):
+        """Test that a route going over its budget fails in strict mode"""
+        monkeypatch.setattr(get_tasks, "statement_budget", 0)
+
+        with pytest.raises(QueryBudgetExceeded):
+            client.get("/tasks/")
+
+    def test_executemany_counts_each_row(self, session_local):
+        """Test that per-row updates count as one statement per row"""
+        db = session_local()
+        try:
+            db.add(Task(id=2, user_id=1, date=date(2025, 1, 2), title="B", order=2))
+            db.commit()
+
+            with collect_query_stats() as stats:
+                for task in db.query(Task).all():
+                    task.order += 1
+                db.commit()
+
+            assert stats.statements == 3
+        finally:
+            db.close()
+
+    def test_failed_statements_leave_no_timing_state(self, session_local):
+        """Test that statements raising keep no timing state on the connection"""
+        engine = session_local.kw["bind"]
+        with collect_query_stats() as stats, engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.exec_driver_sql("SELECT * FROM missing_table")
+                conn.rollback()
+            conn.exec_driver_sql("SELECT 1")
+
+            assert not conn.info.get("query_started")
+        assert stats.statements == 4
+        assert stats.db_time > 0
+
+    def test_lazy_load_is_counted(self, session_local):
+        """Test that lazy relationship loads are counted"""
+        db = session_local()
+        try:
+            with collect_query_stats() as stats:
+                task = db.get(Task, 1)
+                assert task.user.email == "test@example.com"
+
+            assert stats.lazy_loads == 1
+        finally:
+            db.close()
+
+    def test_lazy_load_raises_in_strict_mode(self, session_local):
+        """Test that lazy relationship loads fail in strict mode"""
+        db = session_local()
+        try:
+            with collect_query_stats(strict=True):
+                user = db.get(User, 1)
+                with pytest.raises(LazyLoadDetected):
+                    user.tasks
+        finally:
+            db.close()
+
+
+class TestRouteTemplate:
+    """Test suite for grouping requests by their route"""
+
+    def test_template_from_matched_route(self):
+        """Test that only the route's parameters are templated"""
+        router = APIRouter()
+        seen = {}
+
+        @router.get("/{task_id}")
+        def get_task(task_id: int):
+            seen["route"] = current_route()
+            return {}
+
+        app = FastAPI(dependencies=[Depends(apply_route_stats)])
+        app.add_middleware(QueryStatsMiddleware)
+        # A prefix segment equal to the parameter's value
+        app.include_router(router, prefix="/v1/1")
+
+        assert TestClient(app).get("/v1/1/1").status_code == 200
+        assert seen["route"] == "GET /v1/1/{task_id}"
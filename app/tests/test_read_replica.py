@@ -0,0 +1,255 @@
+"""
+Test suite for routing reads to a replica with read-your-writes protection
+"""
+
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, delete
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.core.database import (
+    Base,
+    RecentWriters,
+    get_async_db,
+    get_async_replica_db,
+    recent_writers,
+    to_async_url,
+)
+from app.deps.auth import get_async_subscribed_user, get_async_token, get_async_user
+from app.main import app
+from app.models.note import Note
+from app.models.task import Task
+from app.models.user import User
+from app.tests.conftest import TEST_DATABASE_URL
+
+AUTH = {"Authorization": "Bearer valid_token"}
+TEST_USER = {
+    "id": 1,
+    "firebase_uid": "test-firebase-uid",
+    "email": "test@example.com",
+    "is_subscribed": True,
+}
+
+
+def seed(url, *rows):
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        db.add_all(rows)
+        db.commit()
+    finally:
+        db.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def replica(client, tmp_path, monkeypatch):
+    """
+    Serve safe reads from a second SQLite file that replicates nothing,
+    so any read it serves is visibly stale. Auth runs for real.
+    """
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    seed(TEST_DATABASE_URL, User(**TEST_USER))
+    seed(replica_url, User(**TEST_USER))
+
+    replica_engine = create_async_engine(to_async_url(replica_url), poolclass=NullPool)
+    ReplicaSessionLocal = async_sessionmaker(replica_engine, expire_on_commit=False)
+
+    async def override_get_async_replica_db():
+        async with ReplicaSessionLocal() as db:
+            yield db
+
+    overrides = {
+        dep: app.dependency_overrides.pop(dep)
+        for dep in (get_async_token, get_async_user, get_async_subscribed_user)
+    }
+    app.dependency_overrides[get_async_replica_db] = override_get_async_replica_db
+    monkeypatch.setattr(recent_writers, "_until", {})
+    monkeypatch.setattr(recent_writers, "secret", "test-secret")
+    try:
+        with patch(
+            "app.deps.auth.firebase_auth.verify_id_token",
+            return_value={"uid": "test-firebase-uid"},
+        ):
+            yield replica_url
+    finally:
+        app.dependency_overrides.update(overrides)
+
+
+def get_titles(client):
+    res = client.get(
+        "/tasks/",
+        params={"start": "2025-01-01", "end": "2025-01-31"},
+        headers=AUTH,
+    )
+    assert res.status_code == 200
+    return [task["title"] for task in res.json()]
+
+
+class TestReadReplica:
+    """Test suite for replica reads"""
+
+    def test_reads_use_replica(self, client, replica):
+        """Test that safe reads are served by the replica"""
+        seed(
+            replica,
+            Task(user_id=1, date=date(2025, 1, 2), title="On replica", order=1),
+        )
+
+        assert get_titles(client) == ["On replica"]
+
+    def test_unpinned_reads_skip_primary(self, client, replica):
+        """Test that unpinned reads, user lookup included, never use the primary"""
+        primary_override = app.dependency_overrides[get_async_db]
+        used = []
+
+        async def tracking_get_async_db():
+            async for db in primary_override():
+                yield db
+                used.append(db.in_transaction())
+
+        app.dependency_overrides[get_async_db] = tracking_get_async_db
+        try:
+            assert get_titles(client) == []
+        finally:
+            app.dependency_overrides[get_async_db] = primary_override
+
+        assert used == [False]
+
+    def test_user_missing_on_replica_is_read_from_primary(self, client, replica):
+        """Test that a user not yet replicated is still found"""
+        engine = create_engine(replica)
+        with engine.begin() as conn:
+            conn.execute(delete(User))
+        engine.dispose()
+
+        assert get_titles(client) == []
+
+    def test_reads_stick_to_primary_after_write(self, client, replica):
+        """Test that a user sees their own write even before the replica has it"""
+        res = client.post(
+            "/tasks/",
+            json={"title": "New task", "date": "2025-01-02", "is_completed": False},
+            headers=AUTH,
+        )
+        assert res.status_code == 200
+
+        assert get_titles(client) == ["New task"]
+
+    def test_reads_return_to_replica_after_window(self, client, replica, monkeypatch):
+        """Test that reads go back to the replica once the window has passed"""
+        monkeypatch.setattr(recent_writers, "window", 0)
+        client.post(
+            "/tasks/",
+            json={"title": "New task", "date": "2025-01-02", "is_completed": False},
+            headers=AUTH,
+        )
+
+        assert get_titles(client) == []
+
+    def test_reads_stick_to_primary_across_workers(self, client, replica, monkeypatch):
+        """Test that a read served by another worker still sees the write"""
+        client.post(
+            "/tasks/",
+            json={"title": "New task", "date": "2025-01-02", "is_completed": False},
+            headers=AUTH,
+        )
+
+        # The next read lands on a worker that never saw the write
+        other_worker = RecentWriters(secret="test-secret")
+        monkeypatch.setattr("app.deps.auth.recent_writers", other_worker)
+        assert get_titles(client) == ["New task"]
+
+        # Without the pin cookie, that worker reads from the replica
+        client.cookies.clear()
+        assert get_titles(client) == []
+
+    @pytest.mark.parametrize("env, secure", [("dev", False), ("production", True)])
+    def test_pin_cookie_attributes(self, client, replica, monkeypatch, env, secure):
+        """Test that the pin cookie is strict same-site, and secure outside dev"""
+        monkeypatch.setattr("app.deps.auth.ENV", env)
+
+        res = client.post(
+            "/tasks/",
+            json={"title": "New task", "date": "2025-01-02", "is_completed": False},
+            headers=AUTH,
+        )
+
+        cookie = res.headers["set-cookie"].lower()
+        assert "samesite=strict" in cookie
+        assert ("secure" in cookie.split("; ")) is secure
+
+    def test_note_missing_on_replica_is_not_recreated(self, client, replica):
+        """Test that a note not yet replicated is read from the primary"""
+        seed(
+            TEST_DATABASE_URL, Note(id=7, user_id=1, date=date(2025, 1, 2), entry="Hi")
+        )
+
+        res = client.get("/notes/", params={"date": "2025-01-02"}, headers=AUTH)
+
+        assert res.status_code == 200
+        assert res.json()["id"] == 7
+        assert res.json()["entry"] == "Hi"
+
+
+class TestRecentWriters:
+    """Test suite for the read-your-writes window"""
+
+    def test_mark_pins_user(self):
+        """Test that only users who wrote within the window are pinned"""
+        writers = RecentWriters(window=60)
+        writers.mark("uid-1")
+
+        assert writers.is_pinned("uid-1")
+        assert not writers.is_pinned("uid-2")
+
+    def test_window_expires(self):
+        """Test that users are unpinned after the window"""
+        writers = RecentWriters(window=0)
+        writers.mark("uid-1")
+
+        assert not writers.is_pinned("uid-1")
+
+    def test_token_pins_user_in_other_process(self):
+        """Test that a pin token is honored by a tracker sharing the secret"""
+        token = RecentWriters(window=60, secret="secret").pin_token("uid-1")
+        other = RecentWriters(window=60, secret="secret")
+
+        assert other.is_pinned("uid-1", token)
+        assert not other.is_pinned("uid-2", token)
+        assert not RecentWriters(secret="other-secret").is_pinned("uid-1", token)
+
+    def test_token_pins_uid_with_dots(self):
+        """Test that UIDs containing the token separator still pin"""
+        writers = RecentWriters(window=60, secret="secret")
+        token = writers.pin_token("custom.uid")
+
+        assert writers.is_pinned("custom.uid", token)
+        assert not writers.is_pinned("custom", token)
+
+    def test_token_rejects_tampering_and_expiry(self):
+        """Test that edited or expired pin tokens don't pin"""
+        writers = RecentWriters(window=60, secret="secret")
+        token = writers.pin_token("uid-1")
+        payload, signature = token.rsplit(".", 1)
+        firebase_uid, until = payload.rsplit(".", 1)
+
+        extended = f"{firebase_uid}.{int(until) + 3600}.{signature}"
+        assert not writers.is_pinned("uid-1", extended)
+        assert not writers.is_pinned("uid-1", "garbage")
+        assert not writers.is_pinned("uid-1", "uid-1.2.\u00e9")
+
+        with patch("app.core.database.time.time", return_value=int(until) + 1):
+            assert not writers.is_pinned("uid-1", token)
+
+    def test_no_token_without_secret(self):
+        """Test that pins stay per process when no secret is set"""
+        writers = RecentWriters(window=60, secret=None)
+
+        assert writers.pin_token("uid-1") is None
+        assert not writers.is_pinned("uid-1", "uid-1.9999999999.0")
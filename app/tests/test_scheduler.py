@@ -2,118 +2,183 @@
 Test suite for scheduler functionality
 """
 
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
 from unittest.mock import Mock, patch
 
 import pytest
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
 
+from app.models.backlog import Backlog
 from app.models.note import Note
+from app.models.task import Task
+from app.models.scheduler_lease import SchedulerLease
 from app.models.user import User
-from app.scheduler import delete_empty_notes, start_scheduler
+from app.scheduler import (
+    JOBS,
+    compact_orders,
+    create_task_partitions,
+    delete_empty_notes,
+    ensure_leader,
+    flush_note_buffer,
+    leader_only,
+    reconcile_subscriptions,
+    renew_scheduler_lease,
+    run_job,
+    scheduler_lease,
+    start_scheduler,
+    stop_scheduler,
+)
+from app.services.leases import Lease, LeaseLost
+from app.tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def session_local(client):
+    """Point the scheduler at the clean test database"""
+    test_engine = create_engine(
+        TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+    with patch("app.scheduler.SessionLocal", TestSessionLocal), patch(
+        "app.services.jobs.SessionLocal", TestSessionLocal
+    ):
+        yield TestSessionLocal
+    test_engine.dispose()
+
+
+def seed_notes(session_local, entries, written=None):
+    """Insert one note per entry for the test user, last written a day ago"""
+    written = written or datetime.utcnow() - timedelta(days=1)
+    db = session_local()
+    try:
+        db.add(User(id=1, firebase_uid="test-firebase-uid", email="test@example.com"))
+        db.add_all(
+            Note(user_id=1, date=date(2025, 1, day), entry=entry, updated_at=written)
+            for day, entry in enumerate(entries, start=1)
+        )
+        db.commit()
+    finally:
+        db.close()
 
 
 class TestScheduler:
     """Test suite for background task scheduler"""
 
-    @patch("app.scheduler.SessionLocal")
-    def test_delete_empty_notes_success(self, mock_session_local):
+    def test_delete_empty_notes_success(self, session_local, caplog):
         """Test successful deletion of empty notes"""
-        # Mock database session and data
-        mock_db = Mock()
-        mock_session_local.return_value = mock_db
+        seed_notes(session_local, ["", "Dear diary", "", "", "Busy day", ""])
 
-        # Mock empty notes to be deleted
-        mock_empty_note1 = Mock()
-        mock_empty_note2 = Mock()
-        mock_empty_notes = [mock_empty_note1, mock_empty_note2]
+        with caplog.at_level(logging.INFO, logger="app.scheduler"):
+            deleted = delete_empty_notes()
 
-        mock_db.query.return_value.filter.return_value.all.return_value = (
-            mock_empty_notes
-        )
+            # Verify only empty notes were deleted
+            assert deleted == 4
+            db = session_local()
+            try:
+                remaining = [n.entry for n in db.query(Note).order_by(Note.id)]
+            finally:
+                db.close()
+            assert remaining == ["Dear diary", "Busy day"]
 
-        with patch("builtins.print") as mock_print:
-            delete_empty_notes()
+            # Verify success message was logged with count and duration
+            assert "Deleted 4 empty notes in" in caplog.text
 
-            # Verify empty notes were queried and deleted
-            mock_db.query.assert_called()
-            mock_db.delete.assert_any_call(mock_empty_note1)
-            mock_db.delete.assert_any_call(mock_empty_note2)
-            mock_db.commit.assert_called_once()
-            mock_db.close.assert_called_once()
-
-            # Verify success message was printed
-            mock_print.assert_called()
-            success_call = [
-                call for call in mock_print.call_args_list if "Deleted 2" in str(call)
-            ]
-            assert len(success_call) > 0
+    def test_delete_empty_notes_in_chunks(self, session_local):
+        """Test that empty notes are deleted and committed chunk by chunk"""
+        seed_notes(session_local, [""] * 7 + ["Keep me"])
+
+        with patch(
+            "sqlalchemy.orm.Session.commit", autospec=True, side_effect=Session.commit
+        ) as mock_commit:
+            deleted = delete_empty_notes(batch_size=3)
+
+        # Three chunks of at most 3 rows, each in its own transaction
+        assert deleted == 7
+        assert mock_commit.call_count == 3
+
+    def test_delete_empty_notes_skips_recent_notes(self, session_local):
+        """Test that empty notes written recently are kept"""
+        seed_notes(session_local, ["", ""])
+        db = session_local()
+        try:
+            db.query(Note).filter(Note.id == 2).update(
+                {"updated_at": datetime.utcnow()}
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        assert delete_empty_notes() == 1
+
+        db = session_local()
+        try:
+            assert [n.id for n in db.query(Note).all()] == [2]
+        finally:
+            db.close()
 
     @patch("app.scheduler.SessionLocal")
-    def test_delete_empty_notes_database_error(self, mock_session_local):
+    def test_delete_empty_notes_database_error(self, mock_session_local, caplog):
         """Test error handling when database operation fails"""
         # Mock database session that raises an exception
         mock_db = Mock()
         mock_session_local.return_value = mock_db
-        mock_db.query.side_effect = Exception("Database connection failed")
+        mock_db.execute.side_effect = Exception("Database connection failed")
 
-        # Capture print output to verify error handling
-        with patch("builtins.print") as mock_print:
+        # The error is raised for the job framework to record
+        with pytest.raises(Exception, match="Database connection failed"):
             delete_empty_notes()
 
-            # Verify error was handled gracefully
-            mock_db.rollback.assert_called_once()
-            mock_db.close.assert_called_once()
-            mock_print.assert_called()
-            # Check that error message was printed
-            error_call = [
-                call for call in mock_print.call_args_list if "Error" in str(call)
-            ]
-            assert len(error_call) > 0
+        # Verify the session was cleaned up and the error logged
+        mock_db.rollback.assert_called_once()
+        mock_db.close.assert_called_once()
+        assert "Error deleting empty notes" in caplog.text
 
-    @patch("app.scheduler.SessionLocal")
-    def test_delete_empty_notes_no_empty_notes(self, mock_session_local):
+    def test_delete_empty_notes_no_empty_notes(self, session_local, caplog):
         """Test function when there are no empty notes to delete"""
-        # Mock database session with no empty notes
-        mock_db = Mock()
-        mock_session_local.return_value = mock_db
+        seed_notes(session_local, ["Dear diary"])
 
-        # Mock empty list - no empty notes found
-        mock_db.query.return_value.filter.return_value.all.return_value = []
+        with caplog.at_level(logging.INFO, logger="app.scheduler"):
+            deleted = delete_empty_notes()
 
-        with patch("builtins.print") as mock_print:
-            delete_empty_notes()
+            # Verify nothing was deleted
+            assert deleted == 0
 
-            # Verify query was made
-            mock_db.query.assert_called()
-            # Verify no delete calls were made
-            mock_db.delete.assert_not_called()
-            mock_db.commit.assert_called_once()
-            mock_db.close.assert_called_once()
-
-            # Verify success message was printed
-            mock_print.assert_called()
-            success_call = [
-                call for call in mock_print.call_args_list if "Deleted 0" in str(call)
-            ]
-            assert len(success_call) > 0
+            # Verify success message was logged
+            assert "Deleted 0 empty notes" in caplog.text
 
-    @patch("app.scheduler.BackgroundScheduler")
+    @patch("app.scheduler.AsyncIOScheduler")
     def test_start_scheduler(self, mock_scheduler_class):
         """Test scheduler initialization and job scheduling"""
         mock_scheduler = Mock()
         mock_scheduler_class.return_value = mock_scheduler
 
         # Call the function
-        start_scheduler()
+        assert start_scheduler() == mock_scheduler
 
         # Verify scheduler was created and configured
         mock_scheduler_class.assert_called_once()
-        mock_scheduler.add_job.assert_called_once_with(
-            delete_empty_notes, "cron", hour=0, minute=0
-        )
+        assert mock_scheduler.add_job.call_count == 7
         mock_scheduler.start.assert_called_once()
 
-    @patch("app.scheduler.BackgroundScheduler")
+        # Every job goes through run_job
+        for call_args in mock_scheduler.add_job.call_args_list:
+            assert call_args[0][0] == run_job
+            assert call_args[1]["args"] == [call_args[1]["id"]]
+
+        # The lease is renewed on an interval starting right away
+        lease_call = mock_scheduler.add_job.call_args_list[0]
+        assert lease_call[1]["id"] == "renew_scheduler_lease"
+        assert JOBS["renew_scheduler_lease"] == renew_scheduler_lease
+        assert lease_call[0][1] == "interval"
+        assert lease_call[1]["next_run_time"] is not None
+
+    @patch("app.scheduler.AsyncIOScheduler")
     def test_start_scheduler_job_parameters(self, mock_scheduler_class):
         """Test that scheduler job is configured with correct parameters"""
         mock_scheduler = Mock()
@@ -122,8 +187,480 @@ class TestScheduler:
         start_scheduler()
 
         # Verify job was added with correct function and schedule
-        call_args = mock_scheduler.add_job.call_args
-        assert call_args[0][0] == delete_empty_notes  # Function
+        call_args = mock_scheduler.add_job.call_args_list[1]
+        assert call_args[1]["id"] == "delete_empty_notes"
+        assert inspect.unwrap(JOBS["delete_empty_notes"]) == delete_empty_notes
         assert call_args[0][1] == "cron"  # Trigger type
         assert call_args[1]["hour"] == 0  # Midnight hour
         assert call_args[1]["minute"] == 0  # Midnight minute
+
+        # Order compaction runs after the cleanup
+        call_args = mock_scheduler.add_job.call_args_list[2]
+        assert call_args[1]["id"] == "compact_orders"
+        assert inspect.unwrap(JOBS["compact_orders"]) == compact_orders
+        assert call_args[0][1] == "cron"
+        assert call_args[1]["hour"] == 0
+        assert call_args[1]["minute"] == 30
+
+        # Subscriptions are reconciled with Stripe afterwards
+        call_args = mock_scheduler.add_job.call_args_list[3]
+        assert call_args[1]["id"] == "reconcile_subscriptions"
+        assert inspect.unwrap(JOBS["reconcile_subscriptions"]) == (
+            reconcile_subscriptions
+        )
+        assert call_args[0][1] == "cron"
+        assert call_args[1]["hour"] == 1
+
+        # Upcoming tasks partitions are created last
+        call_args = mock_scheduler.add_job.call_args_list[4]
+        assert call_args[1]["id"] == "create_task_partitions"
+        assert inspect.unwrap(JOBS["create_task_partitions"]) == (
+            create_task_partitions
+        )
+        assert call_args[0][1] == "cron"
+        assert call_args[1]["hour"] == 1
+        assert call_args[1]["minute"] == 30
+
+    def test_create_task_partitions_skips_unpartitioned(self, session_local):
+        """Test that partition creation does nothing when tasks isn't partitioned"""
+        assert create_task_partitions() == 0
+
+    @patch("app.scheduler.RECONCILE_SUBSCRIPTIONS_PAGE_SIZE", 2)
+    def test_reconcile_subscriptions(self, session_local, stripe_stub, caplog):
+        """Test that drifted users are corrected from Stripe's subscription list"""
+        subscriptions = [
+            {"id": "sub_1", "object": "subscription", "status": "active"},
+            {"id": "sub_2", "object": "subscription", "status": "past_due"},
+            {"id": "sub_3", "object": "subscription", "status": "canceled"},
+            {
+                "id": "sub_4",
+                "object": "subscription",
+                "status": "active",
+                "cancel_at_period_end": True,
+            },
+            {"id": "sub_5", "object": "subscription", "status": "active"},
+        ]
+
+        def list_subscriptions(params):
+            start = 0
+            if "starting_after" in params:
+                ids = [s["id"] for s in subscriptions]
+                start = ids.index(params["starting_after"][0]) + 1
+            limit = int(params["limit"][0])
+            return {
+                "object": "list",
+                "url": "/v1/subscriptions",
+                "data": subscriptions[start : start + limit],
+                "has_more": start + limit < len(subscriptions),
+            }
+
+        stripe_stub.add("GET", "/v1/subscriptions", list_subscriptions)
+
+        db = session_local()
+        try:
+            users = [
+                ("sub_1", "active", True),  # In sync
+                ("sub_2", "active", True),  # Missed invoice.payment_failed
+                ("sub_3", "active", True),  # Missed customer.subscription.deleted
+                ("sub_4", "canceled", True),  # Cancels at period end, in sync
+            ]
+            db.add_all(
+                User(
+                    id=i,
+                    firebase_uid=f"uid-{i}",
+                    email=f"{i}@example.com",
+                    stripe_subscription_id=subscription_id,
+                    subscription_status=status,
+                    is_subscribed=is_subscribed,
+                )
+                for i, (subscription_id, status, is_subscribed) in enumerate(
+                    users, start=1
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        with caplog.at_level(logging.INFO):
+            assert reconcile_subscriptions(batch_size=3) == 2
+
+        # Every page was fetched
+        assert len(stripe_stub.requests) == 3
+        assert "Reconciled 5 subscriptions" in caplog.text
+
+        db = session_local()
+        try:
+            state = {
+                u.id: (u.stripe_subscription_id, u.subscription_status, u.is_subscribed)
+                for u in db.query(User).all()
+            }
+            assert state == {
+                1: ("sub_1", "active", True),
+                2: ("sub_2", "past_due", False),
+                3: (None, "deleted", False),
+                4: ("sub_4", "canceled", True),
+            }
+        finally:
+            db.close()
+
+    def test_compact_orders(self, session_local):
+        """Test that order gaps and duplicates are renumbered per group"""
+        db = session_local()
+        try:
+            for user_id in (1, 2):
+                db.add(
+                    User(
+                        id=user_id, firebase_uid=f"uid-{user_id}", email=f"{user_id}@x"
+                    )
+                )
+            day1, day2 = date(2025, 1, 1), date(2025, 1, 2)
+            db.add_all(
+                [
+                    # Gaps on day 1 for user 1
+                    Task(id=1, user_id=1, date=day1, title="a", order=2),
+                    Task(id=2, user_id=1, date=day1, title="b", order=5),
+                    # Already dense on day 2 for user 1
+                    Task(id=3, user_id=1, date=day2, title="c", order=1),
+                    Task(id=4, user_id=1, date=day2, title="d", order=2),
+                    # Duplicates for user 2, ties broken by id
+                    Task(id=5, user_id=2, date=day1, title="e", order=1),
+                    Task(id=6, user_id=2, date=day1, title="f", order=1),
+                    # Backlogs are ordered per user
+                    Backlog(id=1, user_id=1, date=day1, detail="x", order=3),
+                    Backlog(id=2, user_id=1, date=day2, detail="y", order=7),
+                ]
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        updated = compact_orders(user_batch_size=1)
+
+        # Only rows whose order was off are rewritten
+        assert updated == 5
+
+        db = session_local()
+        try:
+            orders = {t.id: t.order for t in db.query(Task)}
+            backlog_orders = {b.id: b.order for b in db.query(Backlog)}
+        finally:
+            db.close()
+        assert orders == {1: 1, 2: 2, 3: 1, 4: 2, 5: 1, 6: 2}
+        assert backlog_orders == {1: 1, 2: 2}
+
+    @patch("app.scheduler.NOTE_WRITE_BEHIND", True)
+    @patch("app.scheduler.AsyncIOScheduler")
+    def test_start_scheduler_with_note_write_behind(self, mock_scheduler_class):
+        """Test that the note buffer flush job is scheduled when enabled"""
+        mock_scheduler = Mock()
+        mock_scheduler_class.return_value = mock_scheduler
+
+        start_scheduler()
+
+        assert mock_scheduler.add_job.call_count == 8
+        call_args = mock_scheduler.add_job.call_args
+        assert call_args[1]["id"] == "flush_note_buffer"
+        assert JOBS["flush_note_buffer"] == flush_note_buffer
+        assert call_args[0][1] == "interval"
+        assert call_args[1]["max_instances"] == 1
+
+
+class TestJobRunner:
+    """Test suite for running jobs on the event loop"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_job_slots(self):
+        """Give each test its own semaphore"""
+        with patch("app.scheduler.job_slots", None):
+            yield
+
+    def test_run_job_on_demand(self):
+        """Test that a job can be run by id and its result awaited"""
+        job = Mock(return_value=7)
+
+        with patch.dict(JOBS, {"job": job}):
+            assert asyncio.run(run_job("job")) == 7
+
+        job.assert_called_once()
+
+    def test_run_job_does_not_block_event_loop(self):
+        """Test that blocking jobs run off the event loop thread"""
+        threads = []
+
+        def job():
+            threads.append(threading.get_ident())
+
+        with patch.dict(JOBS, {"job": job}):
+            asyncio.run(run_job("job"))
+
+        assert threads[0] != threading.get_ident()
+
+    @patch("app.scheduler.SCHEDULER_MAX_CONCURRENCY", 2)
+    def test_run_job_caps_concurrency(self):
+        """Test that no more than SCHEDULER_MAX_CONCURRENCY jobs run at once"""
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def job():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+
+        async def run_all():
+            await asyncio.gather(*(run_job("job") for _ in range(5)))
+
+        with patch.dict(JOBS, {"job": job}):
+            asyncio.run(run_all())
+
+        assert peak == 2
+
+    @pytest.mark.parametrize(
+        "job_id",
+        [
+            "renew_scheduler_lease",
+            "flush_note_buffer",
+            "sweep_stripe_events",
+            "refresh_stripe_catalog",
+        ],
+    )
+    @patch("app.scheduler.job_slots", None)
+    @patch("app.scheduler.SCHEDULER_MAX_CONCURRENCY", 1)
+    def test_interval_jobs_skip_job_slots(self, job_id):
+        """Test that interval jobs run while long jobs take every slot"""
+        release = threading.Event()
+        interval_job = Mock(return_value=None)
+
+        async def run():
+            task = asyncio.create_task(run_job("job"))
+            await asyncio.sleep(0.01)
+            await asyncio.wait_for(run_job(job_id), 1)
+            release.set()
+            await task
+
+        with patch.dict(JOBS, {"job": release.wait, job_id: interval_job}):
+            asyncio.run(run())
+
+        interval_job.assert_called_once()
+
+    @patch("app.scheduler.release_scheduler_lease")
+    @patch("app.scheduler.flush_note_buffer")
+    def test_stop_scheduler_waits_for_running_jobs(self, mock_flush, mock_release):
+        """Test that shutdown waits for in-flight jobs before cleaning up"""
+        finished = []
+
+        def job():
+            time.sleep(0.05)
+            finished.append(True)
+
+        async def run():
+            scheduler = Mock()
+            task = asyncio.create_task(run_job("job"))
+            await asyncio.sleep(0.01)
+            await stop_scheduler(scheduler)
+            scheduler.shutdown.assert_called_once_with(wait=False)
+            assert finished == [True]
+            await task
+
+        with patch.dict(JOBS, {"job": job}):
+            asyncio.run(run())
+
+        mock_flush.assert_called_once()
+        mock_release.assert_called_once()
+
+    @patch("app.scheduler.SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS", 0.01)
+    @patch("app.scheduler.release_scheduler_lease")
+    @patch("app.scheduler.flush_note_buffer")
+    def test_stop_scheduler_times_out(self, mock_flush, mock_release, caplog):
+        """Test that shutdown gives up on jobs that run too long"""
+        release = threading.Event()
+
+        async def run():
+            task = asyncio.create_task(run_job("job"))
+            await asyncio.sleep(0.01)
+            with caplog.at_level(logging.WARNING):
+                await stop_scheduler(Mock())
+            release.set()
+            await task
+
+        with patch.dict(JOBS, {"job": release.wait}):
+            asyncio.run(run())
+
+        assert "still running" in caplog.text
+        mock_release.assert_called_once()
+
+    def test_run_scheduled_job_against_database(self, session_local):
+        """Test running a shared job end to end through the runner"""
+        seed_notes(session_local, ["", "Keep me"])
+
+        with patch.object(scheduler_lease, "holder", "this-worker"), patch.object(
+            scheduler_lease, "is_held", False
+        ):
+            assert asyncio.run(run_job("delete_empty_notes")) == 1
+
+        db = session_local()
+        try:
+            assert [n.entry for n in db.query(Note).all()] == ["Keep me"]
+        finally:
+            db.close()
+
+
+class TestSchedulerLease:
+    """Test suite for scheduler leader election"""
+
+    def test_only_one_holder(self, session_local):
+        """Test that a held lease can't be taken by another worker"""
+        leader = Lease("scheduler", 60, holder="worker-1")
+        standby = Lease("scheduler", 60, holder="worker-2")
+        db = session_local()
+
+        try:
+            assert leader.acquire(db) is True
+            assert standby.acquire(db) is False
+
+            # The leader keeps renewing its own lease
+            assert leader.acquire(db) is True
+            assert standby.is_held is False
+        finally:
+            db.close()
+
+    def test_standby_renewal_does_not_fail(self, session_local):
+        """Test that a standby's renewal inserts nothing instead of erroring"""
+        leader = Lease("scheduler", 60, holder="worker-1")
+        standby = Lease("scheduler", 60, holder="worker-2")
+        db = session_local()
+
+        try:
+            leader.acquire(db)
+
+            with patch.object(db, "rollback", wraps=db.rollback) as rollback:
+                assert standby.acquire(db) is False
+                assert standby.acquire(db) is False
+
+            rollback.assert_not_called()
+            assert db.get(SchedulerLease, "scheduler").holder == "worker-1"
+        finally:
+            db.close()
+
+    def test_standby_takes_over_expired_lease(self, session_local):
+        """Test that a standby takes over once the leader stops renewing"""
+        leader = Lease("scheduler", 60, holder="worker-1")
+        standby = Lease("scheduler", 60, holder="worker-2")
+        db = session_local()
+
+        try:
+            leader.acquire(db)
+
+            # Simulate the leader dying: its lease runs out
+            db.query(SchedulerLease).update(
+                {"expires_at": datetime.utcnow() - timedelta(seconds=1)}
+            )
+            db.commit()
+
+            assert standby.acquire(db) is True
+            assert leader.acquire(db) is False
+            assert db.get(SchedulerLease, "scheduler").holder == "worker-2"
+        finally:
+            db.close()
+
+    def test_expiry_uses_database_clock(self, session_local):
+        """Test that the lease expiry is set from the database's clock"""
+        lease = Lease("scheduler", 60, holder="worker-1")
+        db = session_local()
+
+        try:
+            assert lease.acquire(db) is True
+
+            expires_at = db.get(SchedulerLease, "scheduler").expires_at
+            db_time = db.execute(text("SELECT datetime('now', '+60 seconds')"))
+            expected = datetime.fromisoformat(db_time.scalar())
+            assert abs(expires_at - expected) < timedelta(seconds=5)
+        finally:
+            db.close()
+
+    def test_holds_until_ttl_runs_out(self, session_local):
+        """Test that a holder stops counting on a lease it failed to renew"""
+        lease = Lease("scheduler", 60, holder="worker-1")
+        db = session_local()
+
+        try:
+            with patch("app.services.leases.time.monotonic", return_value=1000.0):
+                lease.acquire(db)
+
+            with patch("app.services.leases.time.monotonic", return_value=1059.0):
+                assert lease.holds() is True
+            with patch("app.services.leases.time.monotonic", return_value=1060.0):
+                assert lease.holds() is False
+        finally:
+            db.close()
+
+    def test_release_hands_over_immediately(self, session_local):
+        """Test that releasing the lease lets a standby take it right away"""
+        leader = Lease("scheduler", 60, holder="worker-1")
+        standby = Lease("scheduler", 60, holder="worker-2")
+        db = session_local()
+
+        try:
+            leader.acquire(db)
+            leader.release(db)
+
+            assert leader.is_held is False
+            assert standby.acquire(db) is True
+        finally:
+            db.close()
+
+    def test_leader_only_runs_job_on_leader(self, session_local):
+        """Test that shared jobs only run in the lease holder"""
+        job = Mock(__name__="job", return_value=3)
+        other = Lease("scheduler", 60, holder="other-worker")
+
+        with patch.object(scheduler_lease, "holder", "this-worker"), patch.object(
+            scheduler_lease, "is_held", False
+        ):
+            db = session_local()
+            try:
+                other.acquire(db)
+            finally:
+                db.close()
+
+            # Another worker holds the lease, so the job is skipped
+            assert leader_only(job)() is None
+            job.assert_not_called()
+
+            db = session_local()
+            try:
+                other.release(db)
+            finally:
+                db.close()
+
+            # Once released, this worker takes over and runs the job
+            assert leader_only(job)() == 3
+            job.assert_called_once()
+
+    def test_job_stops_when_lease_is_lost(self, session_local):
+        """Test that a shared job stops between batches once the lease is lost"""
+        batches = []
+
+        def job():
+            for batch in range(3):
+                ensure_leader()
+                batches.append(batch)
+                # Renewals fail while the job runs
+                scheduler_lease.is_held = False
+
+        with patch.object(scheduler_lease, "holder", "this-worker"), patch.object(
+            scheduler_lease, "is_held", False
+        ):
+            with pytest.raises(LeaseLost):
+                leader_only(job)()
+
+        assert batches == [0]
+
+    def test_ensure_leader_ignores_direct_runs(self):
+        """Test that jobs run outside leader_only don't check the lease"""
+        with patch.object(scheduler_lease, "is_held", False):
+            ensure_leader()
@@ -0,0 +1,208 @@
+"""
+Test suite for the slow query log
+"""
+
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import column, create_engine, select, table, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.database import to_async_url
+from app.core.slow_queries import (
+    explain_executor,
+    normalize_sql,
+    param_shape,
+    slow_query_log,
+)
+from app.models.task import Task
+from app.routes.tasks import USER_TASKS
+from app.tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def slow_log(monkeypatch):
+    """Log every statement, starting from an empty log"""
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 0)
+    slow_query_log.clear()
+    yield slow_query_log
+    slow_query_log.clear()
+
+
+@pytest.fixture
+def test_engine(client):
+    """Provide a sync engine on the clean test database"""
+    engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+    yield engine
+    engine.dispose()
+
+
+def wait_for_plans():
+    """Wait for queued plan captures to finish"""
+    explain_executor.submit(lambda: None).result()
+
+
+class TestSlowQueryLog:
+    """Test suite for the slow query log"""
+
+    def test_normalize_sql(self):
+        """Test that whitespace and IN lists are collapsed"""
+        sql = "SELECT id\nFROM tasks\nWHERE id IN (?, ?, ?)  AND user_id = ?"
+
+        assert normalize_sql(sql) == (
+            "SELECT id FROM tasks WHERE id IN (...) AND user_id = ?"
+        )
+        assert normalize_sql("WHERE id IN ($1, $2)") == "WHERE id IN (...)"
+
+    def test_param_shape(self):
+        """Test that parameters are described by type, without values"""
+        assert param_shape((1, "secret", date(2025, 1, 2)), False) == [
+            "int",
+            "str",
+            "date",
+        ]
+        assert param_shape({"user_id": 1}, False) == {"user_id": "int"}
+        assert param_shape([(1, "a"), (2, "b")], True) == {
+            "rows": 2,
+            "row": ["int", "str"],
+        }
+
+    def test_records_route_and_shape(self, internal_client, slow_log):
+        """Test that slow statements are served with the route that ran them"""
+        client = internal_client
+        client.post("/tasks/", json={"date": "2025-01-02", "title": "Secret title"})
+        slow_log.clear()
+
+        client.get("/tasks/")
+        res = client.get("/internal/slow-queries")
+
+        assert res.status_code == 200
+        assert res.json()["threshold_ms"] == 0
+        queries = res.json()["queries"]
+        assert len(queries) == 1
+        assert queries[0]["route"] == "GET /tasks/"
+        assert queries[0]["sql"].startswith("SELECT tasks.id")
+        assert queries[0]["params"] == ["int"]
+        assert queries[0]["plan"] is None
+        assert "Secret title" not in res.text
+
+    def test_route_templates_path_params(self, client, slow_log):
+        """Test that path parameters are templated in the recorded route"""
+        task = client.post("/tasks/", json={"date": "2025-01-02", "title": "Task"})
+        slow_log.clear()
+
+        client.patch(f"/tasks/{task.json()['id']}", json={"title": "New"})
+
+        routes = {q["route"] for q in slow_log.records()}
+        assert routes == {"PATCH /tasks/{task_id}"}
+
+    def test_fast_statements_not_recorded(self, internal_client, monkeypatch):
+        """Test that statements under the threshold are left out"""
+        client = internal_client
+        monkeypatch.setattr(slow_query_log, "threshold_ms", 60_000)
+        slow_query_log.clear()
+
+        client.get("/tasks/")
+
+        assert client.get("/internal/slow-queries").json()["queries"] == []
+
+    def test_ring_buffer_keeps_latest(self, test_engine, slow_log, monkeypatch):
+        """Test that the log keeps only the most recent statements"""
+        monkeypatch.setattr(slow_log, "_records", type(slow_log._records)(maxlen=2))
+
+        with test_engine.connect() as conn:
+            for n in range(3):
+                conn.exec_driver_sql(f"SELECT {n}")
+
+        assert [q["sql"] for q in slow_log.records()] == ["SELECT 2", "SELECT 1"]
+
+    def test_failed_statements_leave_no_timing_state(self, test_engine, slow_log):
+        """Test that statements raising keep no timing state on the connection"""
+        with test_engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.exec_driver_sql("SELECT * FROM missing_table")
+                conn.rollback()
+            conn.exec_driver_sql("SELECT 1")
+
+            assert not conn.info.get("slow_query_started")
+
+        assert [q["sql"] for q in slow_log.records()] == ["SELECT 1"]
+
+    def test_captures_plan(self, test_engine, slow_log, monkeypatch):
+        """Test that SELECT plans are captured without logging the EXPLAIN"""
+        monkeypatch.setattr(slow_log, "explain", True)
+
+        with test_engine.connect() as conn:
+            conn.execute(USER_TASKS, {"user_id": 1}).all()
+        wait_for_plans()
+
+        queries = slow_log.records()
+        assert len(queries) == 1
+        assert any("tasks" in line for line in queries[0]["plan"])
+
+    def test_plan_captured_once_per_interval(self, test_engine, slow_log, monkeypatch):
+        """Test that a repeated statement is only planned once"""
+        monkeypatch.setattr(slow_log, "explain", True)
+
+        with test_engine.connect() as conn:
+            for user_id in (1, 2):
+                conn.execute(USER_TASKS, {"user_id": user_id}).all()
+        wait_for_plans()
+
+        plans = [q["plan"] for q in slow_log.records()]
+        assert plans[0] is None
+        assert plans[1] is not None
+
+    def test_writes_not_planned(self, test_engine, slow_log, monkeypatch):
+        """Test that writes are recorded but never run again under EXPLAIN"""
+        monkeypatch.setattr(slow_log, "explain", True)
+
+        with test_engine.begin() as conn:
+            conn.execute(update(Task).where(Task.id == 1).values(title="x"))
+            conn.execute(select(Task.id).where(Task.id.in_([1, 2]))).all()
+        wait_for_plans()
+
+        select_query, update_query = slow_log.records()
+        assert update_query["sql"].startswith("UPDATE tasks")
+        assert update_query["plan"] is None
+        assert select_query["sql"].endswith("IN (...)")
+        assert select_query["plan"] is not None
+
+    def test_locking_selects_not_planned(self, test_engine, slow_log, monkeypatch):
+        """Test that SELECT ... FOR UPDATE is never run again under EXPLAIN"""
+        monkeypatch.setattr(slow_log, "explain", True)
+
+        with test_engine.begin() as conn:
+            conn.execute(select(Task.id).with_for_update(skip_locked=True)).all()
+        wait_for_plans()
+
+        assert slow_log.records()[0]["plan"] is None
+
+    def test_async_statements_planned_on_their_database(
+        self, tmp_path, slow_log, monkeypatch
+    ):
+        """Test that statements on another async engine, like the replica,
+        are planned on that database rather than the primary"""
+        monkeypatch.setattr(slow_log, "explain", True)
+        url = f"sqlite:///{tmp_path / 'replica.db'}"
+        with create_engine(url).begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE replica_only (id INTEGER)")
+
+        replica_only = table("replica_only", column("id"))
+
+        async def read_replica():
+            replica_engine = create_async_engine(to_async_url(url))
+            async with replica_engine.connect() as conn:
+                await conn.execute(
+                    select(replica_only.c.id).where(replica_only.c.id == 1)
+                )
+            await replica_engine.dispose()
+
+        asyncio.run(read_replica())
+        wait_for_plans()
+
+        plan = slow_log.records()[0]["plan"]
+        assert any("replica_only" in line for line in plan), plan
@@ -1,15 +1,26 @@
+import asyncio
 import json
+import logging
+import time
 from contextlib import contextmanager
+from datetime import datetime, timedelta
 from unittest.mock import ANY, Mock, patch
 
+import httpx
 import pytest
 import stripe
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.core.config import (
+    SUBSCRIPTION_REFRESH_RETRY_SECONDS,
+    SUBSCRIPTION_SNAPSHOT_TTL_SECONDS,
+)
 from app.core.database import Base
 from app.models.user import User
+from app.services.catalog import CatalogPrice
+from app.services.subscriptions import apply_subscription_snapshot
 
 # Set up test database
 TEST_DATABASE_URL = "sqlite:///file::memory:?cache=shared"
@@ -21,6 +32,32 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def seed_user(**fields):
+    """Insert the test user with the given subscription fields"""
+    db = TestingSessionLocal()
+    try:
+        db.add(
+            User(
+                id=1,
+                firebase_uid="test-firebase-uid",
+                email="test@example.com",
+                **fields,
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_user_row():
+    """Load the test user as stored"""
+    db = TestingSessionLocal()
+    try:
+        return db.get(User, 1)
+    finally:
+        db.close()
+
+
 class TestStripeRoutes:
     """Test suite for Stripe payment integration"""
 
@@ -34,10 +71,17 @@ class TestStripeRoutes:
             mock_user = Mock()
             # Set default attributes
             default_attrs = {
+                "id": 1,
                 "stripe_subscription_id": None,
                 "subscription_status": None,
                 "is_subscribed": False,
                 "stripe_customer_id": "cus_test123",
+                "subscription_period_end": None,
+                "cancel_at_period_end": None,
+                "plan_name": None,
+                "price_unit_amount": None,
+                "price_currency": None,
+                "subscription_synced_at": None,
             }
             default_attrs.update(mock_user_attrs)
 
@@ -102,8 +146,19 @@ class TestStripeRoutes:
             assert data["status"] == "none"
             assert data["period_end_date"] is None
 
-    def test_get_subscription_status_lifetime(self, client):
+    @patch("app.routes.stripe.catalog.lifetime_price")
+    def test_get_subscription_status_lifetime(self, mock_lifetime_price, client):
         """Test subscription status for user with lifetime subscription"""
+        mock_lifetime_price.return_value = CatalogPrice(
+            id="price_lifetime",
+            product_id="prod_lifetime",
+            product_name="Lifetime Access",
+            unit_amount=2999,
+            currency="usd",
+            recurring=False,
+            active=True,
+        )
+
         with self.override_get_user(
             {"stripe_subscription_id": None, "subscription_status": "lifetime"}
         ):
@@ -116,10 +171,9 @@ class TestStripeRoutes:
             assert data["price_amount"] == 29.99
 
     @patch("stripe.Subscription.retrieve")
-    def test_get_subscription_status_active(self, mock_retrieve, client):
-        """Test subscription status for user with active Stripe subscription"""
-        # Mock Stripe subscription response
-        mock_subscription = {
+    def test_get_subscription_status_without_snapshot(self, mock_retrieve, client):
+        """Test that a missing snapshot is filled in after the response"""
+        mock_retrieve.return_value = {
             "status": "active",
             "cancel_at_period_end": False,
             "items": {
@@ -135,26 +189,101 @@ class TestStripeRoutes:
                 ]
             },
         }
-        mock_retrieve.return_value = mock_subscription
+        seed_user(stripe_subscription_id="sub_123", subscription_status="active")
 
-        with self.override_get_user({"stripe_subscription_id": "sub_123"}):
+        with self.override_get_user(
+            {"stripe_subscription_id": "sub_123", "subscription_status": "active"}
+        ):
+            response = client.get("/api/stripe/subscription-status")
+
+        # The request doesn't wait for Stripe
+        assert response.status_code == 200
+        assert response.json()["status"] == "active"
+        assert response.json()["plan_name"] is None
+
+        mock_retrieve.assert_called_once_with("sub_123")
+        user = get_user_row()
+        assert user.plan_name == "Monthly Plan"
+        assert user.price_unit_amount == 999
+
+    @patch("stripe.Subscription.retrieve")
+    def test_get_subscription_status_from_snapshot(self, mock_retrieve, client):
+        """Test that a fresh snapshot is served without calling Stripe"""
+        snapshot = {
+            "stripe_subscription_id": "sub_123",
+            "subscription_status": "active",
+            "subscription_period_end": datetime(2022, 1, 1),
+            "cancel_at_period_end": False,
+            "plan_name": "Monthly Plan",
+            "price_unit_amount": 999,
+            "price_currency": "usd",
+            "subscription_synced_at": datetime.utcnow(),
+        }
+
+        with self.override_get_user(snapshot), patch(
+            "app.routes.stripe.refresh_subscription_snapshot"
+        ) as mock_refresh:
             response = client.get("/api/stripe/subscription-status")
             assert response.status_code == 200
-            data = response.json()
-            assert data["is_subscribed"] is True
-            assert data["status"] == "active"
-            assert data["plan_name"] == "Monthly Plan"
-            assert data["price_amount"] == 9.99
+            assert response.json() == {
+                "is_subscribed": True,
+                "status": "active",
+                "period_end_date": "Jan 01, 2022",
+                "cancel_at_period_end": False,
+                "plan_name": "Monthly Plan",
+                "price_amount": 9.99,
+                "price_currency": "USD",
+            }
+
+        mock_retrieve.assert_not_called()
+        mock_refresh.assert_not_called()
 
     @patch("stripe.Subscription.retrieve")
-    def test_get_subscription_status_stripe_error(self, mock_retrieve, client):
-        """Test subscription status when Stripe API fails"""
+    def test_get_subscription_status_stale_snapshot(self, mock_retrieve, client):
+        """Test that a stale snapshot is served and refreshed after the response"""
+        synced_at = datetime.utcnow() - timedelta(days=1)
+        snapshot = {
+            "stripe_subscription_id": "sub_123",
+            "subscription_status": "active",
+            "plan_name": "Monthly Plan",
+            "subscription_synced_at": synced_at,
+        }
+        seed_user(**snapshot)
+
+        with self.override_get_user(snapshot), patch(
+            "app.routes.stripe.refresh_subscription_snapshot"
+        ) as mock_refresh:
+            for _ in range(3):
+                response = client.get("/api/stripe/subscription-status")
+                assert response.status_code == 200
+                assert response.json()["plan_name"] == "Monthly Plan"
+
+        # A client polling the stale snapshot schedules a single refresh
+        mock_retrieve.assert_not_called()
+        mock_refresh.assert_called_once_with(ANY, 1)
+        assert get_user_row().subscription_synced_at > synced_at
+
+    @patch("stripe.Subscription.retrieve")
+    def test_get_subscription_status_stripe_error(self, mock_retrieve, client, caplog):
+        """Test that a failed refresh doesn't fail the request and is retried"""
         mock_retrieve.side_effect = stripe.StripeError("API Error")
+        seed_user(stripe_subscription_id="sub_123", subscription_status="active")
 
-        with self.override_get_user({"stripe_subscription_id": "sub_123"}):
+        with self.override_get_user(
+            {"stripe_subscription_id": "sub_123", "subscription_status": "active"}
+        ), caplog.at_level(logging.WARNING):
             response = client.get("/api/stripe/subscription-status")
-            assert response.status_code == 502
-            assert "API Error" in response.json()["detail"]
+
+        assert response.status_code == 200
+        assert "Failed to refresh subscription of user 1" in caplog.text
+
+        # The claim only holds off other refreshes for the retry interval
+        retry_at = get_user_row().subscription_synced_at + timedelta(
+            seconds=SUBSCRIPTION_SNAPSHOT_TTL_SECONDS
+        )
+        assert retry_at - datetime.utcnow() <= timedelta(
+            seconds=SUBSCRIPTION_REFRESH_RETRY_SECONDS
+        )
 
     @patch("stripe.Customer.create")
     @patch("stripe.checkout.Session.create")
@@ -299,6 +428,7 @@ class TestStripeRoutes:
     ):
         """Test webhook handling for completed subscription checkout"""
         mock_event = {
+            "id": "evt_1",
             "type": "checkout.session.completed",
             "data": {
                 "object": {
@@ -313,7 +443,7 @@ class TestStripeRoutes:
         # Mock request with proper headers
         response = seeded_client.post(
             "/api/stripe/webhook",
-            json={"test": "data"},
+            content=json.dumps(mock_event),
             headers={"stripe-signature": "test_sig"},
         )
 
@@ -326,6 +456,7 @@ class TestStripeRoutes:
     ):
         """Test webhook handling for completed one-time payment"""
         mock_event = {
+            "id": "evt_2",
             "type": "checkout.session.completed",
             "data": {"object": {"customer": "cus_123", "mode": "payment"}},
         }
@@ -333,7 +464,7 @@ class TestStripeRoutes:
 
         response = seeded_client.post(
             "/api/stripe/webhook",
-            json={"test": "data"},
+            content=json.dumps(mock_event),
             headers={"stripe-signature": "test_sig"},
         )
 
@@ -364,6 +495,7 @@ class TestStripeRoutes:
     ):
         """Test webhook handling for subscription updates"""
         mock_event = {
+            "id": "evt_3",
             "type": "customer.subscription.updated",
             "data": {
                 "object": {"id": "sub_123", "customer": "cus_123", "status": "active"}
@@ -373,7 +505,7 @@ class TestStripeRoutes:
 
         response = seeded_client.post(
             "/api/stripe/webhook",
-            json={"test": "data"},
+            content=json.dumps(mock_event),
             headers={"stripe-signature": "test_sig"},
         )
 
@@ -386,6 +518,7 @@ class TestStripeRoutes:
     ):
         """Test webhook handling for subscription deletion"""
         mock_event = {
+            "id": "evt_4",
             "type": "customer.subscription.deleted",
             "data": {"object": {"id": "sub_123", "customer": "cus_123"}},
         }
@@ -393,7 +526,7 @@ class TestStripeRoutes:
 
         response = seeded_client.post(
             "/api/stripe/webhook",
-            json={"test": "data"},
+            content=json.dumps(mock_event),
             headers={"stripe-signature": "test_sig"},
         )
 
@@ -404,6 +537,7 @@ class TestStripeRoutes:
     def test_stripe_webhook_payment_failed(self, mock_construct_event, seeded_client):
         """Test webhook handling for payment failures"""
         mock_event = {
+            "id": "evt_5",
             "type": "invoice.payment_failed",
             "data": {"object": {"customer": "cus_123"}},
         }
@@ -411,7 +545,7 @@ class TestStripeRoutes:
 
         response = seeded_client.post(
             "/api/stripe/webhook",
-            json={"test": "data"},
+            content=json.dumps(mock_event),
             headers={"stripe-signature": "test_sig"},
         )
 
@@ -436,6 +570,7 @@ class TestStripeRoutes:
     def test_stripe_webhook_invoice_paid(self, mock_construct_event, seeded_client):
         """Test webhook handling for invoice paid events"""
         mock_event = {
+            "id": "evt_6",
             "type": "invoice.paid",
             "data": {"object": {"customer": "cus_123"}},
         }
@@ -443,7 +578,7 @@ class TestStripeRoutes:
 
         response = seeded_client.post(
             "/api/stripe/webhook",
-            json={"test": "data"},
+            content=json.dumps(mock_event),
             headers={"stripe-signature": "test_sig"},
         )
 
@@ -456,6 +591,7 @@ class TestStripeRoutes:
     ):
         """Test webhook handling for unknown event types"""
         mock_event = {
+            "id": "evt_7",
             "type": "unknown.event.type",
             "data": {"object": {"customer": "cus_unknown"}},
         }
@@ -463,7 +599,7 @@ class TestStripeRoutes:
 
         response = seeded_client.post(
             "/api/stripe/webhook",
-            json={"test": "data"},
+            content=json.dumps(mock_event),
             headers={"stripe-signature": "test_sig"},
         )
 
@@ -511,6 +647,7 @@ class TestStripeRoutes:
         """Test webhook with unhandled event type and unknown customer ID"""
         # Mock Stripe webhook event with unhandled type
         mock_event = {
+            "id": "evt_8",
             "type": "some.unhandled.event",
             "data": {"object": {"customer": "cus_unknown123"}},
         }
@@ -519,10 +656,149 @@ class TestStripeRoutes:
         payload = json.dumps(mock_event)
         headers = {"stripe-signature": "test-signature"}
 
-        with patch("app.routes.stripe.logger") as mock_logger:
+        with patch("app.services.stripe_events.logger") as mock_logger:
             response = client.post("/api/stripe/webhook", data=payload, headers=headers)
 
             assert response.status_code == 200
             assert response.json() == {"received": True}
             # Verify warning was logged for unknown customer
             mock_logger.warning.assert_called()
+
+
+# Longest the event loop may stall while a route waits on Stripe
+LOOP_BLOCK_THRESHOLD = 0.1
+STRIPE_LATENCY = 0.3
+
+
+def slow_call(result):
+    """Stand in for a blocking Stripe call that takes STRIPE_LATENCY"""
+
+    def call(*args, **kwargs):
+        time.sleep(STRIPE_LATENCY)
+        return result
+
+    return call
+
+
+def max_loop_lag(send):
+    """Send a request on a fresh event loop and measure its longest stall"""
+    from app.main import app
+
+    async def run():
+        lag = 0
+        done = False
+
+        async def heartbeat():
+            nonlocal lag
+            while not done:
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lag = max(lag, time.perf_counter() - started - 0.01)
+
+        task = asyncio.create_task(heartbeat())
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            response = await send(client)
+        done = True
+        await task
+        return response, lag
+
+    return asyncio.run(run())
+
+
+class TestEventLoopBlocking:
+    """Regression tests for blocking calls in async Stripe routes"""
+
+    def test_create_checkout_session_does_not_block_loop(self, client):
+        """Test that Stripe round trips during checkout run off the event loop"""
+        with patch(
+            "stripe.Customer.create", side_effect=slow_call(Mock(id="cus_new"))
+        ), patch(
+            "stripe.checkout.Session.create",
+            side_effect=slow_call(Mock(url="https://checkout.stripe.com/test")),
+        ):
+            response, lag = max_loop_lag(
+                lambda c: c.post(
+                    "/api/stripe/create-checkout-session",
+                    json={
+                        "price_id": "price_123",
+                        "mode": "subscription",
+                        "success_url": "https://example.com/success",
+                        "cancel_url": "https://example.com/cancel",
+                    },
+                )
+            )
+
+        assert response.status_code == 200
+        assert lag < LOOP_BLOCK_THRESHOLD
+
+    def test_stripe_webhook_does_not_block_loop(self, client):
+        """Test that storing a webhook event runs off the event loop"""
+        event = {"id": "evt_slow", "type": "invoice.paid", "data": {"object": {}}}
+
+        with patch("stripe.Webhook.construct_event", return_value=event), patch(
+            "app.routes.stripe.store_stripe_event", side_effect=slow_call(False)
+        ):
+            response, lag = max_loop_lag(
+                lambda c: c.post(
+                    "/api/stripe/webhook",
+                    content=json.dumps(event),
+                    headers={"stripe-signature": "test_sig"},
+                )
+            )
+
+        assert response.status_code == 200
+        assert lag < LOOP_BLOCK_THRESHOLD
+
+
+class TestSubscriptionSnapshot:
+    """Test suite for applying Stripe subscriptions to the user's snapshot"""
+
+    def user(self, **attrs):
+        return User(
+            id=1,
+            stripe_subscription_id="sub_123",
+            subscription_status="active",
+            is_subscribed=True,
+            **attrs,
+        )
+
+    def test_snapshot_updates_access(self):
+        """Test that a refreshed status also updates is_subscribed"""
+        user = self.user()
+
+        apply_subscription_snapshot(user, {"id": "sub_123", "status": "past_due"})
+
+        assert user.subscription_status == "past_due"
+        assert user.is_subscribed is False
+
+        apply_subscription_snapshot(user, {"id": "sub_123", "status": "active"})
+
+        assert user.subscription_status == "active"
+        assert user.is_subscribed is True
+
+    def test_snapshot_keeps_local_cancel(self):
+        """Test that cancelling at period end stays shown as canceled"""
+        user = self.user()
+        user.subscription_status = "canceled"
+
+        apply_subscription_snapshot(
+            user,
+            {"id": "sub_123", "status": "active", "cancel_at_period_end": True},
+        )
+
+        assert user.subscription_status == "canceled"
+        assert user.is_subscribed is True
+        assert user.cancel_at_period_end is True
+
+    def test_snapshot_unlinks_ended_subscription(self):
+        """Test that an ended subscription is unlinked, as by the webhooks"""
+        user = self.user()
+
+        apply_subscription_snapshot(user, {"id": "sub_123", "status": "canceled"})
+
+        assert user.subscription_status == "deleted"
+        assert user.is_subscribed is False
+        assert user.stripe_subscription_id is None
@@ -0,0 +1,166 @@
+"""
+Test suite for the configured Stripe HTTP client, against a local stub server
+"""
+
+import time
+
+import pytest
+
+from app.deps.auth import get_user
+from app.main import app
+from app.models.user import User
+from app.services.stripe_client import stripe
+from app.tests.conftest import TestingSessionLocal, override_get_user
+
+CUSTOMER = {"id": "cus_123", "object": "customer", "email": "test@example.com"}
+
+
+class TestStripeClient:
+    """Test suite for the configured Stripe HTTP client"""
+
+    def test_connections_are_reused(self, stripe_stub):
+        """Test that consecutive calls reuse one keep-alive connection"""
+        stripe_stub.add("GET", "/v1/customers/cus_123", CUSTOMER)
+
+        for _ in range(3):
+            assert stripe.Customer.retrieve("cus_123").id == "cus_123"
+
+        assert len(stripe_stub.requests) == 3
+        assert len({r["client_port"] for r in stripe_stub.requests}) == 1
+
+    def test_read_timeout_fails_fast(self, stripe_stub):
+        """Test that a hung Stripe call gives up after the read timeout"""
+        stripe_stub.add("GET", "/v1/customers/cus_123", CUSTOMER)
+        stripe_stub.latency = 3
+        stripe.max_network_retries = 0
+
+        started = time.perf_counter()
+        with pytest.raises(stripe.APIConnectionError):
+            stripe.Customer.retrieve("cus_123")
+
+        assert time.perf_counter() - started < 2
+
+    def test_server_errors_are_retried(self, stripe_stub):
+        """Test that a failed call is retried with the same idempotency key"""
+        stripe_stub.add("POST", "/v1/customers", lambda params: CUSTOMER)
+        stripe_stub.fail_next(1)
+
+        customer = stripe.Customer.create(email="test@example.com")
+
+        assert customer.id == "cus_123"
+        assert len(stripe_stub.requests) == 2
+        keys = {r["headers"]["Idempotency-Key"] for r in stripe_stub.requests}
+        assert len(keys) == 1
+
+    def test_retries_are_bounded(self, stripe_stub):
+        """Test that persistent failures surface after max_network_retries"""
+        stripe_stub.add("GET", "/v1/customers/cus_123", CUSTOMER)
+        stripe_stub.fail_next(5)
+
+        with pytest.raises(stripe.APIError):
+            stripe.Customer.retrieve("cus_123")
+
+        # One attempt plus one retry
+        assert len(stripe_stub.requests) == 2
+
+    def test_checkout_route_against_stub(self, client, stripe_stub):
+        """Test the checkout route end to end against the stub"""
+        stripe_stub.add("POST", "/v1/customers", lambda params: CUSTOMER)
+        stripe_stub.add(
+            "POST",
+            "/v1/checkout/sessions",
+            lambda params: {
+                "id": "cs_123",
+                "object": "checkout.session",
+                "url": f"https://checkout.stripe.com/{params['customer'][0]}",
+            },
+        )
+
+        response = client.post(
+            "/api/stripe/create-checkout-session",
+            json={
+                "price_id": "price_123",
+                "mode": "subscription",
+                "success_url": "https://example.com/success",
+                "cancel_url": "https://example.com/cancel",
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json()["url"] == "https://checkout.stripe.com/cus_123"
+
+    def test_checkout_route_stripe_down(self, client, stripe_stub):
+        """Test that the checkout route returns 502 when Stripe keeps failing"""
+        stripe_stub.fail_next(5)
+
+        response = client.post(
+            "/api/stripe/create-checkout-session",
+            json={
+                "price_id": "price_123",
+                "mode": "subscription",
+                "success_url": "https://example.com/success",
+                "cancel_url": "https://example.com/cancel",
+            },
+        )
+
+        assert response.status_code == 502
+
+    def test_subscription_status_against_stub(self, client, stripe_stub):
+        """Test that a first status request snapshots the subscription from Stripe"""
+        stripe_stub.add(
+            "GET",
+            "/v1/subscriptions/sub_123",
+            {
+                "id": "sub_123",
+                "object": "subscription",
+                "status": "active",
+                "cancel_at_period_end": False,
+                "items": {
+                    "object": "list",
+                    "data": [
+                        {
+                            "object": "subscription_item",
+                            "current_period_end": 1640995200,
+                            "price": {
+                                "object": "price",
+                                "unit_amount": 999,
+                                "currency": "usd",
+                                "product": {"object": "product", "name": "Monthly"},
+                            },
+                        }
+                    ],
+                },
+            },
+        )
+
+        db = TestingSessionLocal()
+        try:
+            db.add(
+                User(
+                    id=1,
+                    firebase_uid="test-firebase-uid",
+                    email="test@example.com",
+                    stripe_subscription_id="sub_123",
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        app.dependency_overrides[get_user] = lambda: User(
+            id=1, stripe_subscription_id="sub_123"
+        )
+        try:
+            response = client.get("/api/stripe/subscription-status")
+        finally:
+            app.dependency_overrides[get_user] = override_get_user
+
+        # The snapshot is taken after the response
+        assert response.status_code == 200
+        db = TestingSessionLocal()
+        try:
+            user = db.get(User, 1)
+            assert user.plan_name == "Monthly"
+            assert user.price_unit_amount == 999
+        finally:
+            db.close()
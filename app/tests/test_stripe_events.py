@@ -0,0 +1,382 @@
+"""
+Test suite for the Stripe webhook inbox
+"""
+
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app.models.stripe_event import StripeEvent
+from app.models.user import User
+from app.scheduler import sweep_stripe_events
+from app.services.stripe_events import process_stripe_events, store_stripe_event
+from app.services.subscriptions import refresh_subscription_snapshot
+from app.tests.conftest import TEST_DATABASE_URL
+
+CHECKOUT_EVENT = {
+    "id": "evt_checkout",
+    "type": "checkout.session.completed",
+    "data": {
+        "object": {
+            "customer": "cus_123",
+            "subscription": "sub_123",
+            "mode": "subscription",
+        }
+    },
+}
+
+SUBSCRIPTION = {
+    "id": "sub_123",
+    "customer": "cus_123",
+    "status": "active",
+    "cancel_at_period_end": False,
+    "items": {
+        "data": [
+            {
+                "current_period_end": 1640995200,  # Jan 1, 2022
+                "price": {
+                    "unit_amount": 999,
+                    "currency": "usd",
+                    "product": {"name": "Monthly Plan"},
+                },
+            }
+        ]
+    },
+}
+
+
+@pytest.fixture
+def session_local(client):
+    """Provide sessions on the clean test database with a Stripe customer"""
+    test_engine = create_engine(
+        TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+    db = TestSessionLocal()
+    try:
+        db.add(
+            User(
+                id=1,
+                firebase_uid="test-firebase-uid",
+                email="test@example.com",
+                stripe_customer_id="cus_123",
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    yield TestSessionLocal
+    test_engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def mock_retrieve():
+    """Keep checkout events from calling Stripe for the new subscription"""
+    with patch("stripe.Subscription.retrieve", return_value=SUBSCRIPTION) as mock:
+        yield mock
+
+
+def post_event(client, event):
+    """Post a webhook with a verified signature"""
+    with patch("stripe.Webhook.construct_event", return_value=event):
+        return client.post(
+            "/api/stripe/webhook",
+            content=json.dumps(event),
+            headers={"stripe-signature": "test_sig"},
+        )
+
+
+class TestStripeEvents:
+    """Test suite for the Stripe webhook inbox"""
+
+    def test_webhook_stores_and_applies_event(self, client, session_local):
+        """Test that a verified event is stored and applied after the response"""
+        res = post_event(client, CHECKOUT_EVENT)
+        assert res.status_code == 200
+
+        db = session_local()
+        try:
+            event = db.get(StripeEvent, "evt_checkout")
+            assert event.type == "checkout.session.completed"
+            assert event.status == "processed"
+            assert event.attempts == 1
+
+            user = db.get(User, 1)
+            assert user.stripe_subscription_id == "sub_123"
+            assert user.subscription_status == "active"
+
+            # The new subscription is snapshotted off the request path
+            assert user.plan_name == "Monthly Plan"
+            assert user.price_unit_amount == 999
+            assert user.subscription_synced_at is not None
+        finally:
+            db.close()
+
+    @patch("stripe.Subscription.delete")
+    def test_replayed_event_is_applied_once(self, mock_delete, client, session_local):
+        """Test that Stripe retries of the same event are ignored"""
+        upgrade = {
+            "id": "evt_upgrade",
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "customer": "cus_123",
+                    "subscription": "sub_456",
+                    "mode": "subscription",
+                }
+            },
+        }
+        post_event(client, CHECKOUT_EVENT)
+        post_event(client, upgrade)
+
+        # A late retry of the first checkout must not undo the upgrade
+        res = post_event(client, CHECKOUT_EVENT)
+        assert res.status_code == 200
+
+        db = session_local()
+        try:
+            assert db.query(StripeEvent).count() == 2
+            assert db.get(User, 1).stripe_subscription_id == "sub_456"
+            mock_delete.assert_called_once_with("sub_123")
+        finally:
+            db.close()
+
+    def test_store_stripe_event_ignores_duplicates(self, session_local):
+        """Test the insert is a no-op for an event already in the inbox"""
+        db = session_local()
+        try:
+            payload = json.dumps(CHECKOUT_EVENT)
+            assert store_stripe_event(db, "evt_checkout", "t", payload) is True
+            assert store_stripe_event(db, "evt_checkout", "t", payload) is False
+        finally:
+            db.close()
+
+    @patch("app.services.stripe_events.STRIPE_EVENT_MAX_ATTEMPTS", 2)
+    def test_failed_event_is_retried_then_marked_failed(self, session_local):
+        """Test that failing events are retried up to the attempt limit"""
+        db = session_local()
+        try:
+            store_stripe_event(db, "evt_bad", "checkout.session.completed", "{}")
+            store_stripe_event(
+                db, "evt_checkout", CHECKOUT_EVENT["type"], json.dumps(CHECKOUT_EVENT)
+            )
+
+            # The bad event doesn't block the ones behind it
+            assert process_stripe_events(db) == 1
+            bad = db.get(StripeEvent, "evt_bad")
+            assert bad.status == "pending"
+            assert bad.attempts == 1
+            assert bad.error.startswith("KeyError")
+
+            assert process_stripe_events(db) == 0
+            db.refresh(bad)
+            assert bad.status == "failed"
+            assert bad.attempts == 2
+        finally:
+            db.close()
+
+    def test_stripe_called_outside_transactions(self, session_local, mock_retrieve):
+        """Test that no transaction or inbox lock is held while Stripe is called"""
+        db = session_local()
+        seen = {}
+
+        def retrieve(subscription_id, **kwargs):
+            seen["in_transaction"] = db.in_transaction()
+            # The claim is committed, so other workers skip the event
+            other = session_local()
+            try:
+                seen["status"] = other.get(StripeEvent, "evt_checkout").status
+            finally:
+                other.close()
+            return SUBSCRIPTION
+
+        mock_retrieve.side_effect = retrieve
+        try:
+            store_stripe_event(
+                db, "evt_checkout", CHECKOUT_EVENT["type"], json.dumps(CHECKOUT_EVENT)
+            )
+
+            assert process_stripe_events(db) == 1
+            assert seen == {"in_transaction": False, "status": "processing"}
+            event = db.get(StripeEvent, "evt_checkout")
+            assert event.status == "processed"
+            assert event.attempts == 1
+            assert db.get(User, 1).plan_name == "Monthly Plan"
+        finally:
+            db.close()
+
+    def test_claimed_event_is_not_reloaded(self, session_local, statements):
+        """Test that a claimed event is read once, by the claim itself"""
+        db = session_local()
+        try:
+            store_stripe_event(
+                db, "evt_checkout", CHECKOUT_EVENT["type"], json.dumps(CHECKOUT_EVENT)
+            )
+            statements.clear()
+
+            assert process_stripe_events(db) == 1
+
+            # One claim finding the event, and one finding the inbox empty
+            event_reads = [
+                statement
+                for statement in statements
+                if statement.startswith("SELECT") and "FROM stripe_events" in statement
+            ]
+            assert len(event_reads) == 2
+        finally:
+            db.close()
+
+    def test_timed_out_claims_are_retried(self, session_local):
+        """Test that events left processing by a dead worker are claimed again"""
+        db = session_local()
+        try:
+            for event_id, claimed_at in (
+                ("evt_stuck", datetime(2020, 1, 1)),
+                ("evt_running", datetime.utcnow()),
+            ):
+                store_stripe_event(
+                    db,
+                    event_id,
+                    CHECKOUT_EVENT["type"],
+                    json.dumps({**CHECKOUT_EVENT, "id": event_id}),
+                )
+                event = db.get(StripeEvent, event_id)
+                event.status = "processing"
+                event.attempts = 1
+                event.claimed_at = claimed_at
+            db.commit()
+
+            assert process_stripe_events(db) == 1
+            assert db.get(StripeEvent, "evt_stuck").status == "processed"
+            assert db.get(StripeEvent, "evt_stuck").attempts == 2
+            assert db.get(StripeEvent, "evt_running").status == "processing"
+        finally:
+            db.close()
+
+    def test_sweeper_applies_pending_events(self, session_local):
+        """Test that events left pending are applied by the scheduled sweep"""
+        db = session_local()
+        try:
+            store_stripe_event(
+                db, "evt_checkout", CHECKOUT_EVENT["type"], json.dumps(CHECKOUT_EVENT)
+            )
+        finally:
+            db.close()
+
+        with patch("app.scheduler.SessionLocal", session_local):
+            sweep_stripe_events()
+
+        db = session_local()
+        try:
+            assert db.get(StripeEvent, "evt_checkout").status == "processed"
+            assert db.get(User, 1).subscription_status == "active"
+        finally:
+            db.close()
+
+    def test_subscription_updated_event_updates_snapshot(self, client, session_local):
+        """Test that subscription webhooks keep the snapshot current"""
+        event = {
+            "id": "evt_updated",
+            "type": "customer.subscription.updated",
+            "data": {
+                "object": {
+                    **SUBSCRIPTION,
+                    "cancel_at_period_end": True,
+                    "items": {
+                        "data": [
+                            {
+                                "current_period_end": 1640995200,
+                                "price": {
+                                    "unit_amount": 2999,
+                                    "currency": "usd",
+                                    "product": "prod_123",
+                                },
+                            }
+                        ]
+                    },
+                }
+            },
+        }
+        post_event(client, event)
+
+        db = session_local()
+        try:
+            user = db.get(User, 1)
+            assert user.cancel_at_period_end is True
+            assert user.subscription_period_end == datetime(2022, 1, 1)
+            assert user.price_unit_amount == 2999
+            assert user.subscription_synced_at is not None
+        finally:
+            db.close()
+
+    def test_refresh_subscription_snapshot(self, session_local, mock_retrieve):
+        """Test the background refresh of a stale snapshot"""
+        db = session_local()
+        try:
+            db.get(User, 1).stripe_subscription_id = "sub_123"
+            db.commit()
+        finally:
+            db.close()
+
+        refresh_subscription_snapshot(session_local.kw["bind"], 1)
+
+        mock_retrieve.assert_called_once_with("sub_123")
+        db = session_local()
+        try:
+            user = db.get(User, 1)
+            assert user.plan_name == "Monthly Plan"
+            assert user.price_currency == "usd"
+        finally:
+            db.close()
+
+
+class TestStripeIdIndexes:
+    """Test suite for the user indexes used by webhook lookups"""
+
+    def test_customer_lookup_uses_index(self, session_local):
+        """Test that webhook lookups by customer don't scan users"""
+        db = session_local()
+        try:
+            for column, index in (
+                ("stripe_customer_id", "ix_users_stripe_customer_id"),
+                ("stripe_subscription_id", "ix_users_stripe_subscription_id"),
+            ):
+                plan = db.execute(
+                    text(f"EXPLAIN QUERY PLAN SELECT * FROM users WHERE {column} = :v"),
+                    {"v": "x"},
+                ).all()
+                assert index in " ".join(row[-1] for row in plan)
+        finally:
+            db.close()
+
+    def test_customer_id_is_unique_when_set(self, session_local):
+        """Test that a customer belongs to one user while users without one are allowed"""
+        db = session_local()
+        try:
+            db.add_all(
+                [
+                    User(id=2, firebase_uid="uid-2", email="2@example.com"),
+                    User(id=3, firebase_uid="uid-3", email="3@example.com"),
+                ]
+            )
+            db.commit()
+
+            db.add(
+                User(
+                    id=4,
+                    firebase_uid="uid-4",
+                    email="4@example.com",
+                    stripe_customer_id="cus_123",
+                )
+            )
+            with pytest.raises(IntegrityError):
+                db.commit()
+        finally:
+            db.rollback()
+            db.close()
@@ -1,7 +1,10 @@
 from datetime import date, timedelta
+from unittest.mock import patch
 
 import pytest
 
+from app.tests.conftest import statement_kinds
+
 
 def test_create_single_task(client):
     """
@@ -367,6 +370,17 @@ def test_patch_invalid_order(client):
     assert patch.json()["order"] == 1
 
 
+def test_update_task_date_to_null_fails(client):
+    """Tests that a task's date can't be cleared, since tasks are partitioned by it"""
+    res = client.post("/tasks/", json={"date": date.today().isoformat(), "title": "A"})
+    assert res.status_code == 200
+
+    patch = client.patch(f"/tasks/{res.json()['id']}", json={"date": None})
+
+    assert patch.status_code == 400
+    assert patch.json()["detail"] == "Date is required"
+
+
 def test_patch_task_with_empty_update_data(client):
     """Test patching a task with empty update data (exclude_unset=True coverage)"""
     today = date.today().isoformat()
@@ -511,3 +525,85 @@ def test_patch_task_not_found(client):
     patch_res = client.patch(f"/tasks/{non_existent_id}", json={"title": "New Title"})
     assert patch_res.status_code == 404
     assert "Task not found" in patch_res.json()["detail"]
+
+
+@patch("app.routes.tasks.ORDER_COMPACTION", "deferred")
+def test_deferred_delete_leaves_dense_display_order(client):
+    """
+    Tests that a deferred delete only removes the row and reads stay dense.
+    """
+    today = date.today().isoformat()
+    ids = []
+    for title in ["A", "B", "C", "D"]:
+        res = client.post("/tasks/", json={"date": today, "title": title, "note": ""})
+        ids.append(res.json()["id"])
+
+    # Delete task C (order 2), leaving a gap in the stored orders
+    res = client.delete(f"/tasks/{ids[2]}")
+    assert res.status_code == 200
+
+    res = client.get(f"/tasks/?start={today}&end={today}")
+    assert [t["title"] for t in res.json()] == ["D", "B", "A"]
+    assert [t["order"] for t in res.json()] == [1, 2, 3]
+
+    # Moving a task down still lands on the requested display position
+    client.patch(f"/tasks/{ids[3]}", json={"order": 3})
+    res = client.get(f"/tasks/?start={today}&end={today}")
+    assert [t["title"] for t in res.json()] == ["B", "A", "D"]
+
+    # Completing a task still moves it to the end
+    client.patch(f"/tasks/{ids[1]}", json={"is_completed": True})
+    res = client.get(f"/tasks/?start={today}&end={today}")
+    assert [t["title"] for t in res.json()] == ["A", "D", "B"]
+
+
+@patch("app.routes.tasks.ORDER_COMPACTION", "deferred")
+def test_deferred_delete_nonexistent_task(client):
+    """
+    Tests that a deferred delete of a missing task returns 404.
+    """
+    res = client.delete("/tasks/99999")
+    assert res.status_code == 404
+    assert res.json()["detail"] == "Task not found"
+
+
+def test_create_task_statement_count(client, statements):
+    """
+    Tests that creating a task shifts the day and inserts without reading back.
+    """
+    statements.clear()
+    res = client.post("/tasks/", json={"date": "2025-01-02", "title": "Task"})
+
+    assert res.status_code == 200
+    assert res.json()["order"] == 1
+    assert statement_kinds(statements) == ["UPDATE", "INSERT"]
+
+
+def test_update_task_text_statement_count(client, statements):
+    """
+    Tests that a title update is written and returned in one UPDATE ... RETURNING.
+    """
+    task = client.post("/tasks/", json={"date": "2025-01-02", "title": "Old"}).json()
+
+    statements.clear()
+    res = client.patch(f"/tasks/{task['id']}", json={"title": "New"})
+
+    assert res.status_code == 200
+    assert res.json()["title"] == "New"
+    assert res.json()["order"] == 1
+    assert statement_kinds(statements) == ["UPDATE"]
+    assert "RETURNING" in statements[0]
+
+
+def test_update_task_order_does_not_read_back(client, statements):
+    """
+    Tests that a reorder returns the task from memory after writing the orders.
+    """
+    first = client.post("/tasks/", json={"date": "2025-01-02", "title": "A"}).json()
+    client.post("/tasks/", json={"date": "2025-01-02", "title": "B"})
+
+    statements.clear()
+    res = client.patch(f"/tasks/{first['id']}", json={"order": 1})
+
+    assert res.json()["order"] == 1
+    assert statement_kinds(statements) == ["SELECT", "SELECT", "UPDATE"]
@@ -8,6 +8,7 @@ import pytest
 from fastapi import HTTPException
 
 from app.models.user import User
+from app.tests.conftest import statement_kinds
 
 
 class TestUserRoutes:
@@ -90,6 +91,15 @@ class TestUserRoutes:
         assert response.status_code == 200
         assert response.json()["name"] == "Updated Name"
 
+    def test_patch_user_statement_count(self, seeded_client, statements):
+        """Test that a user update is written and returned in one UPDATE ... RETURNING"""
+        statements.clear()
+        response = seeded_client.patch("/users/1", json={"name": "Updated Name"})
+
+        assert response.json()["email"] == "test@example.com"
+        assert statement_kinds(statements) == ["UPDATE"]
+        assert "RETURNING" in statements[0]
+
     def test_patch_user_not_found(self, client):
         """Test updating a user that doesn't exist"""
         response = client.patch(
@@ -6,7 +6,16 @@ from dotenv import load_dotenv
 from sqlalchemy import engine_from_config, pool
 
 from app.core.database import Base
-from app.models import backlog, note, task, user
+from app.models import (
+    backlog,
+    catalog_version,
+    job_run,
+    note,
+    scheduler_lease,
+    stripe_event,
+    task,
+    user,
+)
 
 load_dotenv()
 
@@ -0,0 +1,74 @@
+"""Add Stripe ID indexes to users
+
+Revision ID: a7c9e1f3b5d6
+Revises: f6b8d0e2a4c5
+Create Date: 2026-10-19 16:03:27.905512
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c9e1f3b5d6"
+down_revision: Union[str, None] = "f6b8d0e2a4c5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A failed unique build leaves an invalid index behind, so check first
+    duplicates = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT stripe_customer_id FROM users "
+                "WHERE stripe_customer_id IS NOT NULL "
+                "GROUP BY stripe_customer_id HAVING COUNT(*) > 1"
+            )
+        )
+        .scalars()
+        .all()
+    )
+    if duplicates:
+        raise RuntimeError(
+            f"Users share Stripe customer IDs, merge them first: {duplicates[:10]}"
+        )
+
+    # Build without locking users against writes; CONCURRENTLY can't run
+    # inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_stripe_customer_id",
+            "users",
+            ["stripe_customer_id"],
+            unique=True,
+            postgresql_where=sa.text("stripe_customer_id IS NOT NULL"),
+            sqlite_where=sa.text("stripe_customer_id IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_users_stripe_subscription_id",
+            "users",
+            ["stripe_subscription_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_users_stripe_subscription_id",
+            table_name="users",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_users_stripe_customer_id",
+            table_name="users",
+            postgresql_concurrently=True,
+        )
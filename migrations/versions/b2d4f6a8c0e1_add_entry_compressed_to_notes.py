@@ -0,0 +1,40 @@
+"""Add entry_compressed to notes
+
+Revision ID: b2d4f6a8c0e1
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-19 10:03:52.118604
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b2d4f6a8c0e1"
+down_revision: Union[str, None] = "a1c3e5f7b9d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the compressed entry column."""
+    # Existing entries are converted separately, whenever compression is
+    # turned on: python -m app.scripts.convert_note_entries
+    op.add_column(
+        "notes", sa.Column("entry_compressed", sa.LargeBinary(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    """Drop the compressed entry column, if no entry is stored in it."""
+    compressed = op.get_bind().execute(
+        sa.text("SELECT 1 FROM notes WHERE entry_compressed IS NOT NULL LIMIT 1")
+    )
+    if compressed.first():
+        raise RuntimeError(
+            "Notes are stored compressed; decompress them first with "
+            "NOTE_COMPRESSION=false python -m app.scripts.convert_note_entries"
+        )
+    op.drop_column("notes", "entry_compressed")
@@ -0,0 +1,59 @@
+"""Add user indexes to tasks, backlogs and notes
+
+Revision ID: b8d0f2a4c6e7
+Revises: a7c9e1f3b5d6
+Create Date: 2026-10-19 18:12:44.301927
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b8d0f2a4c6e7"
+down_revision: Union[str, None] = "a7c9e1f3b5d6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build without locking the tables against writes; CONCURRENTLY can't run
+    # inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_tasks_user_id_date",
+            "tasks",
+            ["user_id", "date"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_backlogs_user_id",
+            "backlogs",
+            ["user_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_notes_user_id_date",
+            "notes",
+            ["user_id", "date"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_notes_user_id_date", table_name="notes", postgresql_concurrently=True
+        )
+        op.drop_index(
+            "ix_backlogs_user_id", table_name="backlogs", postgresql_concurrently=True
+        )
+        op.drop_index(
+            "ix_tasks_user_id_date", table_name="tasks", postgresql_concurrently=True
+        )
@@ -0,0 +1,129 @@
+"""Partition tasks by month
+
+Revision ID: c9e1a3b5d7f8
+Revises: b8d0f2a4c6e7
+Create Date: 2026-10-19 20:41:08.517364
+
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c9e1a3b5d7f8"
+down_revision: Union[str, None] = "b8d0f2a4c6e7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months of partitions created ahead of the current month; the
+# create_task_partitions job keeps extending them
+MONTHS_AHEAD = 3
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_tasks_table(name: str, id_sequence: str, partitioned: bool):
+    """
+    Create the tasks table, partitioned by date range or not. Partitioned
+    tables need the partition key in the primary key.
+    """
+    op.create_table(
+        name,
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text(f"nextval('{id_sequence}'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("date", sa.Date(), nullable=not partitioned),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("note", sa.String(), nullable=True),
+        sa.Column("is_completed", sa.Boolean(), nullable=True),
+        sa.Column("order", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint(*(("id", "date") if partitioned else ("id",))),
+        **({"postgresql_partition_by": "RANGE (date)"} if partitioned else {}),
+    )
+    op.create_index("ix_tasks_id", name, ["id"], unique=False)
+    op.create_index("ix_tasks_user_id_date", name, ["user_id", "date"], unique=False)
+
+
+def swap_tasks_table(partitioned: bool):
+    """
+    Move tasks into a new table with the same columns, indexes and ids.
+    Copies every row in the migration's transaction, with tasks locked.
+    """
+    bind = op.get_bind()
+    old = "tasks_unpartitioned" if partitioned else "tasks_partitioned"
+
+    op.rename_table("tasks", old)
+    # Index names are shared by the schema, so free them for the new table
+    op.execute(f"ALTER INDEX ix_tasks_id RENAME TO ix_{old}_id")
+    op.execute(f"ALTER INDEX ix_tasks_user_id_date RENAME TO ix_{old}_user_id_date")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT tasks_pkey TO {old}_pkey")
+    id_sequence = bind.execute(
+        sa.text(f"SELECT pg_get_serial_sequence('{old}', 'id')")
+    ).scalar()
+
+    create_tasks_table("tasks", id_sequence, partitioned)
+
+    if partitioned:
+        # Monthly partitions for every month with tasks and the months ahead;
+        # other dates go to the default partition
+        this_month = date.today().replace(day=1)
+        months = set(
+            bind.execute(
+                sa.text(f"SELECT DISTINCT date_trunc('month', date)::date FROM {old}")
+            ).scalars()
+        )
+        months.update(add_months(this_month, n) for n in range(MONTHS_AHEAD + 1))
+        for month in sorted(months):
+            op.execute(
+                f"CREATE TABLE tasks_{month.year:04d}_{month.month:02d} "
+                f"PARTITION OF tasks FOR VALUES FROM ('{month}') "
+                f"TO ('{add_months(month, 1)}')"
+            )
+        op.execute("CREATE TABLE tasks_default PARTITION OF tasks DEFAULT")
+
+    columns = 'id, user_id, date, title, note, is_completed, "order"'
+    op.execute(f"INSERT INTO tasks ({columns}) SELECT {columns} FROM {old}")
+    # Keep the id sequence when the old table is dropped
+    op.execute(f"ALTER SEQUENCE {id_sequence} OWNED BY tasks.id")
+    op.drop_table(old)
+    op.execute("ANALYZE tasks")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Only Postgres supports declarative partitioning
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    # The partition key is part of the primary key, so it can't be null
+    undated = (
+        op.get_bind()
+        .execute(sa.text("SELECT id FROM tasks WHERE date IS NULL LIMIT 10"))
+        .scalars()
+        .all()
+    )
+    if undated:
+        raise RuntimeError(
+            f"Tasks without a date, date or delete them first: {undated}"
+        )
+
+    swap_tasks_table(partitioned=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    swap_tasks_table(partitioned=False)
@@ -0,0 +1,46 @@
+"""Add job_runs table
+
+Revision ID: d4f6b8c0e2a3
+Revises: c3e5a7b9d1f2
+Create Date: 2026-10-19 12:41:19.027356
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d4f6b8c0e2a3"
+down_revision: Union[str, None] = "c3e5a7b9d1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "job_runs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("job_name", sa.String(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("duration_ms", sa.Float(), nullable=False),
+        sa.Column("rows_affected", sa.Integer(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_job_runs_id"), "job_runs", ["id"], unique=False)
+    op.create_index(
+        "ix_job_runs_job_name_started_at",
+        "job_runs",
+        ["job_name", "started_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_job_runs_job_name_started_at", table_name="job_runs")
+    op.drop_index(op.f("ix_job_runs_id"), table_name="job_runs")
+    op.drop_table("job_runs")
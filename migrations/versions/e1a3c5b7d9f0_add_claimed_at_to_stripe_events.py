@@ -0,0 +1,34 @@
+"""Add claimed_at to stripe_events
+
+Revision ID: e1a3c5b7d9f0
+Revises: c9e1a3b5d7f8
+Create Date: 2026-10-19 23:12:40.582913
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e1a3c5b7d9f0"
+down_revision: Union[str, None] = "c9e1a3b5d7f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "stripe_events", sa.Column("claimed_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Events being processed are left for the old code to apply again
+    op.execute(
+        "UPDATE stripe_events SET status = 'pending' WHERE status = 'processing'"
+    )
+    op.drop_column("stripe_events", "claimed_at")
@@ -0,0 +1,29 @@
+"""Add updated_at to notes
+
+Revision ID: f2b4d6e8a0c1
+Revises: e1a3c5b7d9f0
+Create Date: 2026-10-19 23:48:05.216734
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b4d6e8a0c1"
+down_revision: Union[str, None] = "e1a3c5b7d9f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing notes are left NULL and count as not recently written
+    op.add_column("notes", sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("notes", "updated_at")
@@ -0,0 +1,50 @@
+"""Add subscription snapshot to users
+
+Revision ID: f6b8d0e2a4c5
+Revises: e5a7c9d1f3b4
+Create Date: 2026-10-19 15:12:08.640193
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f6b8d0e2a4c5"
+down_revision: Union[str, None] = "e5a7c9d1f3b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "users", sa.Column("subscription_period_end", sa.DateTime(), nullable=True)
+    )
+    op.add_column(
+        "users", sa.Column("cancel_at_period_end", sa.Boolean(), nullable=True)
+    )
+    op.add_column("users", sa.Column("plan_name", sa.String(), nullable=True))
+    op.add_column("users", sa.Column("price_unit_amount", sa.Integer(), nullable=True))
+    op.add_column("users", sa.Column("price_currency", sa.String(), nullable=True))
+    op.add_column(
+        "users", sa.Column("subscription_synced_at", sa.DateTime(), nullable=True)
+    )
+
+    # Lifetime purchases had their plan name dropped before this column existed
+    op.execute(
+        "UPDATE users SET plan_name = 'Lifetime Access' "
+        "WHERE subscription_status = 'lifetime'"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "subscription_synced_at")
+    op.drop_column("users", "price_currency")
+    op.drop_column("users", "price_unit_amount")
+    op.drop_column("users", "plan_name")
+    op.drop_column("users", "cancel_at_period_end")
+    op.drop_column("users", "subscription_period_end")